@@ -0,0 +1,139 @@
+# AI_modle/ai/async_client.py
+# 功能：非同步版 LLM 存取（給 asgi_app.py 用）
+#   等待 Ollama 生成時只佔一個 coroutine，不佔 OS 執行緒；單一 worker 可同時掛住數百個請求
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Optional
+
+from ai.backends import LLM_BACKEND, _read_timeout, Timeout
+from ai.fake_llm import FakeLLM, FakeLLMError
+from ai.json_stream import IncrementalJSONObjectScanner
+from ai.schemas import loads_fast
+from ai.llm_telemetry import PEEK_FINAL_CHUNK, StreamMeter
+from metrics import observe_stage
+
+
+class AsyncLLMBackend(ABC):
+    name = "base"
+
+    @abstractmethod
+    def generate_stream(self, url: str, payload: Dict[str, Any], timeout: Timeout = None) -> AsyncIterator[Dict[str, Any]]:
+        ...
+
+    async def aclose(self) -> None:
+        pass
+
+
+class AsyncOllamaBackend(AsyncLLMBackend):
+    name = "ollama"
+
+    def __init__(self, max_connections: int = 512):
+        import httpx
+
+        self._httpx = httpx
+        # 長連線池：數百個同時進行的生成共用少量 TCP 連線設定
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=64),
+        )
+
+    async def generate_stream(self, url, payload, timeout=None):
+        body = dict(payload)
+        body["stream"] = True
+        if isinstance(timeout, tuple):
+            t = self._httpx.Timeout(timeout[1], connect=timeout[0])
+        else:
+            t = self._httpx.Timeout(timeout)
+        async with self.client.stream("POST", url, json=body, timeout=t) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line:
+                    continue
+                chunk = loads_fast(line)
+                if chunk.get("error"):
+                    raise RuntimeError(f"Ollama 串流錯誤：{chunk.get('error')}")
+                yield chunk
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class AsyncFakeBackend(AsyncLLMBackend):
+    name = "fake"
+
+    def __init__(self, llm: Optional[FakeLLM] = None):
+        self.llm = llm or FakeLLM()
+
+    async def generate_stream(self, url, payload, timeout=None):
+        limit = _read_timeout(timeout)
+        t0 = time.time()
+        try:
+            async for chunk in self.llm.agenerate_stream(payload):
+                if limit is not None and time.time() - t0 > limit:
+                    raise TimeoutError(f"fake backend：超過 {limit}s")
+                yield chunk
+        except FakeLLMError as e:
+            raise RuntimeError(str(e))
+
+
+ASYNC_BACKENDS = {
+    "ollama": AsyncOllamaBackend,
+    "fake": AsyncFakeBackend,
+}
+
+_active: Optional[AsyncLLMBackend] = None
+
+
+def get_async_backend() -> AsyncLLMBackend:
+    """需在 event loop 內第一次呼叫（httpx.AsyncClient 綁定當前 loop）"""
+    global _active
+    if _active is None:
+        cls = ASYNC_BACKENDS.get(LLM_BACKEND)
+        if cls is None:
+            raise ValueError(f"未知的 LLM_BACKEND：{LLM_BACKEND}（可用：{', '.join(ASYNC_BACKENDS)}）")
+        _active = cls()
+    return _active
+
+
+def set_async_backend(backend: AsyncLLMBackend) -> None:
+    global _active
+    _active = backend
+
+
+async def _apeek_final_chunk(chunks, deadline: Optional[float], meter: StreamMeter) -> None:
+    """ollama_client._peek_final_chunk 的非同步版：最多等到 deadline，任何錯誤都不影響已閉合的結果"""
+    remaining = None if deadline is None else deadline - time.time()
+    if remaining is not None and remaining <= 0:
+        return
+    try:
+        tail = await asyncio.wait_for(chunks.__anext__(), timeout=remaining)
+    except Exception:
+        # StopAsyncIteration / 逾時 / 斷線
+        return
+    if tail.get("done"):
+        meter.observe(tail)
+
+
+async def ascan_json_stream(
+    chunks, deadline: Optional[float] = None, meter: Optional[StreamMeter] = None
+) -> IncrementalJSONObjectScanner:
+    """scan_json_stream 的非同步版：最外層 JSON 閉合就關掉串流（Ollama 會中止生成）"""
+    sc = IncrementalJSONObjectScanner()
+    t0 = time.perf_counter()
+    first = True
+    try:
+        async for chunk in chunks:
+            if first:
+                observe_stage("llm.first_token", time.perf_counter() - t0)
+                first = False
+            if meter is not None:
+                meter.observe(chunk)
+            if sc.feed(chunk.get("response") or "") or chunk.get("done"):
+                if meter is not None and PEEK_FINAL_CHUNK and not chunk.get("done"):
+                    await _apeek_final_chunk(chunks, deadline, meter)
+                break
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError("LLM 生成超過延遲預算")
+    finally:
+        await chunks.aclose()
+    return sc
@@ -0,0 +1,191 @@
+# AI_modle/ai/backends.py
+# 功能：LLM 後端抽象層，所有 Ollama 存取都經過這裡，方便換成假後端做壓測/回歸
+#   LLM_BACKEND=ollama（預設）：真的打 HTTP（OLLAMA_URL 也可以指向 fake_ollama_server.py）
+#   LLM_BACKEND=fake：同進程假模型，不需要任何網路/模型
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+# requests（含 urllib3 / certifi / charset 偵測）載入要幾十 ms：延後到真的建立 HTTP 後端時才 import
+from ai.fake_llm import FakeLLM, FakeLLMError
+
+
+Timeout = Union[float, Tuple[float, float], None]
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "ollama").lower().strip()
+
+
+def _ollama_base_url(url: str) -> str:
+    """http://host:11434/api/generate -> http://host:11434"""
+    u = (url or "").rstrip("/")
+    idx = u.find("/api/")
+    return u[:idx] if idx != -1 else u
+
+
+def _read_timeout(timeout: Timeout) -> Optional[float]:
+    if isinstance(timeout, tuple):
+        return timeout[1]
+    return timeout
+
+
+def _clip_timeout(timeout: Timeout, deadline: Optional[float]) -> Timeout:
+    """讀取逾時不超過 deadline 剩下的時間（等第一個 chunk / 回應標頭時用）"""
+    if deadline is None:
+        return timeout
+    remaining = max(0.1, deadline - time.time())
+    if isinstance(timeout, tuple):
+        return (timeout[0], min(timeout[1], remaining) if timeout[1] is not None else remaining)
+    return min(timeout, remaining) if timeout is not None else remaining
+
+
+class LLMBackend(ABC):
+    """
+    介面與 Ollama HTTP API 對齊：payload/回應都沿用 /api/generate 的欄位。
+    少實作任何一個方法，建立實例時就會 TypeError（不會等到請求跑到一半才發現）。
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def generate(self, url: str, payload: Dict[str, Any], timeout: Timeout = None) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def generate_stream(
+        self, url: str, payload: Dict[str, Any], timeout: Timeout = None, deadline: Optional[float] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """deadline（time.time() 秒）：到了就中止串流，連卡在讀取中的 chunk 也一樣"""
+        ...
+
+    @abstractmethod
+    def loaded_models(self, url: str, timeout: Timeout = 5) -> List[Dict[str, Any]]:
+        ...
+
+
+class OllamaHTTPBackend(LLMBackend):
+    name = "ollama"
+
+    def __init__(self):
+        import requests
+
+        # 共用連線池，避免每個請求重新握手
+        self.session = requests.Session()
+
+    def generate(self, url, payload, timeout=None):
+        body = dict(payload)
+        body["stream"] = False
+        resp = self.session.post(url, json=body, timeout=timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def generate_stream(self, url, payload, timeout=None, deadline=None):
+        import requests
+
+        body = dict(payload)
+        body["stream"] = True
+        with self.session.post(url, json=body, timeout=_clip_timeout(timeout, deadline), stream=True) as resp:
+            resp.raise_for_status()
+            # 讀取逾時只限制「單次讀取」；deadline 一到由計時器中斷阻塞中的讀取，
+            # 一個卡住的 chunk 也不會讓總時間超過預算（urllib3 2.3+ 才有 shutdown，舊版退回 close）
+            watchdog = None
+            if deadline is not None:
+                stop = getattr(resp.raw, "shutdown", None) or resp.close
+                watchdog = threading.Timer(max(0.0, deadline - time.time()), stop)
+                watchdog.daemon = True
+                watchdog.start()
+            try:
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise RuntimeError(f"Ollama 串流錯誤：{chunk.get('error')}")
+                    yield chunk
+            except Exception as e:
+                if deadline is not None and time.time() >= deadline:
+                    raise requests.Timeout("LLM 生成超過延遲預算") from e
+                raise
+            finally:
+                if watchdog is not None:
+                    watchdog.cancel()
+
+    def loaded_models(self, url, timeout=5):
+        resp = self.session.get(_ollama_base_url(url) + "/api/ps", timeout=timeout)
+        resp.raise_for_status()
+        return (resp.json() or {}).get("models") or []
+
+
+def _requests_error(name: str, message: str) -> Exception:
+    """真的要丟例外時才 import requests：假模型正常生成的路徑完全不載入它"""
+    import requests
+
+    return getattr(requests, name)(message)
+
+
+class FakeBackend(LLMBackend):
+    """
+    同進程假模型；錯誤/逾時都轉成 requests 的例外型別，
+    讓呼叫端（斷路器、fallback）走的路徑跟真的 HTTP 一樣。
+    """
+
+    name = "fake"
+
+    def __init__(self, llm: Optional[FakeLLM] = None):
+        self.llm = llm or FakeLLM()
+
+    def generate_stream(self, url, payload, timeout=None, deadline=None):
+        limit = _read_timeout(timeout)
+        t0 = time.time()
+        try:
+            for chunk in self.llm.generate_stream(payload):
+                if limit is not None and time.time() - t0 > limit:
+                    raise _requests_error("Timeout", f"fake backend：超過 {limit}s")
+                if deadline is not None and time.time() > deadline:
+                    raise _requests_error("Timeout", "fake backend：超過延遲預算")
+                yield chunk
+        except FakeLLMError as e:
+            raise _requests_error("HTTPError", str(e))
+
+    def generate(self, url, payload, timeout=None):
+        parts: List[str] = []
+        final: Dict[str, Any] = {}
+        for chunk in self.generate_stream(url, payload, timeout=timeout):
+            if chunk.get("done"):
+                final = dict(chunk)
+            else:
+                parts.append(chunk.get("response") or "")
+        final["response"] = "".join(parts)
+        return final
+
+    def loaded_models(self, url, timeout=5):
+        return self.llm.loaded_models()
+
+
+# =========================
+# 註冊表：新增後端只要加一行
+# =========================
+BACKENDS = {
+    "ollama": OllamaHTTPBackend,
+    "fake": FakeBackend,
+}
+
+_active: Optional[LLMBackend] = None
+
+
+def get_backend() -> LLMBackend:
+    global _active
+    if _active is None:
+        cls = BACKENDS.get(LLM_BACKEND)
+        if cls is None:
+            raise ValueError(f"未知的 LLM_BACKEND：{LLM_BACKEND}（可用：{', '.join(BACKENDS)}）")
+        _active = cls()
+    return _active
+
+
+def set_backend(backend: LLMBackend) -> None:
+    """壓測/回歸時可直接換成自訂後端（例如固定 seed 的 FakeBackend）"""
+    global _active
+    _active = backend
@@ -0,0 +1,114 @@
+# AI_modle/ai/circuit_breaker.py
+# 功能：LLM 連續逾時/失敗時斷路，直接走規則版報告；背景探測恢復後再關回來
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+# =========================
+# 基本設定（可用環境變數覆蓋）
+# =========================
+# 單次 /submit 願意等 LLM 的秒數（取代原本寫死的 90 秒）
+LLM_LATENCY_BUDGET = float(os.getenv("LLM_LATENCY_BUDGET", "25"))
+# 連續失敗幾次就斷路
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "3"))
+# 斷路後多久探測一次（秒）
+BREAKER_PROBE_INTERVAL = float(os.getenv("LLM_BREAKER_PROBE_INTERVAL", "15"))
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    - closed：正常呼叫 LLM；record_failure 累計到門檻就轉 open
+    - open：allow_request() 回 False，呼叫端應立即回規則版（degraded）報告；
+      同時背景執行緒每 probe_interval 秒跑一次 probe()
+    - half_open：探測進行中（仍不放行一般請求）；探測成功才轉回 closed，失敗回到 open
+    open 期間收到的成功（斷路前就送出、晚回來的請求）不算數，只有探測能把斷路器關回來
+    """
+
+    def __init__(
+        self,
+        probe: Optional[Callable[[], bool]] = None,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        probe_interval: float = BREAKER_PROBE_INTERVAL,
+    ):
+        self.probe = probe
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.probe_interval = probe_interval
+
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._last_error = ""
+        self._trips = 0
+        self._probe_thread: Optional[threading.Thread] = None
+
+    # -------------------------
+    # 狀態
+    # -------------------------
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow_request(self) -> bool:
+        return self._state == STATE_CLOSED
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == STATE_OPEN:
+                return
+            self._failures = 0
+            self._state = STATE_CLOSED
+            self._last_error = ""
+
+    def record_failure(self, error: Any = None) -> None:
+        with self._lock:
+            self._failures += 1
+            self._last_error = str(error or "")[:300]
+            if self._state == STATE_CLOSED and self._failures >= self.failure_threshold:
+                self._state = STATE_OPEN
+                self._opened_at = time.time()
+                self._trips += 1
+                self._start_probe_locked()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self._state,
+            "consecutive_failures": self._failures,
+            "opened_at": self._opened_at or None,
+            "trips": self._trips,
+            "last_error": self._last_error or None,
+        }
+
+    # -------------------------
+    # 背景探測
+    # -------------------------
+    def _start_probe_locked(self) -> None:
+        if self.probe is None:
+            return
+        if self._probe_thread is not None and self._probe_thread.is_alive():
+            return
+        self._probe_thread = threading.Thread(target=self._probe_loop, name="llm-breaker-probe", daemon=True)
+        self._probe_thread.start()
+
+    def _probe_loop(self) -> None:
+        while self._state == STATE_OPEN:
+            time.sleep(self.probe_interval)
+            with self._lock:
+                self._state = STATE_HALF_OPEN
+            try:
+                ok = bool(self.probe())
+            except Exception as e:
+                ok = False
+                self._last_error = str(e)[:300]
+            if ok:
+                self.record_success()
+                return
+            with self._lock:
+                if self._state == STATE_HALF_OPEN:
+                    self._state = STATE_OPEN
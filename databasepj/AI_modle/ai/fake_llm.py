@@ -0,0 +1,380 @@
+# AI_modle/ai/fake_llm.py
+# 功能：假的 Ollama 生成引擎（壓測/回歸用），可設定延遲分佈、token 速率、壞 JSON 與錯誤率
+# 同時給 fake_ollama_server.py（HTTP）與 ai.backends.FakeBackend（同進程）使用
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+
+class FakeLLMError(Exception):
+    """模擬 Ollama 端錯誤（HTTP server 會轉成 500）"""
+
+
+class FakeLLMConfig:
+    """
+    latency：首 token 前的延遲（prefill），格式
+      - "fixed:800"            固定 800ms
+      - "uniform:300,1500"     均勻分佈
+      - "lognormal:800,0.5"    中位數 800ms、sigma 0.5（長尾，最像真實負載）
+    token_rate：每秒輸出幾個 token（decode）
+    malformed_rate：回傳壞 JSON 的機率（前後夾雜文字 / 截斷 / code fence）
+    error_rate：直接回錯誤的機率
+    load_ms：模型「冷載入」耗時；閒置超過 keep_alive 會再付一次
+    model_speed：各模型相對速度（"llama3.2:3b=3" = prefill 與 decode 都快 3 倍），測多模型路由用
+    """
+
+    def __init__(
+        self,
+        latency: str = "lognormal:800,0.5",
+        token_rate: float = 40.0,
+        malformed_rate: float = 0.0,
+        error_rate: float = 0.0,
+        load_ms: float = 3000.0,
+        chunk_chars: int = 3,
+        seed: Optional[int] = None,
+        model_speed: Optional[Dict[str, float]] = None,
+    ):
+        self.latency = latency
+        self.token_rate = max(0.1, float(token_rate))
+        self.malformed_rate = float(malformed_rate)
+        self.error_rate = float(error_rate)
+        self.load_ms = float(load_ms)
+        self.chunk_chars = max(1, int(chunk_chars))
+        self.seed = seed
+        self.model_speed = dict(model_speed or {})
+
+    @classmethod
+    def from_env(cls) -> "FakeLLMConfig":
+        seed = os.getenv("FAKE_LLM_SEED")
+        return cls(
+            latency=os.getenv("FAKE_LLM_LATENCY", "lognormal:800,0.5"),
+            token_rate=float(os.getenv("FAKE_LLM_TOKEN_RATE", "40")),
+            malformed_rate=float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            load_ms=float(os.getenv("FAKE_LLM_LOAD_MS", "3000")),
+            seed=int(seed) if seed else None,
+            model_speed=_parse_model_speed(os.getenv("FAKE_LLM_MODEL_SPEED", "")),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latency": self.latency,
+            "token_rate": self.token_rate,
+            "malformed_rate": self.malformed_rate,
+            "error_rate": self.error_rate,
+            "load_ms": self.load_ms,
+            "chunk_chars": self.chunk_chars,
+            "seed": self.seed,
+            "model_speed": self.model_speed,
+        }
+
+
+LATENCY_KINDS = ("fixed", "uniform", "lognormal")
+
+
+def parse_latency(spec: str) -> Tuple[str, List[float]]:
+    """'lognormal:800,0.5' → ('lognormal', [800.0, 0.5])；格式不對丟 ValueError（啟動前就檢查，不要每次呼叫才失敗）"""
+    kind, _, args = (spec or "").strip().partition(":")
+    if kind not in LATENCY_KINDS:
+        raise ValueError(f"未知的延遲分佈：{spec}（fixed:MS | uniform:LO,HI | lognormal:MEDIAN,SIGMA）")
+    try:
+        nums = [float(x) for x in args.split(",") if x.strip()] if args else []
+    except ValueError:
+        raise ValueError(f"延遲分佈參數不是數字：{spec}")
+    return kind, nums
+
+
+def latency_arg(spec: str) -> str:
+    """argparse type=：--latency / --llm-latency 格式不對時直接在命令列報錯"""
+    import argparse
+
+    try:
+        parse_latency(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return spec
+
+
+def _parse_model_speed(spec: str) -> Dict[str, float]:
+    """'a=3,b=0.5' → {'a': 3.0, 'b': 0.5}（模型名稱本身可能含冒號，所以用 = 分隔）"""
+    out: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        name, _, v = part.strip().rpartition("=")
+        if name:
+            out[name] = max(0.01, float(v))
+    return out
+
+
+def _parse_keep_alive(v: Any) -> float:
+    """Ollama keep_alive："5m" / "30s" / "1h" / 秒數；負數代表永久"""
+    if v is None:
+        return 300.0
+    if isinstance(v, (int, float)):
+        return float(v) if v >= 0 else float("inf")
+    s = str(v).strip().lower()
+    try:
+        if s.endswith("ms"):
+            return float(s[:-2]) / 1000.0
+        if s.endswith("s"):
+            return float(s[:-1])
+        if s.endswith("m"):
+            return float(s[:-1]) * 60
+        if s.endswith("h"):
+            return float(s[:-1]) * 3600
+        x = float(s)
+        return x if x >= 0 else float("inf")
+    except ValueError:
+        return 300.0
+
+
+# =========================
+# 假報告內容（依 system prompt 判斷是哪一種報告 / 離線商品摘要）
+# =========================
+_VALUES_TYPES = ["穩健防禦型", "責任規劃型", "均衡務實型", "成長進取型"]
+
+
+def _fake_values_report(rng: random.Random) -> Dict[str, Any]:
+    t = rng.choice(_VALUES_TYPES)
+    return {
+        "status": "success",
+        "value_profile": {
+            "Type": t,
+            "Reason": (
+                f"從作答觀察，你在風險與穩定之間傾向「{t}」的決策方式；"
+                "推論你會先確認基本保障是否到位，再考慮額外的規劃與彈性；"
+                "建議以醫療與意外作為保障底盤，再依家庭責任與長期目標逐步補齊壽險與長照缺口。"
+            ),
+        },
+        "insurance_advice": [
+            "先補齊醫療實支與住院日額，降低高頻醫療支出風險。",
+            "以重大傷病或癌症險建立一次性給付，因應長期治療的收入中斷。",
+            "若有家庭責任，以定期壽險用較低保費換取足額身故保障。",
+            "意外險搭配意外醫療，涵蓋通勤與活動風險。",
+            "每年檢視一次保單，隨人生階段調整保額與險種配置。",
+        ],
+    }
+
+
+def _fake_insurance_report(rng: random.Random) -> Dict[str, Any]:
+    cats = rng.sample(["健康醫療", "意外傷害", "壽險保障", "長期照顧", "癌症醫療"], 3)
+    return {
+        "status": "success",
+        "person_summary": "你重視突發醫療與意外風險，希望以可負擔的保費建立基本保障，並逐步規劃長期需求。",
+        "top_categories": [{"name": c, "reason": "依問卷回答推估的優先保障方向"} for c in cats],
+        "next_step": [
+            "盤點既有保單的醫療與意外保障額度。",
+            "設定每月可負擔的保費上限。",
+            "比較推薦商品的承保年齡與除外責任。",
+        ],
+        "product_advice": [
+            "先確認主約保障範圍，再挑選需要的附約。",
+            "留意等待期與續保條件。",
+            "比較不同繳費期間的總保費差異。",
+        ],
+    }
+
+
+def _fake_product_summary(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "summary": "提供住院、手術與意外醫療的實支實付保障，適合作為基本醫療底盤。",
+        "selling_points": rng.sample(["實支實付補足健保缺口", "住院日額穩定給付", "可搭配附約彈性加保", "保費相對平穩"], 3),
+    }
+
+
+def _fake_section_report(system_prompt: str, rng: random.Random) -> Dict[str, Any]:
+    if "selling_points" in system_prompt:
+        return _fake_product_summary(rng)
+    if "person_summary" in system_prompt or "推薦商品" in system_prompt:
+        return _fake_insurance_report(rng)
+    if "value_profile" in system_prompt:
+        return _fake_values_report(rng)
+    return {"status": "success", "text": "ok"}
+
+
+def _malform(text: str, rng: random.Random) -> str:
+    kind = rng.choice(["trailing", "fence", "truncated", "prefix"])
+    if kind == "trailing":
+        return text + "\n\n以上是分析結果，如需更多資訊請告訴我。"
+    if kind == "fence":
+        return "```json\n" + text + "\n```"
+    if kind == "prefix":
+        return "好的，以下是 JSON：\n" + text
+    return text[: max(1, len(text) // 2)]
+
+
+# =========================
+# 引擎
+# =========================
+class FakeLLM:
+    def __init__(self, config: Optional[FakeLLMConfig] = None):
+        self.config = config or FakeLLMConfig.from_env()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        # model -> 到期時間（epoch 秒）
+        self._loaded: Dict[str, float] = {}
+
+    # -------------------------
+    # 隨機數（加鎖以確保多執行緒下 seed 仍可重現）
+    # -------------------------
+    def _sample_latency_ms(self) -> float:
+        kind, nums = parse_latency(self.config.latency)
+        with self._lock:
+            if kind == "fixed":
+                return nums[0] if nums else 0.0
+            if kind == "uniform":
+                lo, hi = (nums + [0.0, 0.0])[:2]
+                return self._rng.uniform(lo, hi)
+            if kind == "lognormal":
+                median = nums[0] if nums else 800.0
+                sigma = nums[1] if len(nums) > 1 else 0.5
+                return median * self._rng.lognormvariate(0.0, sigma)
+        raise ValueError(f"未知的延遲分佈：{self.config.latency}")
+
+    def _roll(self, p: float) -> bool:
+        with self._lock:
+            return self._rng.random() < p
+
+    def _content_rng(self, payload: Dict[str, Any]) -> random.Random:
+        # 內容只由 prompt 決定（同一份答案 → 同一份報告），延遲/錯誤才走共用 rng
+        h = hashlib.sha1((str(payload.get("system")) + str(payload.get("prompt"))).encode("utf-8")).hexdigest()
+        return random.Random(int(h[:8], 16) ^ (self.config.seed or 0))
+
+    # -------------------------
+    # 模型載入狀態（模擬 keep_alive）
+    # -------------------------
+    def _ensure_loaded(self, model: str, keep_alive: Any) -> float:
+        now = time.time()
+        with self._lock:
+            exp = self._loaded.get(model, 0.0)
+            cold = exp < now
+            self._loaded[model] = now + _parse_keep_alive(keep_alive)
+        return self.config.load_ms / 1000.0 if cold else 0.0
+
+    def loaded_models(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return [
+                {"name": m, "model": m, "expires_at": exp}
+                for m, exp in self._loaded.items()
+                if exp >= now
+            ]
+
+    # -------------------------
+    # 生成
+    # -------------------------
+    def _render_text(self, payload: Dict[str, Any]) -> str:
+        rng = self._content_rng(payload)
+        report = _fake_section_report(str(payload.get("system") or ""), rng)
+        fmt = payload.get("format")
+        if isinstance(fmt, dict) and fmt.get("properties"):
+            # 子 schema（報告分段生成）：只輸出要求的欄位，decode 長度跟著縮短
+            report = {k: v for k, v in report.items() if k in fmt["properties"]}
+        text = json.dumps(report, ensure_ascii=False)
+        if self._roll(self.config.malformed_rate):
+            text = _malform(text, rng)
+        opts = payload.get("options") or {}
+        num_predict = opts.get("num_predict")
+        if isinstance(num_predict, int) and num_predict > 0:
+            text = text[: num_predict * self.config.chunk_chars]
+        return text
+
+    def _chunks(self, text: str) -> List[str]:
+        n = self.config.chunk_chars
+        return [text[i : i + n] for i in range(0, len(text), n)]
+
+    def _plan(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """先決定這次請求的延遲/內容/是否出錯，同步與非同步版本只差在怎麼 sleep"""
+        model = payload.get("model") or "fake"
+        load_s = self._ensure_loaded(model, payload.get("keep_alive"))
+        plan: Dict[str, Any] = {"model": model, "load_s": load_s, "chunks": None, "error": False, "prefill_s": 0.0}
+        # 不帶 prompt：只載入模型
+        if not payload.get("prompt"):
+            return plan
+        if self._roll(self.config.error_rate):
+            plan["error"] = True
+            return plan
+        speed = self.config.model_speed.get(model, 1.0)
+        plan["prefill_s"] = self._sample_latency_ms() / 1000.0 / speed
+        plan["per_token"] = 1.0 / (self.config.token_rate * speed)
+        plan["chunks"] = self._chunks(self._render_text(payload))
+        prompt_chars = len(str(payload.get("system") or "")) + len(str(payload.get("prompt") or ""))
+        plan["prompt_eval_count"] = max(1, prompt_chars // 2)
+        return plan
+
+    @staticmethod
+    def _load_only_chunk(plan: Dict[str, Any], t0: float) -> Dict[str, Any]:
+        return {"model": plan["model"], "response": "", "done": True, "done_reason": "load",
+                "load_duration": int(plan["load_s"] * 1e9), "total_duration": int((time.time() - t0) * 1e9)}
+
+    @staticmethod
+    def _final_chunk(plan: Dict[str, Any], t0: float, decode_s: float) -> Dict[str, Any]:
+        return {
+            "model": plan["model"],
+            "response": "",
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((time.time() - t0) * 1e9),
+            "load_duration": int(plan["load_s"] * 1e9),
+            "prompt_eval_count": plan["prompt_eval_count"],
+            "prompt_eval_duration": int(plan["prefill_s"] * 1e9),
+            "eval_count": len(plan["chunks"]),
+            "eval_duration": int(decode_s * 1e9),
+        }
+
+    def generate_stream(self, payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """依 Ollama /api/generate stream=true 的格式逐塊 yield"""
+        t0 = time.time()
+        plan = self._plan(payload)
+        if plan["load_s"]:
+            time.sleep(plan["load_s"])
+        if plan["error"]:
+            raise FakeLLMError("fake-ollama：注入錯誤")
+        if plan["chunks"] is None:
+            yield self._load_only_chunk(plan, t0)
+            return
+
+        time.sleep(plan["prefill_s"])
+        per_token = plan["per_token"]
+        t_decode = time.time()
+        for ch in plan["chunks"]:
+            time.sleep(per_token)
+            yield {"model": plan["model"], "response": ch, "done": False}
+        yield self._final_chunk(plan, t0, time.time() - t_decode)
+
+    async def agenerate_stream(self, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """非同步版：等待期間不佔執行緒（給 asgi_app.py 壓測用）"""
+        import asyncio  # 只有 ASGI 版會走到這裡；同步 app 不必付 asyncio 的載入成本
+
+        t0 = time.time()
+        plan = self._plan(payload)
+        if plan["load_s"]:
+            await asyncio.sleep(plan["load_s"])
+        if plan["error"]:
+            raise FakeLLMError("fake-ollama：注入錯誤")
+        if plan["chunks"] is None:
+            yield self._load_only_chunk(plan, t0)
+            return
+
+        await asyncio.sleep(plan["prefill_s"])
+        per_token = plan["per_token"]
+        t_decode = time.time()
+        for ch in plan["chunks"]:
+            await asyncio.sleep(per_token)
+            yield {"model": plan["model"], "response": ch, "done": False}
+        yield self._final_chunk(plan, t0, time.time() - t_decode)
+
+    def generate(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """非串流：把所有 chunk 合併成單一回應（欄位與 Ollama 相同）"""
+        parts: List[str] = []
+        final: Dict[str, Any] = {}
+        for chunk in self.generate_stream(payload):
+            if chunk.get("done"):
+                final = dict(chunk)
+            else:
+                parts.append(chunk.get("response") or "")
+        final["response"] = "".join(parts)
+        return final
@@ -0,0 +1,103 @@
+# AI_modle/ai/json_stream.py
+# 功能：邊收 token 邊掃描 JSON，最外層 {...} 一閉合就可以停止生成並直接回 dict
+import re
+from typing import Any, Dict, List, Optional
+
+from ai.schemas import loads_fast
+
+
+# 只需要看這四種字元；其他字元整段跳過，不用逐字元跑 Python 迴圈
+_SPECIAL = re.compile(r'[{}"\\]')
+
+
+class IncrementalJSONObjectScanner:
+    """
+    規則與 _extract_first_json_object 相同：
+    從第一個 '{' 開始做括號計數（忽略字串內的括號與跳脫字元），
+    depth 回到 0 即代表最外層物件結束。
+
+    用法：
+        sc = IncrementalJSONObjectScanner()
+        for chunk in stream:
+            if sc.feed(chunk):
+                break          # 停止生成
+        obj = sc.parse()
+    """
+
+    __slots__ = ("_parts", "_offset", "_start", "_end", "_depth", "_in_str", "_skip_at")
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._offset = 0          # 目前已收的總字元數
+        self._start = -1          # 第一個 '{' 的全域位置
+        self._end = -1            # 最外層 '}' 之後的全域位置
+        self._depth = 0
+        self._in_str = False
+        self._skip_at = -1        # 被反斜線跳脫的字元位置
+
+    @property
+    def done(self) -> bool:
+        return self._end != -1
+
+    @property
+    def started(self) -> bool:
+        return self._start != -1
+
+    def feed(self, chunk: str) -> bool:
+        """餵入一段文字；回傳 True 代表最外層物件已閉合"""
+        if self._end != -1:
+            return True
+        if not chunk:
+            return False
+
+        base = self._offset
+        self._parts.append(chunk)
+        self._offset += len(chunk)
+
+        for m in _SPECIAL.finditer(chunk):
+            pos = base + m.start()
+            ch = m.group()
+
+            if self._start == -1:
+                if ch == "{":
+                    self._start = pos
+                    self._depth = 1
+                continue
+
+            if pos == self._skip_at:
+                continue
+
+            if self._in_str:
+                if ch == "\\":
+                    self._skip_at = pos + 1
+                elif ch == '"':
+                    self._in_str = False
+                continue
+
+            if ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._end = pos + 1
+                    return True
+        return False
+
+    def full_text(self) -> str:
+        return "".join(self._parts)
+
+    def object_text(self) -> Optional[str]:
+        if self._end == -1:
+            return None
+        return self.full_text()[self._start : self._end]
+
+    def parse(self) -> Dict[str, Any]:
+        """
+        先用 orjson/標準 json（C 實作，快）解析；模型偶爾吐出單引號/尾逗號時才退回 json5。
+        """
+        s = self.object_text()
+        if s is None:
+            raise ValueError(f"JSON 物件未閉合，無法解析：{self.full_text()[:200]}")
+        return loads_fast(s)
@@ -0,0 +1,247 @@
+# AI_modle/ai/llm_telemetry.py
+# 功能：LLM 吞吐量遙測（依 模型 × prompt 類型 分組）
+#   Ollama 每次回應最後都附上 prompt_eval_count / prompt_eval_duration / eval_count / eval_duration / load_duration，
+#   這裡把它們收下來：prefill（讀 prompt）與 decode（生成）各自的 tokens/sec、冷載入次數，
+#   匯出到 /metrics，另外保留最近 N 次呼叫做滾動摘要（/llm/telemetry）。
+#   串流在 JSON 閉合時就提早關閉、沒收到最後那個 done chunk 時，改用客戶端計時估算（source=client）：
+#     prefill ≈ 第一個 chunk 到達前的時間、decode tokens ≈ chunk 數。
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+TELEMETRY_WINDOW = int(os.getenv("LLM_TELEMETRY_WINDOW", "500"))
+# load_duration 超過這個秒數 = 這次請求觸發了模型載入（冷啟動）
+COLD_LOAD_SECONDS = float(os.getenv("LLM_COLD_LOAD_SECONDS", "0.5"))
+# JSON 閉合後再多讀一個 chunk：structured output 在物件結束時就停，下一個通常正是帶統計的 done chunk
+PEEK_FINAL_CHUNK = os.getenv("LLM_TELEMETRY_PEEK_FINAL", "1") not in ("0", "false", "False")
+
+_LABELS = ("model", "prompt_type")
+_RATE_BUCKETS = (1, 2.5, 5, 10, 15, 20, 30, 40, 60, 80, 120, 200, 400, 800, 1600, 3200)
+
+LLM_CALLS = REGISTRY.counter("llm_calls_total", "LLM calls with telemetry", _LABELS + ("source",))
+LLM_PROMPT_TOKENS = REGISTRY.counter("llm_prompt_tokens_total", "Prompt tokens evaluated (prefill)", _LABELS)
+LLM_EVAL_TOKENS = REGISTRY.counter("llm_eval_tokens_total", "Tokens generated (decode)", _LABELS)
+LLM_PREFILL_SECONDS = REGISTRY.histogram("llm_prefill_seconds", "Prompt evaluation time per call", _LABELS)
+LLM_DECODE_SECONDS = REGISTRY.histogram("llm_decode_seconds", "Generation time per call", _LABELS)
+LLM_PREFILL_RATE = REGISTRY.histogram(
+    "llm_prefill_tokens_per_second", "Prompt evaluation throughput per call", _LABELS, buckets=_RATE_BUCKETS
+)
+LLM_DECODE_RATE = REGISTRY.histogram(
+    "llm_decode_tokens_per_second", "Generation throughput per call", _LABELS, buckets=_RATE_BUCKETS
+)
+LLM_LOAD_SECONDS = REGISTRY.histogram("llm_load_seconds", "Model load time reported by Ollama", ("model",))
+LLM_COLD_LOADS = REGISTRY.counter("llm_cold_loads_total", "Calls that had to load the model first", ("model",))
+
+_NS = 1e9
+
+
+class LLMCallStats:
+    """一次 LLM 呼叫的統計（秒 / token 數；沒有的欄位為 None）"""
+
+    __slots__ = (
+        "model", "prompt_type", "source", "at",
+        "prompt_tokens", "prefill_s", "eval_tokens", "decode_s", "load_s", "total_s",
+    )
+
+    def __init__(self, model: str, prompt_type: str, source: str):
+        self.model = model or "unknown"
+        self.prompt_type = prompt_type or "unknown"
+        self.source = source
+        self.at = time.time()
+        self.prompt_tokens: Optional[int] = None
+        self.prefill_s: Optional[float] = None
+        self.eval_tokens: Optional[int] = None
+        self.decode_s: Optional[float] = None
+        self.load_s: Optional[float] = None
+        self.total_s: Optional[float] = None
+
+    @property
+    def cold(self) -> bool:
+        return (self.load_s or 0.0) >= COLD_LOAD_SECONDS
+
+    @property
+    def prefill_rate(self) -> Optional[float]:
+        if self.prompt_tokens and self.prefill_s:
+            return self.prompt_tokens / self.prefill_s
+        return None
+
+    @property
+    def decode_rate(self) -> Optional[float]:
+        if self.eval_tokens and self.decode_s:
+            return self.eval_tokens / self.decode_s
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {k: getattr(self, k) for k in self.__slots__}
+        d["cold"] = self.cold
+        d["prefill_tokens_per_s"] = self.prefill_rate
+        d["decode_tokens_per_s"] = self.decode_rate
+        return d
+
+
+def _seconds(resp: Dict[str, Any], key: str) -> Optional[float]:
+    v = resp.get(key)
+    return v / _NS if isinstance(v, (int, float)) else None
+
+
+def stats_from_response(resp: Dict[str, Any], model: str, prompt_type: str) -> Optional[LLMCallStats]:
+    """Ollama 非串流回應 / 串流最後的 done chunk → LLMCallStats；沒有任何統計欄位回 None"""
+    if not isinstance(resp, dict) or not any(
+        k in resp for k in ("eval_count", "prompt_eval_count", "load_duration")
+    ):
+        return None
+    st = LLMCallStats(resp.get("model") or model, prompt_type, "ollama")
+    st.prompt_tokens = resp.get("prompt_eval_count")
+    st.prefill_s = _seconds(resp, "prompt_eval_duration")
+    st.eval_tokens = resp.get("eval_count")
+    st.decode_s = _seconds(resp, "eval_duration")
+    st.load_s = _seconds(resp, "load_duration")
+    st.total_s = _seconds(resp, "total_duration")
+    return st
+
+
+class StreamMeter:
+    """串流時逐 chunk 呼叫 observe()；結束時 finish() 產生統計"""
+
+    __slots__ = ("model", "prompt_type", "t_start", "t_first", "t_last", "chunks", "final")
+
+    def __init__(self, model: str, prompt_type: str):
+        self.model = model
+        self.prompt_type = prompt_type
+        self.t_start = time.perf_counter()
+        self.t_first: Optional[float] = None
+        self.t_last: Optional[float] = None
+        self.chunks = 0
+        self.final: Optional[Dict[str, Any]] = None
+
+    def observe(self, chunk: Dict[str, Any]) -> None:
+        now = time.perf_counter()
+        if chunk.get("done"):
+            self.final = chunk
+            return
+        if self.t_first is None:
+            self.t_first = now
+        self.t_last = now
+        self.chunks += 1
+
+    def finish(self) -> Optional[LLMCallStats]:
+        if self.final is not None:
+            st = stats_from_response(self.final, self.model, self.prompt_type)
+            if st is not None:
+                return st
+        if self.t_first is None:
+            return None
+        st = LLMCallStats(self.model, self.prompt_type, "client")
+        # 客戶端看不到 prompt token 數與載入時間：prefill 含排隊/載入，只能當上限看
+        st.prefill_s = self.t_first - self.t_start
+        st.eval_tokens = self.chunks
+        st.decode_s = (self.t_last or self.t_first) - self.t_first
+        st.total_s = (self.t_last or self.t_first) - self.t_start
+        return st
+
+
+def _pct(sorted_vals: List[float], q: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    i = min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))
+    return round(sorted_vals[i], 3)
+
+
+class LLMTelemetry:
+    def __init__(self, window: int = TELEMETRY_WINDOW):
+        self._lock = threading.Lock()
+        self.recent: Deque[LLMCallStats] = deque(maxlen=window)
+
+    def record(self, st: Optional[LLMCallStats]) -> None:
+        if st is None:
+            return
+        labels = (st.model, st.prompt_type)
+        LLM_CALLS.inc(*labels, st.source)
+        if st.prompt_tokens:
+            LLM_PROMPT_TOKENS.inc(*labels, amount=st.prompt_tokens)
+        if st.eval_tokens:
+            LLM_EVAL_TOKENS.inc(*labels, amount=st.eval_tokens)
+        if st.prefill_s is not None:
+            LLM_PREFILL_SECONDS.observe(st.prefill_s, *labels)
+        if st.decode_s is not None:
+            LLM_DECODE_SECONDS.observe(st.decode_s, *labels)
+        if st.prefill_rate is not None:
+            LLM_PREFILL_RATE.observe(st.prefill_rate, *labels)
+        if st.decode_rate is not None:
+            LLM_DECODE_RATE.observe(st.decode_rate, *labels)
+        if st.load_s is not None:
+            LLM_LOAD_SECONDS.observe(st.load_s, st.model)
+        if st.cold:
+            LLM_COLD_LOADS.inc(st.model)
+        with self._lock:
+            self.recent.append(st)
+
+    def summary(self) -> Dict[str, Any]:
+        """最近 N 次呼叫，依 (模型, prompt 類型) 分組的滾動摘要"""
+        with self._lock:
+            items = list(self.recent)
+        groups: Dict[Tuple[str, str], List[LLMCallStats]] = {}
+        for st in items:
+            groups.setdefault((st.model, st.prompt_type), []).append(st)
+
+        out: List[Dict[str, Any]] = []
+        for (model, prompt_type), sts in sorted(groups.items()):
+            def col(attr: str) -> List[float]:
+                return sorted(v for v in (getattr(s, attr) for s in sts) if v is not None)
+
+            prefill, decode = col("prefill_s"), col("decode_s")
+            prefill_rate, decode_rate = col("prefill_rate"), col("decode_rate")
+            prompt_tokens, eval_tokens = col("prompt_tokens"), col("eval_tokens")
+            total_prefill, total_decode = sum(prefill), sum(decode)
+            out.append({
+                "model": model,
+                "prompt_type": prompt_type,
+                "calls": len(sts),
+                "from_ollama": sum(1 for s in sts if s.source == "ollama"),
+                "cold_loads": sum(1 for s in sts if s.cold),
+                "prompt_tokens_avg": round(sum(prompt_tokens) / len(prompt_tokens), 1) if prompt_tokens else None,
+                "eval_tokens_avg": round(sum(eval_tokens) / len(eval_tokens), 1) if eval_tokens else None,
+                "prefill_s": {"p50": _pct(prefill, 0.5), "p95": _pct(prefill, 0.95)},
+                "decode_s": {"p50": _pct(decode, 0.5), "p95": _pct(decode, 0.95)},
+                "prefill_tokens_per_s": {"p50": _pct(prefill_rate, 0.5), "p5": _pct(prefill_rate, 0.05)},
+                "decode_tokens_per_s": {"p50": _pct(decode_rate, 0.5), "p5": _pct(decode_rate, 0.05)},
+                # 時間花在哪：prefill 佔比高 → 先縮 prompt；decode 佔比高 → 縮輸出或換更快的硬體
+                "prefill_share": round(total_prefill / (total_prefill + total_decode), 3)
+                if (total_prefill + total_decode) > 0 else None,
+            })
+        return {"window": self.recent.maxlen, "calls": len(items), "groups": out}
+
+    def model_rates(self, model: str) -> Dict[str, Any]:
+        """給模型路由用：某模型最近的 decode / prefill tokens/sec 中位數與樣本數、冷載入耗時中位數"""
+        with self._lock:
+            items = [s for s in self.recent if s.model == model]
+        decode = sorted(v for v in (s.decode_rate for s in items) if v is not None)
+        prefill = sorted(v for v in (s.prefill_rate for s in items) if v is not None)
+        loads = sorted(s.load_s for s in items if s.cold and s.load_s is not None)
+        return {
+            "decode_tps": _pct(decode, 0.5),
+            "decode_n": len(decode),
+            "prefill_tps": _pct(prefill, 0.5),
+            "prefill_n": len(prefill),
+            "load_s": _pct(loads, 0.5),
+        }
+
+    def eval_tokens_p50(self, prompt_type: str) -> Tuple[Optional[float], int]:
+        """某 prompt 類型最近實際輸出幾個 tokens（中位數, 樣本數）"""
+        with self._lock:
+            vals = sorted(s.eval_tokens for s in self.recent if s.prompt_type == prompt_type and s.eval_tokens)
+        return _pct(vals, 0.5), len(vals)
+
+    def last(self, n: int = 20) -> List[Dict[str, Any]]:
+        if n <= 0:
+            return []
+        with self._lock:
+            items = list(self.recent)[-n:]
+        return [s.to_dict() for s in items]
+
+
+LLM_TELEMETRY = LLMTelemetry()
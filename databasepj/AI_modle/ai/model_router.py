@@ -0,0 +1,212 @@
+# AI_modle/ai/model_router.py
+# 功能：依延遲 SLO 與預期輸出長度，在多個本機模型間挑一個（latency-aware routing）
+#   LLM_MODELS="llama3.2:3b=60,llama3:8b-instruct-q4_k_m=25"
+#     依「品質由低到高」列出；= 後面是沒有實測資料前假設的 decode tokens/sec（先驗值，可省略）
+#   每次呼叫：
+#     預估耗時 = 排隊/載入（冷模型才有）+ prompt tokens / prefill 速率 + 預期輸出 tokens / decode 速率
+#     速率優先用 LLM_TELEMETRY 最近實測的中位數，預期輸出長度也用同一 prompt 類型最近的實測中位數
+#   → 挑「預估耗時在 SLO 內、品質最高」的模型；都放不進 SLO 就挑預估最快的
+#   冷模型（/api/ps 查不到）要多算載入時間，通常會被跳過；被跳過時在背景預載，下次就能用
+#   沒設 LLM_MODELS 時只有 OLLAMA_MODEL 一個選項，行為跟原本完全相同
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ai.llm_telemetry import LLM_TELEMETRY
+from ai.ollama_client import DEFAULT_KEEP_ALIVE, DEFAULT_MODEL, DEFAULT_OLLAMA_URL, list_loaded_models, preload_model
+from metrics import REGISTRY
+
+# 呼叫端沒給 SLO 時用這個（秒）
+ROUTER_SLO_SECONDS = float(os.getenv("LLM_ROUTER_SLO", os.getenv("LLM_LATENCY_BUDGET", "25")))
+# 沒有實測資料時的先驗值
+PRIOR_DECODE_TPS = float(os.getenv("LLM_ROUTER_PRIOR_TPS", "25"))
+PRIOR_PREFILL_TPS = float(os.getenv("LLM_ROUTER_PRIOR_PREFILL_TPS", "400"))
+PRIOR_LOAD_SECONDS = float(os.getenv("LLM_ROUTER_PRIOR_LOAD_SECONDS", "8"))
+# /api/ps 結果快取秒數（每次呼叫都查一次太貴）
+LOADED_TTL = float(os.getenv("LLM_ROUTER_PS_TTL", "5"))
+# 實測筆數少於這個就跟先驗值混合，避免一兩次異常值主導選擇
+MIN_SAMPLES = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "5"))
+# 被跳過的冷模型多久最多背景預載一次（秒）
+PRELOAD_COOLDOWN = float(os.getenv("LLM_ROUTER_PRELOAD_COOLDOWN", "60"))
+
+# 各 prompt 類型的預期輸出 tokens（沒有實測資料時用；大約 = 中文字數 × 1.3 + JSON 結構）
+EXPECTED_TOKENS: Dict[str, int] = {
+    "insurance": 520,
+    "values": 560,
+    "insurance.summary": 180,
+    "insurance.categories": 140,
+    "insurance.next_step": 120,
+    "insurance.product_advice": 140,
+    "values.profile": 360,
+    "values.advice": 240,
+}
+DEFAULT_EXPECTED_TOKENS = 400
+
+ROUTE_DECISIONS = REGISTRY.counter(
+    "llm_route_total", "Model routing decisions", ("model", "prompt_type", "reason")
+)
+
+
+class ModelOption:
+    __slots__ = ("name", "prior_tps", "rank")
+
+    def __init__(self, name: str, prior_tps: float, rank: int):
+        self.name = name
+        self.prior_tps = prior_tps
+        self.rank = rank
+
+
+def parse_models(spec: str, default_model: str = DEFAULT_MODEL) -> List[ModelOption]:
+    """'a=60,b=25' → [ModelOption]；空字串 → 只有 default_model"""
+    out: List[ModelOption] = []
+    for i, part in enumerate(p.strip() for p in (spec or "").split(",")):
+        if not part:
+            continue
+        name, _, tps = part.rpartition("=") if "=" in part else (part, "", "")
+        try:
+            prior = float(tps) if tps else PRIOR_DECODE_TPS
+        except ValueError:
+            name, prior = part, PRIOR_DECODE_TPS
+        out.append(ModelOption(name.strip(), prior, i))
+    return out or [ModelOption(default_model, PRIOR_DECODE_TPS, 0)]
+
+
+class RouteDecision:
+    __slots__ = ("model", "reason", "predicted_s", "slo_s", "expected_tokens", "candidates")
+
+    def __init__(self, model: str, reason: str, predicted_s: float, slo_s: float, expected_tokens: int,
+                 candidates: List[Dict[str, Any]]):
+        self.model = model
+        self.reason = reason
+        self.predicted_s = predicted_s
+        self.slo_s = slo_s
+        self.expected_tokens = expected_tokens
+        self.candidates = candidates
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class ModelRouter:
+    def __init__(self, models: List[ModelOption], url: str = DEFAULT_OLLAMA_URL, keep_alive: str = DEFAULT_KEEP_ALIVE):
+        self.models = models
+        self.url = url
+        self.keep_alive = keep_alive
+        self._lock = threading.Lock()
+        self._loaded: Tuple[float, Optional[set]] = (0.0, None)
+        self._preloading: Dict[str, float] = {}
+        self.last: Optional[RouteDecision] = None
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.models) > 1
+
+    # -------------------------
+    # 模型是否已載入（/api/ps，短暫快取）
+    # -------------------------
+    def _loaded_models(self) -> Optional[set]:
+        at, names = self._loaded
+        if names is not None and time.time() - at < LOADED_TTL:
+            return names
+        try:
+            names = set(list_loaded_models(self.url))
+        except Exception:
+            # 查不到就當作不知道：不因為 /api/ps 掛掉而把所有模型當冷的
+            names = None
+        self._loaded = (time.time(), names)
+        return names
+
+    def _preload_in_background(self, model: str) -> None:
+        now = time.time()
+        with self._lock:
+            if now - self._preloading.get(model, 0.0) < PRELOAD_COOLDOWN:
+                return
+            self._preloading[model] = now
+
+        def run():
+            try:
+                preload_model(model, self.url, self.keep_alive)
+                self._loaded = (0.0, None)  # 下次重新查 /api/ps
+            except Exception as e:
+                print(f"[router] 背景預載 {model} 失敗：{e}")
+
+        threading.Thread(target=run, name=f"router-preload-{model}", daemon=True).start()
+
+    # -------------------------
+    # 預估
+    # -------------------------
+    @staticmethod
+    def _blend(observed: Optional[float], n: int, prior: float) -> float:
+        if observed is None or n <= 0:
+            return prior
+        if n >= MIN_SAMPLES:
+            return observed
+        w = n / MIN_SAMPLES
+        return observed * w + prior * (1 - w)
+
+    def expected_tokens(self, prompt_type: str) -> int:
+        observed, n = LLM_TELEMETRY.eval_tokens_p50(prompt_type)
+        prior = EXPECTED_TOKENS.get(prompt_type, DEFAULT_EXPECTED_TOKENS)
+        return int(round(self._blend(observed, n, prior)))
+
+    def predict(self, opt: ModelOption, prompt_tokens: int, out_tokens: int, cold: bool) -> Dict[str, Any]:
+        r = LLM_TELEMETRY.model_rates(opt.name)
+        decode_tps = self._blend(r["decode_tps"], r["decode_n"], opt.prior_tps)
+        prefill_tps = self._blend(r["prefill_tps"], r["prefill_n"], PRIOR_PREFILL_TPS)
+        load_s = (r["load_s"] if r["load_s"] else PRIOR_LOAD_SECONDS) if cold else 0.0
+        warm_s = prompt_tokens / max(prefill_tps, 1e-6) + out_tokens / max(decode_tps, 1e-6)
+        return {
+            "model": opt.name,
+            "cold": cold,
+            "decode_tps": round(decode_tps, 1),
+            "prefill_tps": round(prefill_tps, 1),
+            "warm_s": round(warm_s, 3),
+            "predicted_s": round(load_s + warm_s, 3),
+        }
+
+    # -------------------------
+    # 對外
+    # -------------------------
+    def route(self, prompt_type: str, prompt_chars: int = 0, slo_s: Optional[float] = None) -> RouteDecision:
+        slo = ROUTER_SLO_SECONDS if slo_s is None else slo_s
+        if not self.enabled:
+            only = self.models[0].name
+            ROUTE_DECISIONS.inc(only, prompt_type, "single")
+            return RouteDecision(only, "single", 0.0, slo, 0, [])
+
+        out_tokens = self.expected_tokens(prompt_type)
+        # 中文為主的 prompt 大約 1 字 ≈ 1 token，JSON 符號偏少：用字數 / 2 當粗估（跟 fake LLM 一致）
+        prompt_tokens = max(1, prompt_chars // 2)
+        loaded = self._loaded_models()
+        cands = [
+            self.predict(opt, prompt_tokens, out_tokens, cold=(loaded is not None and opt.name not in loaded))
+            for opt in self.models
+        ]
+
+        fits = [(opt, c) for opt, c in zip(self.models, cands) if c["predicted_s"] <= slo]
+        if fits:
+            opt, c = max(fits, key=lambda oc: oc[0].rank)
+            reason = "slo"
+        else:
+            opt, c = min(zip(self.models, cands), key=lambda oc: oc[1]["predicted_s"])
+            reason = "fastest"
+
+        # 品質更高、只因為「冷」才被跳過的模型：背景預載，下一次就有機會選到
+        for o, cc in zip(self.models, cands):
+            if cc["cold"] and o.rank > opt.rank and cc["warm_s"] <= slo:
+                reason = "cold_fallback"
+                self._preload_in_background(o.name)
+
+        decision = RouteDecision(opt.name, reason, c["predicted_s"], slo, out_tokens, cands)
+        ROUTE_DECISIONS.inc(opt.name, prompt_type, reason)
+        self.last = decision
+        return decision
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "models": [{"name": m.name, "prior_tps": m.prior_tps, "rank": m.rank} for m in self.models],
+            "slo_s": ROUTER_SLO_SECONDS,
+            "last": self.last.to_dict() if self.last else None,
+        }
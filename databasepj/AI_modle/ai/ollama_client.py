@@ -2,10 +2,14 @@
 import os
 import re
 import json
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Dict, List, Optional
 
-import requests
-import json5
+from ai.backends import get_backend
+from ai.json_stream import IncrementalJSONObjectScanner
+from ai.llm_telemetry import LLM_TELEMETRY, PEEK_FINAL_CHUNK, StreamMeter, stats_from_response
+from ai.schemas import loads_fast
+from metrics import observe_stage, span
 
 
 # =========================
@@ -14,6 +18,8 @@ import json5
 DEFAULT_OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434/api/generate")
 DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "llama3:8b-instruct-q4_k_m")
 DEFAULT_TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", "180"))
+# 模型常駐時間：避免閒置後被 Ollama 卸載，下一次請求又要重新載入
+DEFAULT_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
 
 
 # =========================
@@ -38,35 +44,79 @@ def _extract_first_json_object(text: str) -> str:
     if start == -1:
         raise ValueError(f"找不到 JSON 開頭 '{{'：{t[:200]}")
 
-    # 用括號計數找出第一個完整 JSON 物件
-    depth = 0
-    in_str = False
-    escape = False
-
-    for i in range(start, len(t)):
-        ch = t[i]
-
-        if in_str:
-            if escape:
-                escape = False
-            elif ch == "\\":
-                escape = True
-            elif ch == '"':
-                in_str = False
-            continue
-        else:
-            if ch == '"':
-                in_str = True
-                continue
-
-            if ch == "{":
-                depth += 1
-            elif ch == "}":
-                depth -= 1
-                if depth == 0:
-                    return t[start : i + 1]
-
-    raise ValueError(f"JSON 物件未閉合，無法解析：{t[start:start+200]}")
+    # 用括號計數找出第一個完整 JSON 物件（與串流時用的是同一個掃描器）
+    sc = IncrementalJSONObjectScanner()
+    sc.feed(t)
+    obj = sc.object_text()
+    if obj is None:
+        raise ValueError(f"JSON 物件未閉合，無法解析：{t[start:start+200]}")
+    return obj
+
+
+class GenerationCancelled(Exception):
+    """呼叫端主動取消生成（例如投機預先生成的報告已經用不到）；不算 LLM 失敗"""
+
+
+def scan_json_stream(
+    chunks, deadline: Optional[float] = None, meter: Optional[StreamMeter] = None, cancel=None
+) -> IncrementalJSONObjectScanner:
+    """
+    邊收 Ollama 串流 chunk 邊掃描；最外層物件一閉合就關掉串流（斷線後 Ollama 會中止生成），
+    不必等模型吐完後面的廢話。deadline（time.time() 秒）到了也會中止並丟 TimeoutError。
+    meter：吞吐量遙測；物件閉合後會再讀一個 chunk 看是不是帶統計的 done chunk
+    （deadline 已過就不讀；讀失敗也不影響已經完整的結果）。
+    cancel：threading.Event；被設起來就關掉串流並丟 GenerationCancelled（讓出 Ollama 的平行槽）。
+    """
+    sc = IncrementalJSONObjectScanner()
+    t0 = time.perf_counter()
+    first = True
+    it = iter(chunks)
+    try:
+        for chunk in it:
+            if first:
+                # 第一個 chunk 到達 = prompt eval 結束；跟總時間分開看才知道慢在排隊/載入還是生成
+                observe_stage("llm.first_token", time.perf_counter() - t0)
+                first = False
+            if meter is not None:
+                meter.observe(chunk)
+            if sc.feed(chunk.get("response") or "") or chunk.get("done"):
+                if meter is not None and PEEK_FINAL_CHUNK and not chunk.get("done"):
+                    _peek_final_chunk(it, deadline, meter)
+                break
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError("LLM 生成超過延遲預算")
+            if cancel is not None and cancel.is_set():
+                raise GenerationCancelled("生成已取消")
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+    return sc
+
+
+def _peek_final_chunk(it, deadline: Optional[float], meter: StreamMeter) -> None:
+    """
+    JSON 已閉合，多讀一個 chunk 只是為了遙測：預算用完就不讀；讀取本身受後端的 deadline 看門狗限制，
+    逾時 / 斷線等錯誤一律吞掉，不能讓遙測把已經完整的報告變成失敗。
+    """
+    if deadline is not None and time.time() >= deadline:
+        return
+    try:
+        tail = next(it, None)
+    except Exception:
+        return
+    if tail is not None and tail.get("done"):
+        meter.observe(tail)
+
+
+def stream_until_json_object(
+    chunks, deadline: Optional[float] = None, meter: Optional[StreamMeter] = None
+) -> Dict[str, Any]:
+    """串流版：物件一閉合就直接回傳 dict，不必再 json5 解析第二次"""
+    sc = scan_json_stream(chunks, deadline=deadline, meter=meter)
+    if not sc.done:
+        raise ValueError(f"JSON 物件未閉合，無法解析：{sc.full_text()[:200]}")
+    return sc.parse()
 
 
 # =========================
@@ -80,6 +130,8 @@ def _post_ollama_generate(
     timeout: int = DEFAULT_TIMEOUT,
     temperature: float = 0.0,
     force_json: bool = True,
+    keep_alive: Optional[str] = DEFAULT_KEEP_ALIVE,
+    prompt_type: str = "generic",
 ) -> str:
     payload: Dict[str, Any] = {
         "model": model,
@@ -90,15 +142,16 @@ def _post_ollama_generate(
             "temperature": temperature
         }
     }
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
 
     # 強制 JSON（最重要：避免 /submit 解析炸掉）
     if force_json:
         payload["format"] = "json"
 
-    resp = requests.post(url, json=payload, timeout=timeout)
-    resp.raise_for_status()
-
-    data = resp.json()
+    with span("llm.generate"):
+        data = get_backend().generate(url, payload, timeout=timeout)
+    LLM_TELEMETRY.record(stats_from_response(data, model, prompt_type))
 
     # Ollama /api/generate 正常會有 response 欄位
     if "response" not in data:
@@ -107,6 +160,80 @@ def _post_ollama_generate(
     return (data.get("response") or "").strip()
 
 
+# =========================
+# 模型狀態：預載 / 查詢是否已載入
+# =========================
+def preload_model(
+    model: str = DEFAULT_MODEL,
+    url: str = DEFAULT_OLLAMA_URL,
+    keep_alive: str = DEFAULT_KEEP_ALIVE,
+    timeout: int = DEFAULT_TIMEOUT,
+) -> None:
+    """
+    不帶 prompt 的 generate 只會把模型載入記憶體，不會產生文字。
+    """
+    payload = {"model": model, "keep_alive": keep_alive, "stream": False}
+    data = get_backend().generate(url, payload, timeout=timeout)
+    # 預熱通常就是冷載入發生的地方：load_duration 一起記
+    LLM_TELEMETRY.record(stats_from_response(data, model, "preload"))
+
+
+def prime_system_prompt(
+    system_prompt: str,
+    model: str = DEFAULT_MODEL,
+    url: str = DEFAULT_OLLAMA_URL,
+    keep_alive: str = DEFAULT_KEEP_ALIVE,
+    timeout: int = DEFAULT_TIMEOUT,
+) -> None:
+    """
+    用 system prompt 跑一次只生成 1 個 token 的請求，
+    讓 Ollama 的 prompt cache 先吃進這段固定前綴，之後的請求 prefill 會快很多。
+    """
+    payload = {
+        "model": model,
+        "system": system_prompt,
+        "prompt": "{}",
+        "stream": False,
+        "keep_alive": keep_alive,
+        "options": {"temperature": 0.0, "num_predict": 1},
+    }
+    data = get_backend().generate(url, payload, timeout=timeout)
+    LLM_TELEMETRY.record(stats_from_response(data, model, "prime"))
+
+
+def probe_generate(
+    model: str = DEFAULT_MODEL,
+    url: str = DEFAULT_OLLAMA_URL,
+    timeout: float = 10,
+) -> bool:
+    """生成 1 個 token 的探測請求；能在 timeout 內回來就算 LLM 可用"""
+    payload = {
+        "model": model,
+        "prompt": "ping",
+        "stream": False,
+        "options": {"temperature": 0.0, "num_predict": 1},
+    }
+    get_backend().generate(url, payload, timeout=timeout)
+    return True
+
+
+def list_loaded_models(url: str = DEFAULT_OLLAMA_URL, timeout: int = 5) -> List[str]:
+    """呼叫 /api/ps，回傳目前常駐在記憶體中的模型名稱"""
+    names: List[str] = []
+    for m in get_backend().loaded_models(url, timeout=timeout):
+        name = m.get("name") or m.get("model")
+        if name:
+            names.append(name)
+    return names
+
+
+def is_model_loaded(model: str = DEFAULT_MODEL, url: str = DEFAULT_OLLAMA_URL) -> bool:
+    try:
+        return model in list_loaded_models(url)
+    except Exception:
+        return False
+
+
 # =========================
 # 對外：給 app.py 用的函式（保持相容性）
 # =========================
@@ -116,9 +243,11 @@ def call_ollama_api(
     model: str = DEFAULT_MODEL,
     url: str = DEFAULT_OLLAMA_URL,
     timeout: int = DEFAULT_TIMEOUT,
+    prompt_type: str = "generic",
 ) -> str:
     """
     回傳「乾淨的 JSON 字串」給外部再 json/json5.loads。
+    prompt_type：遙測分組用（values / insurance …）
     這個名稱刻意保留常見用法，避免你 app.py import 後爆掉。
     """
     prompt = f"以下是完整的用戶問卷數據（JSON）:\n{user_input_json}\n\n請只輸出純 JSON："
@@ -132,18 +261,19 @@ def call_ollama_api(
             timeout=timeout,
             temperature=0.0,
             force_json=True,
+            prompt_type=prompt_type,
         )
 
         # 1) 先嘗試直接解析（因為 format=json 通常會是純 JSON）
         try:
-            _ = json5.loads(full_response)
+            _ = loads_fast(full_response)
             return full_response
         except Exception:
             pass
 
         # 2) 容錯：抽出 JSON 再回傳
         json_str = _extract_first_json_object(full_response)
-        _ = json5.loads(json_str)  # 再驗證一次，確保回傳的是可解析的 JSON
+        _ = loads_fast(json_str)  # 再驗證一次，確保回傳的是可解析的 JSON
         return json_str
 
     except Exception as e:
@@ -157,13 +287,32 @@ def call_ollama_json(
     model: str = DEFAULT_MODEL,
     url: str = DEFAULT_OLLAMA_URL,
     timeout: int = DEFAULT_TIMEOUT,
+    schema: Optional[Dict[str, Any]] = None,
+    prompt_type: str = "generic",
+    input_label: str = "用戶問卷數據",
 ) -> Dict[str, Any]:
     """
-    你如果想要「直接回 dict」可用這個。
+    你如果想要「直接回 dict」可用這個（串流 + 提早結束）。
+    schema：傳 JSON Schema 會改用 Ollama structured output。
+    input_label：prompt 裡怎麼稱呼這份輸入（離線商品摘要用「商品資料」）。
     """
     user_input_json = json.dumps(user_input, ensure_ascii=False, indent=2)
-    s = call_ollama_api(system_prompt, user_input_json, model=model, url=url, timeout=timeout)
-    return json5.loads(s)
+    prompt = f"以下是完整的{input_label}（JSON）:\n{user_input_json}\n\n請只輸出純 JSON："
+    payload: Dict[str, Any] = {
+        "model": model,
+        "prompt": prompt,
+        "system": system_prompt,
+        "format": schema or "json",
+        "keep_alive": DEFAULT_KEEP_ALIVE,
+        "options": {"temperature": 0.0},
+    }
+    meter = StreamMeter(model, prompt_type)
+    try:
+        return stream_until_json_object(get_backend().generate_stream(url, payload, timeout=timeout), meter=meter)
+    except Exception as e:
+        raise Exception(f"AI 分析失敗：{e}")
+    finally:
+        LLM_TELEMETRY.record(meter.finish())
 
 
 # 相容別名（避免你其他檔案用不同名字）
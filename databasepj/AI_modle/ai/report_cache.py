@@ -0,0 +1,245 @@
+# AI_modle/ai/report_cache.py
+# 功能：價值觀報告文案的「分桶近似快取」
+#   價值觀 LLM 文案幾乎只取決於量化後的維度輪廓（6 維、每維 20 分一格）+ 人格類型，
+#   因此同一個輪廓 key 可以重複使用先前生成的 value_profile / insurance_advice，
+#   每個 key 保留少量變體，避免所有人拿到一模一樣的文字。
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from database.result_store import RESULT_DB_PATH
+
+
+# =========================
+# 基本設定（可用環境變數覆蓋）
+# =========================
+VALUES_CACHE_ENABLED = os.getenv("VALUES_CACHE", "1") not in ("0", "false", "False")
+# 每個 key 最多保留幾個變體；湊滿之前仍走 LLM 並把結果收進來
+VALUES_CACHE_VARIANTS = int(os.getenv("VALUES_CACHE_VARIANTS", "3"))
+# 作答題數太少時輪廓沒有代表性，不用快取
+VALUES_CACHE_MIN_ANSWERED = int(os.getenv("VALUES_CACHE_MIN_ANSWERED", "6"))
+# 每個 worker 多久重新讀一次 SQLite（秒）：其他 worker / 離線批次新寫入的變體才看得到；0 = 只在啟動時讀
+VALUES_CACHE_REFRESH = float(os.getenv("VALUES_CACHE_REFRESH", "300"))
+# 跟結果儲存放同一個執行期 DB，不去改動商品目錄 product.db
+VALUES_CACHE_DB = os.getenv("VALUES_CACHE_DB", RESULT_DB_PATH)
+
+# 快取的欄位（其餘欄位如 value_metrics 每次都重新計算）
+NARRATIVE_FIELDS = ("value_profile", "insurance_advice")
+
+BUCKET = 20
+
+
+def _quantize(v: Any) -> int:
+    try:
+        x = float(v)
+    except (TypeError, ValueError):
+        return 0
+    return int(round(x / BUCKET) * BUCKET)
+
+
+def profile_key(profile_type: str, dims: Sequence[Any]) -> str:
+    """例：'均衡務實型|40-60-60-20-80-60'"""
+    return f"{profile_type or '未知'}|" + "-".join(str(_quantize(d)) for d in dims)
+
+
+class ValuesNarrativeCache:
+    """
+    記憶體裡是 key -> [variant, ...]；同時寫入 SQLite，重啟後可直接沿用，
+    也讓離線批次（pregenerate_values_cache.py）預先產生的文案能被線上讀到。
+    """
+
+    def __init__(
+        self,
+        db_path: str = VALUES_CACHE_DB,
+        max_variants: int = VALUES_CACHE_VARIANTS,
+        refresh_interval: float = VALUES_CACHE_REFRESH,
+    ):
+        self.db_path = db_path
+        self.max_variants = max(1, int(max_variants))
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._pool: Dict[str, List[Dict[str, Any]]] = {}
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._rng = random.Random()
+        self.hits = 0
+        self.misses = 0
+
+    # -------------------------
+    # SQLite
+    # -------------------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS values_narrative_cache (
+                profile_key TEXT NOT NULL,
+                variant INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (profile_key, variant)
+            )
+            """
+        )
+        return conn
+
+    def _load_locked(self) -> None:
+        """整份從 SQLite 重讀（呼叫端持有 _lock）；讀失敗就保留原本的內容"""
+        try:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    "SELECT profile_key, payload FROM values_narrative_cache ORDER BY profile_key, variant"
+                ).fetchall()
+            finally:
+                conn.close()
+            pool: Dict[str, List[Dict[str, Any]]] = {}
+            for key, payload in rows:
+                pool.setdefault(key, []).append(json.loads(payload))
+            self._pool = pool
+        except sqlite3.Error:
+            # 快取壞掉不影響主流程，只是全部 miss
+            pass
+        self._loaded = True
+        self._loaded_at = time.time()
+
+    def _stale(self) -> bool:
+        if not self._loaded:
+            return True
+        return self.refresh_interval > 0 and time.time() - self._loaded_at > self.refresh_interval
+
+    def _ensure_loaded(self) -> None:
+        if not self._stale():
+            return
+        with self._lock:
+            if self._stale():
+                self._load_locked()
+
+    def refresh(self) -> int:
+        """立刻重讀 SQLite（離線批次跑完、或別的 worker 寫入後）；回傳 key 數"""
+        with self._lock:
+            self._load_locked()
+            return len(self._pool)
+
+    def invalidate(self, key: Optional[str] = None) -> int:
+        """丟掉某個 key（或 None = 全部）的變體，記憶體與 SQLite 一起刪；回傳刪掉的變體數"""
+        self._ensure_loaded()
+        with self._lock:
+            if key is None:
+                n = sum(len(v) for v in self._pool.values())
+                self._pool = {}
+            else:
+                n = len(self._pool.pop(key, None) or [])
+        try:
+            conn = self._connect()
+            try:
+                if key is None:
+                    conn.execute("DELETE FROM values_narrative_cache")
+                else:
+                    conn.execute("DELETE FROM values_narrative_cache WHERE profile_key = ?", (key,))
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            pass
+        return n
+
+    def _persist(self, key: str, narrative: Dict[str, Any]) -> Optional[Tuple[bool, List[Dict[str, Any]]]]:
+        """
+        寫進 SQLite，回傳 (這次有沒有新增, 寫完後 DB 裡這個 key 的全部變體)；DB 出錯回 None。
+        多 worker 會同時寫同一個 key：變體編號不在各 process 自己算，而是在 BEGIN IMMEDIATE 交易裡
+        讀現有變體 → 已滿 / 重複就不寫 → 否則取 MAX(variant)+1，不會互相覆蓋。
+        """
+        try:
+            conn = self._connect()
+            try:
+                conn.isolation_level = None
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    rows = conn.execute(
+                        "SELECT variant, payload FROM values_narrative_cache WHERE profile_key = ? ORDER BY variant",
+                        (key,),
+                    ).fetchall()
+                    variants = [json.loads(p) for _, p in rows]
+                    inserted = len(variants) < self.max_variants and narrative not in variants
+                    if inserted:
+                        conn.execute(
+                            "INSERT INTO values_narrative_cache VALUES (?, ?, ?, ?)",
+                            (key, (rows[-1][0] + 1) if rows else 0, json.dumps(narrative, ensure_ascii=False), time.time()),
+                        )
+                        variants.append(narrative)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            finally:
+                conn.close()
+        except (sqlite3.Error, ValueError):
+            return None
+        return inserted, variants
+
+    # -------------------------
+    # 對外
+    # -------------------------
+    def variant_count(self, key: str) -> int:
+        self._ensure_loaded()
+        return len(self._pool.get(key) or [])
+
+    def is_full(self, key: str) -> bool:
+        return self.variant_count(key) >= self.max_variants
+
+    def get(self, key: str, count: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        變體湊滿才回傳（隨機挑一個）；未滿回 None，讓呼叫端繼續走 LLM 收集變體。
+        count=False：不算進 hits / misses（/progress 背景推測查快取，不是真正的請求）
+        """
+        self._ensure_loaded()
+        with self._lock:
+            variants = self._pool.get(key) or []
+            if len(variants) < self.max_variants:
+                if count:
+                    self.misses += 1
+                return None
+            if count:
+                self.hits += 1
+            chosen = variants[self._rng.randrange(len(variants))]
+        return json.loads(json.dumps(chosen))
+
+    def put(self, key: str, report: Dict[str, Any]) -> bool:
+        narrative = {k: report.get(k) for k in NARRATIVE_FIELDS if report.get(k)}
+        if len(narrative) != len(NARRATIVE_FIELDS):
+            return False
+        self._ensure_loaded()
+        with self._lock:
+            variants = self._pool.get(key) or []
+            if len(variants) >= self.max_variants or narrative in variants:
+                return False
+        persisted = self._persist(key, narrative)
+        with self._lock:
+            if persisted is None:
+                # DB 寫不進去：至少這個 process 還能用（跟原本「快取壞掉不影響主流程」一致）
+                variants = self._pool.setdefault(key, [])
+                if len(variants) >= self.max_variants or narrative in variants:
+                    return False
+                variants.append(narrative)
+                return True
+            # 以 DB 為準：別的 worker 剛寫進去的變體也一起收進來，各 worker 看到的變體數跟磁碟上一致
+            inserted, on_disk = persisted
+            self._pool[key] = on_disk[: self.max_variants]
+            return inserted
+
+    def stats(self) -> Dict[str, Any]:
+        self._ensure_loaded()
+        with self._lock:
+            full = sum(1 for v in self._pool.values() if len(v) >= self.max_variants)
+            return {
+                "keys": len(self._pool),
+                "full_keys": full,
+                "hits": self.hits,
+                "misses": self.misses,
+                "loaded_at": round(self._loaded_at, 3) or None,
+            }
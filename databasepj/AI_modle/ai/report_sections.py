@@ -0,0 +1,107 @@
+# AI_modle/ai/report_sections.py
+# 功能：報告分段平行生成（fan-out）
+#   一份報告的各欄位彼此獨立，整份一次生成時 decode 是逐欄位串行的；
+#   REPORT_FANOUT=1 時把報告拆成幾個小段，各自帶「只輸出這幾個欄位」的子 schema 同時送出，
+#   Ollama 有多個平行槽（OLLAMA_NUM_PARALLEL>1）時，整體耗時約為最長那一段而不是全部相加。
+#   - system prompt 與使用者資料完全相同、分段指示放在 prompt 最後 → 共用已預熱的 prompt 前綴
+#   - 合併後的 JSON 形狀與整份生成相同；個別段落失敗時記在 sections_failed，由呼叫端補規則版內容
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from ai.schemas import REPORT_SCHEMAS, _strip_defaults
+
+REPORT_FANOUT_ENABLED = os.getenv("REPORT_FANOUT", "0") in ("1", "true", "True")
+# 一份報告同時送出幾段；超過 Ollama 的平行槽數只會在伺服器端排隊，沒有好處
+REPORT_FANOUT_PARALLEL = max(1, int(os.getenv("REPORT_FANOUT_PARALLEL", os.getenv("OLLAMA_NUM_PARALLEL", "4"))))
+
+
+class ReportSection:
+    """報告中的一段：負責哪些欄位 + 附加在 prompt 最後的指示 + 只含這些欄位的 format schema"""
+
+    __slots__ = ("quiz_id", "name", "fields", "instruction", "_format")
+
+    def __init__(self, quiz_id: str, name: str, fields: Tuple[str, ...], instruction: str):
+        self.quiz_id = quiz_id
+        self.name = name
+        self.fields = fields
+        self.instruction = instruction
+        self._format: Optional[Dict[str, Any]] = None
+
+    @property
+    def prompt_type(self) -> str:
+        """遙測分組用：insurance.summary、values.advice …"""
+        return f"{self.quiz_id}.{self.name}"
+
+    def prompt(self, user_input_json: str) -> str:
+        keys = "、".join(f"\"{f}\"" for f in self.fields)
+        return (
+            f"{user_input_json}\n\n"
+            f"【本次只輸出以下欄位】{keys}\n"
+            f"{self.instruction}\n"
+            "其他欄位由其他請求負責，請勿輸出；仍然只輸出純 JSON 物件。"
+        )
+
+    def ollama_format(self) -> Dict[str, Any]:
+        if self._format is None:
+            full = _strip_defaults(REPORT_SCHEMAS[self.quiz_id])
+            props = full.get("properties") or {}
+            self._format = {
+                "type": "object",
+                "properties": {f: props[f] for f in self.fields},
+                "required": list(self.fields),
+            }
+        return self._format
+
+    def pick(self, obj: Any) -> Dict[str, Any]:
+        """只取本段負責的欄位（模型多吐的欄位不能蓋掉別段的結果）"""
+        if not isinstance(obj, dict):
+            return {}
+        return {f: obj[f] for f in self.fields if f in obj}
+
+
+REPORT_SECTIONS: Dict[str, List[ReportSection]] = {
+    "insurance": [
+        ReportSection("insurance", "summary", ("person_summary",),
+                      "person_summary：描述這是什麼樣的人（繁體中文，120字以內）。"),
+        ReportSection("insurance", "categories", ("top_categories",),
+                      "top_categories：3 個優先保障類別，每項含 name 與 reason（原因 30 字內），依規則計分結果排序。"),
+        ReportSection("insurance", "next_step", ("next_step",),
+                      "next_step：3 點下一步建議（繁體中文）。"),
+        ReportSection("insurance", "product_advice", ("product_advice",),
+                      "product_advice：針對推薦商品的購買/比較重點 3 點（繁體中文）。"),
+    ],
+    "values": [
+        ReportSection("values", "profile", ("value_profile",),
+                      "value_profile：Type（人格/價值觀類型）與 Reason（150~220 字，觀察 → 推論 → 建議方向）。"),
+        ReportSection("values", "advice", ("insurance_advice",),
+                      "insurance_advice：5 點保險建議，語氣專業、可直接拿來講 Demo。"),
+    ],
+}
+
+
+def sections_for(quiz_id: str) -> List[ReportSection]:
+    """沒開 fan-out 或這種報告沒有分段設定 → 空 list（呼叫端走整份生成）"""
+    if not REPORT_FANOUT_ENABLED:
+        return []
+    return REPORT_SECTIONS.get(quiz_id) or []
+
+
+def merge_sections(
+    results: List[Tuple[ReportSection, Optional[Dict[str, Any]], str]],
+) -> Dict[str, Any]:
+    """
+    results：[(段落, 解析後 dict 或 None, 失敗原因)]。
+    合併成整份報告的形狀；失敗的段落列在 sections_failed（欄位名），交給呼叫端補值。
+    """
+    merged: Dict[str, Any] = {"status": "success"}
+    failed: List[str] = []
+    for section, obj, error in results:
+        part = section.pick(obj) if obj is not None and not error else {}
+        if isinstance(obj, dict) and obj.get("status") == "error":
+            part = {}
+        missing = [f for f in section.fields if f not in part]
+        failed.extend(missing)
+        merged.update(part)
+    if failed:
+        merged["sections_failed"] = failed
+    return merged
@@ -0,0 +1,174 @@
+# AI_modle/ai/schemas.py
+# 功能：各報告的 JSON Schema（傳給 Ollama structured output 的 format）
+#       + 快速解析（orjson / json → json5）+ 依 schema 補預設值
+import json
+from typing import Any, Dict, List, Tuple
+
+try:
+    import orjson  # 選用：有裝就用，比標準 json 再快數倍
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+# =========================
+# Schema（"default" 是本系統補值用；Ollama 會忽略不認得的關鍵字）
+# =========================
+VALUES_REPORT_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "status": {"type": "string", "default": "success"},
+        "value_profile": {
+            "type": "object",
+            "properties": {
+                "Type": {"type": "string", "default": "未知"},
+                "Reason": {"type": "string", "default": "AI 回傳格式不完整"},
+            },
+            "required": ["Type", "Reason"],
+            "default": {"Type": "未知", "Reason": "AI 回傳格式不完整"},
+        },
+        "insurance_advice": {
+            "type": "array",
+            "items": {"type": "string"},
+            "default": [],
+        },
+    },
+    "required": ["status", "value_profile", "insurance_advice"],
+}
+
+INSURANCE_REPORT_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "status": {"type": "string", "default": "success"},
+        "person_summary": {"type": "string", "default": "（系統未回傳完整摘要）"},
+        "top_categories": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string", "default": "未提供"},
+                    "reason": {"type": "string", "default": ""},
+                },
+                "required": ["name", "reason"],
+            },
+            "default": [],
+        },
+        "next_step": {"type": "array", "items": {"type": "string"}, "default": []},
+        "product_advice": {"type": "array", "items": {"type": "string"}, "default": []},
+    },
+    "required": ["status", "person_summary", "top_categories", "next_step", "product_advice"],
+}
+
+REPORT_SCHEMAS = {
+    "values": VALUES_REPORT_SCHEMA,
+    "insurance": INSURANCE_REPORT_SCHEMA,
+}
+
+
+def _strip_defaults(schema: Any) -> Any:
+    if isinstance(schema, dict):
+        return {k: _strip_defaults(v) for k, v in schema.items() if k != "default"}
+    if isinstance(schema, list):
+        return [_strip_defaults(x) for x in schema]
+    return schema
+
+
+def ollama_format(quiz_id: str) -> Any:
+    """給 Ollama payload["format"] 用；找不到 schema 就退回單純的 "json" 模式"""
+    schema = REPORT_SCHEMAS.get(quiz_id)
+    return _strip_defaults(schema) if schema else "json"
+
+
+# =========================
+# 解析：快路徑 → json5
+# =========================
+def loads_fast(text: str) -> Any:
+    """
+    LLM 在 structured output 下幾乎都是合法 JSON，先走 C 實作的 orjson/json；
+    只有單引號、尾逗號這類不合規格的輸出才退回純 Python 的 json5。
+    """
+    try:
+        if orjson is not None:
+            return orjson.loads(text)
+        return json.loads(text)
+    except ValueError:
+        # 純 Python 的 json5 只在退回時才載入，不拖慢啟動
+        import json5
+
+        return json5.loads(text)
+
+
+# =========================
+# 驗證 + 補預設值
+# =========================
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+}
+
+
+def _default_of(schema: Dict[str, Any]) -> Any:
+    d = schema.get("default")
+    # 複製一份，避免不同請求共用同一個 list/dict
+    return json.loads(json.dumps(d)) if isinstance(d, (dict, list)) else d
+
+
+def _fill(value: Any, schema: Dict[str, Any], path: str, errors: List[str]) -> Any:
+    t = schema.get("type")
+    check = _TYPE_CHECKS.get(t)
+    if check is not None and not check(value):
+        # 型別不對：字串可以容忍數字（模型偶爾吐數字），其他一律換成預設值
+        if t == "string" and isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        errors.append(f"{path}: 應為 {t}")
+        return _default_of(schema)
+
+    if t == "object":
+        props = schema.get("properties") or {}
+        for key in schema.get("required") or []:
+            sub = props.get(key) or {}
+            if key not in value or value.get(key) is None:
+                if "default" in sub:
+                    value[key] = _default_of(sub)
+                else:
+                    errors.append(f"{path}.{key}: 缺少欄位")
+        for key, sub in props.items():
+            if key in value and value[key] is not None:
+                value[key] = _fill(value[key], sub, f"{path}.{key}", errors)
+        return value
+
+    if t == "array":
+        items = schema.get("items")
+        if items:
+            out = []
+            for i, x in enumerate(value):
+                y = _fill(x, items, f"{path}[{i}]", errors)
+                if y is not None:
+                    out.append(y)
+            return out
+        return value
+
+    return value
+
+
+def apply_schema_defaults(obj: Dict[str, Any], schema: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    依 schema 就地補齊缺漏欄位、修正型別錯誤，回傳 (obj, errors)。
+    errors 只是紀錄用，補完的 obj 一定符合模板需要的形狀。
+    """
+    errors: List[str] = []
+    if not isinstance(obj, dict):
+        errors.append("$: 應為 object")
+        obj = {}
+    return _fill(obj, schema, "$", errors), errors
+
+
+def apply_report_defaults(quiz_id: str, obj: Dict[str, Any]) -> Dict[str, Any]:
+    schema = REPORT_SCHEMAS.get(quiz_id)
+    if schema is None:
+        return obj
+    filled, _ = apply_schema_defaults(obj, schema)
+    return filled
@@ -0,0 +1,350 @@
+# AI_modle/ai/speculative.py
+# 功能：依問卷作答進度「投機」預先生成報告（speculative prefetch）
+#   使用者填問卷要好幾分鐘，原本按下送出才開始呼叫 LLM。
+#   script.js 作答途中把進度快照送到 /progress（含目前這題已點選、還沒按下一題的選項）；
+#   作答比例到 SPECULATIVE_MIN_PROGRESS 以上時，推測最終答案 = 目前答案 + 其他人最常見的答案補齊未作答題，
+#   先在背景跑一次報告：
+#     - 推測答案已命中文案快取 → 不用做任何事（送出時一樣會命中）
+#     - 沒命中 → 背景呼叫 LLM；價值觀報告照常收進分桶文案快取，但只算那一桶的一個變體：
+#       要等同一桶湊滿 VALUES_CACHE_VARIANTS 個變體，之後落在同一桶的答案才會命中。
+#       所以這次送出能不能省掉 LLM，只看下面的「prompt 完全相同」
+#   每個 session 只保留一個工作；新快照推測出不同的 prompt 時取消舊工作（串流中的會關掉連線，Ollama 停止生成）
+#   /submit 帶同一個 session_id：prompt 完全相同 → 直接用結果（還在跑就等它跑完，但只等到它本身的預算用完、
+#   失敗也不再重跑一次，使用者的等待上限仍是一個 LLM_LATENCY_BUDGET）；不同 → 取消，照原流程
+#   背景工作跟真正的 /submit 搶同一個 Ollama：預設關閉（SPECULATIVE_PREFETCH=1 才開），
+#   session 數與排隊中的工作都有上限，執行緒池忙的時候新快照直接丟掉，不排隊
+#   規則計分 / 推薦 / 量化圖表一律用最終答案重算，只有 LLM 那一段可以沿用
+#   工作存在「這個 process」的記憶體裡：/progress 與 /submit 必須落在同一個 process 才接得上。
+#   多 worker 部署（gunicorn workers > 1）時，/submit 多半到別的 worker、claim 不到，背景生成只是白佔 Ollama，
+#   所以 gunicorn.conf.py 在 workers > 1 時強制關閉；ASGI（asgi_app.py）請用單一 process 跑
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+SPECULATIVE_ENABLED = os.getenv("SPECULATIVE_PREFETCH", "0") not in ("0", "false", "False")
+# 哪些問卷要投機生成（保單報告的 prompt 含推薦商品，推測答案差一題就整個不同，預設只做價值觀）
+SPECULATIVE_QUIZZES = tuple(q.strip() for q in os.getenv("SPECULATIVE_QUIZZES", "values").split(",") if q.strip())
+# 已作答比例到多少才開始（太早推測，最後幾題一改就白做）
+SPECULATIVE_MIN_PROGRESS = float(os.getenv("SPECULATIVE_MIN_PROGRESS", "0.75"))
+# 同時跑幾個投機工作；跟真正的 /submit 搶同一個 Ollama，不要開太多
+SPECULATIVE_WORKERS = max(1, int(os.getenv("SPECULATIVE_WORKERS", "2")))
+# 執行中之外最多再排隊幾個；滿了新的快照就不啟動（不要讓佇列越堆越長、跑的都是早就過時的推測）
+SPECULATIVE_MAX_QUEUED = max(0, int(os.getenv("SPECULATIVE_MAX_QUEUED", "2")))
+# 同時追蹤幾個 session；超過就不替新的 session 啟動工作
+SPECULATIVE_MAX_SESSIONS = max(1, int(os.getenv("SPECULATIVE_MAX_SESSIONS", "200")))
+# session 多久沒送快照 / 沒送出就丟掉（秒）
+SPECULATIVE_TTL = float(os.getenv("SPECULATIVE_TTL", "900"))
+# 「最常見答案」統計的快取秒數（要掃過全部已儲存的問卷）
+SPECULATIVE_PRIOR_TTL = float(os.getenv("SPECULATIVE_PRIOR_TTL", "600"))
+
+SPECULATIVE_TOTAL = REGISTRY.counter(
+    "speculative_report_total", "Speculative report prefetch events", ("quiz_id", "outcome")
+)
+
+
+def _answered(v: Any) -> bool:
+    if isinstance(v, dict):
+        return bool(v.get("choice") or v.get("multi") or str(v.get("free_text") or "").strip())
+    return v not in (None, "", [], {})
+
+
+def prompt_key(ai_input: str) -> str:
+    """
+    prompt 內容的雜湊；key 排序後再算：歷史答案存檔時排序過、前端 key 順序也可能不同，
+    內容相同就算同一份（報告只取決於內容，不取決於欄位順序）
+    """
+    try:
+        canonical = json.dumps(json.loads(ai_input), ensure_ascii=False, sort_keys=True)
+    except ValueError:
+        canonical = ai_input
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+# =========================
+# 推測：其他人最常見的答案
+# =========================
+class AnswerPrior:
+    """
+    source(quiz_id) → 已儲存問卷的 answers（可迭代）；每題取出現最多次的原始答案。
+    結果快取 SPECULATIVE_PRIOR_TTL 秒；沒有歷史資料時未作答題就維持空白。
+    """
+
+    def __init__(self, source: Callable[[str], Iterable[Dict[str, Any]]], ttl: float = SPECULATIVE_PRIOR_TTL):
+        self.source = source
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+    def _compute(self, quiz_id: str) -> Dict[str, Any]:
+        counts: Dict[str, Dict[str, List[Any]]] = {}
+        for answers in self.source(quiz_id):
+            if not isinstance(answers, dict):
+                continue
+            for qid, v in answers.items():
+                if not _answered(v):
+                    continue
+                k = json.dumps(v, ensure_ascii=False, sort_keys=True)
+                slot = counts.setdefault(qid, {}).setdefault(k, [0, v])
+                slot[0] += 1
+        return {qid: max(c.values(), key=lambda nv: nv[0])[1] for qid, c in counts.items()}
+
+    def most_likely(self, quiz_id: str) -> Dict[str, Any]:
+        at, prior = self._cache.get(quiz_id, (0.0, None))
+        if prior is not None and time.time() - at < self.ttl:
+            return prior
+        with self._lock:
+            at, prior = self._cache.get(quiz_id, (0.0, None))
+            if prior is None or time.time() - at >= self.ttl:
+                try:
+                    prior = self._compute(quiz_id)
+                except Exception:
+                    prior = {}
+                self._cache[quiz_id] = (time.time(), prior)
+        return prior
+
+
+# =========================
+# 每個 session 一個投機工作
+# =========================
+class SpeculativeJob:
+    __slots__ = ("session_id", "quiz_id", "key", "future", "cancel", "created_at", "started_at")
+
+    def __init__(self, session_id: str, quiz_id: str, key: str):
+        self.session_id = session_id
+        self.quiz_id = quiz_id
+        self.key = key
+        self.future: Optional[Future] = None
+        self.cancel = threading.Event()
+        self.created_at = time.time()
+        # 執行緒池真正開始跑的時間；LLM 呼叫的預算從這裡起算
+        self.started_at = 0.0
+
+    def remaining(self, budget: float) -> float:
+        """這個工作的 LLM 預算還剩多少秒（/submit 最多只等這麼久）"""
+        if not self.started_at:
+            return budget
+        return max(0.0, budget - (time.time() - self.started_at))
+
+    def abort(self) -> None:
+        """還在排隊就直接移出佇列；已經在跑的由串流檢查 cancel 後中止"""
+        self.cancel.set()
+        if self.future is not None:
+            self.future.cancel()
+
+
+class SpeculativeReports:
+    """
+    prepare(quiz_id, answers) → ctx（與 /submit 相同的 _prepare_report）
+    generate(system_prompt, ai_input, quiz_id, cancel) → (ai_data, degraded_reason)
+    remember(ctx, ai_data)：成功時寫進文案快取（_finalize_report）
+    """
+
+    def __init__(
+        self,
+        prepare: Callable[[str, Any], Dict[str, Any]],
+        generate: Callable[..., Tuple[Optional[dict], str]],
+        remember: Optional[Callable[[Dict[str, Any], dict], Any]] = None,
+        prior: Optional[AnswerPrior] = None,
+        enabled: bool = SPECULATIVE_ENABLED,
+        quizzes: Tuple[str, ...] = SPECULATIVE_QUIZZES,
+        workers: int = SPECULATIVE_WORKERS,
+        max_queued: int = SPECULATIVE_MAX_QUEUED,
+        max_sessions: int = SPECULATIVE_MAX_SESSIONS,
+    ):
+        self.prepare = prepare
+        self.generate = generate
+        self.remember = remember
+        self.prior = prior
+        self.enabled = enabled
+        self.quizzes = quizzes
+        self.workers = workers
+        self.max_sessions = max_sessions
+        # 執行中 + 排隊中的名額；拿不到就丟掉這次快照（工作結束或被取消時由 done callback 歸還）
+        self._slots = threading.BoundedSemaphore(workers + max_queued)
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, SpeculativeJob] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        # 第一次用到才建立（gunicorn preload 時不在 master 建好執行緒再 fork）
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="speculative")
+        return self._pool
+
+    # -------------------------
+    # 推測最終答案
+    # -------------------------
+    def predict(self, quiz_id: str, answers: Dict[str, Any], total: Optional[int] = None) -> Tuple[Dict[str, Any], int, int]:
+        """
+        回傳 (推測答案, 已作答題數, 總題數)；補上的題目接在前端答案後面。
+        """
+        prior = self.prior.most_likely(quiz_id) if self.prior is not None else {}
+        answered = sum(1 for v in answers.values() if _answered(v))
+        predicted: Dict[str, Any] = {}
+        for qid, v in answers.items():
+            predicted[qid] = v if _answered(v) or qid not in prior else prior[qid]
+        for qid, v in prior.items():
+            if qid not in predicted:
+                predicted[qid] = v
+        total = int(total or 0) or max(len(answers), len(predicted))
+        return predicted, answered, total
+
+    # -------------------------
+    # /progress
+    # -------------------------
+    def _gc(self) -> None:
+        now = time.time()
+        for sid, job in list(self._jobs.items()):
+            if now - job.created_at > SPECULATIVE_TTL:
+                job.abort()
+                del self._jobs[sid]
+
+    def _run(self, job: SpeculativeJob, ctx: Dict[str, Any]) -> Tuple[Optional[dict], str]:
+        job.started_at = time.time()
+        if job.cancel.is_set():
+            return None, "cancelled"
+        ai_data, reason = self.generate(ctx["system_prompt"], ctx["ai_input"], ctx["quiz_id"], job.cancel)
+        if job.cancel.is_set():
+            return None, "cancelled"
+        if ai_data is not None and self.remember is not None:
+            try:
+                # _finalize_report 會改動傳進去的 dict：給一份複本，原本的留給 /submit 用
+                self.remember(ctx, copy.deepcopy(ai_data))
+            except Exception as e:
+                print(f"[speculative] 寫入文案快取失敗：{e}")
+        return ai_data, reason
+
+    def observe(self, session_id: str, quiz_id: str, answers: Any, total: Optional[int] = None) -> Dict[str, Any]:
+        """收到進度快照；回傳目前狀態（給前端除錯用，前端不需要等它）"""
+        if not self.enabled or not session_id or quiz_id not in self.quizzes or not isinstance(answers, dict):
+            return {"status": "skipped"}
+        predicted, answered, total = self.predict(quiz_id, answers, total)
+        if answered < total * SPECULATIVE_MIN_PROGRESS:
+            return {"status": "waiting", "answered": answered, "total": total}
+
+        ctx = self.prepare(quiz_id, predicted)
+        if ctx.get("ai_input") is None:
+            # 推測答案已命中文案快取：送出時一樣會命中，不用先跑
+            self.discard(session_id)
+            SPECULATIVE_TOTAL.inc(quiz_id, "cached")
+            return {"status": "cached", "answered": answered, "total": total}
+
+        key = prompt_key(ctx["ai_input"])
+        with self._lock:
+            self._gc()
+            old = self._jobs.get(session_id)
+            if old is not None and old.key == key and not old.cancel.is_set():
+                return {"status": "done" if old.future.done() else "running", "answered": answered, "total": total}
+            if old is not None:
+                # 推測變了：舊的先取消（還在排隊的會立刻讓出名額）
+                old.abort()
+                del self._jobs[session_id]
+                SPECULATIVE_TOTAL.inc(quiz_id, "replaced")
+            # session 數已滿，或執行緒池忙（執行中 + 排隊已滿）：這次不推測，等下一個快照再試
+            if len(self._jobs) >= self.max_sessions or not self._slots.acquire(blocking=False):
+                self.dropped += 1
+                SPECULATIVE_TOTAL.inc(quiz_id, "dropped")
+                return {"status": "busy", "answered": answered, "total": total}
+            job = SpeculativeJob(session_id, quiz_id, key)
+            try:
+                job.future = self._get_pool().submit(self._run, job, ctx)
+            except RuntimeError:
+                self._slots.release()
+                raise
+            job.future.add_done_callback(lambda _f: self._slots.release())
+            self._jobs[session_id] = job
+        SPECULATIVE_TOTAL.inc(quiz_id, "started")
+        return {"status": "started", "answered": answered, "total": total}
+
+    def discard(self, session_id: str) -> None:
+        with self._lock:
+            job = self._jobs.pop(session_id, None)
+        if job is not None:
+            job.abort()
+
+    # -------------------------
+    # /submit
+    # -------------------------
+    def claim(self, session_id: Optional[str], ctx: Dict[str, Any]) -> Optional[SpeculativeJob]:
+        """
+        送出時取走這個 session 的工作；prompt 跟最終答案相同、而且已經開始跑才回傳，
+        其餘情況（沒有 / 答案變了 / 還在排隊）取消它並回 None，呼叫端照原流程呼叫 LLM。
+        """
+        if not session_id:
+            return None
+        with self._lock:
+            job = self._jobs.pop(session_id, None)
+        if job is None:
+            return None
+        quiz_id = ctx.get("quiz_id") or job.quiz_id
+        if ctx.get("ai_input") is None:
+            job.abort()
+            SPECULATIVE_TOTAL.inc(quiz_id, "cache_hit")
+            return None
+        if job.key != prompt_key(ctx["ai_input"]) or job.cancel.is_set():
+            job.abort()
+            SPECULATIVE_TOTAL.inc(quiz_id, "miss")
+            return None
+        if not (job.future.running() or job.future.done()):
+            # 還在排隊：等它輪到不如直接自己跑
+            job.abort()
+            SPECULATIVE_TOTAL.inc(quiz_id, "queued")
+            return None
+        SPECULATIVE_TOTAL.inc(quiz_id, "hit" if job.future.done() else "hit_wait")
+        return job
+
+    @staticmethod
+    def settle(
+        job: SpeculativeJob, waited: bool, result: Optional[Tuple[Optional[dict], str]], error: Optional[BaseException]
+    ) -> Optional[Tuple[Optional[dict], str]]:
+        """
+        take / asgi 版共用的收尾：
+        - 成功 → (ai_data, reason)
+        - 送出前就已經失敗結束 → None，呼叫端用完整預算自己重跑一次
+        - 送出後等過它（預算已經花掉）卻逾時 / 失敗 → (None, 降級原因)，不再重跑，等待上限仍是一個預算
+        """
+        if error is not None:
+            job.abort()
+            return (None, "llm_unavailable") if waited else None
+        ai_data, reason = result
+        if ai_data is not None:
+            return ai_data, reason
+        if waited and reason != "cancelled":
+            return None, reason or "llm_unavailable"
+        return None
+
+    def take(self, session_id: Optional[str], ctx: Dict[str, Any], timeout: float) -> Optional[Tuple[Optional[dict], str]]:
+        """同步版 claim + 等結果（只等這個工作剩下的預算）；回 None = 沒有可用結果，呼叫端照原流程"""
+        job = self.claim(session_id, ctx)
+        if job is None:
+            return None
+        waited = not job.future.done()
+        try:
+            result = job.future.result(timeout=job.remaining(timeout))
+        except Exception as e:
+            return self.settle(job, waited, None, e)
+        return self.settle(job, waited, result, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "enabled": self.enabled,
+            "quizzes": list(self.quizzes),
+            "min_progress": SPECULATIVE_MIN_PROGRESS,
+            "sessions": len(jobs),
+            "max_sessions": self.max_sessions,
+            "running": sum(1 for j in jobs if j.future is not None and j.future.running()),
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,122 @@
+# AI_modle/ai/warmup.py
+# 功能：啟動時預熱模型 + 有流量時定期 keep-warm，避免第一個 /submit 要等模型載入
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ai.ollama_client import (
+    DEFAULT_KEEP_ALIVE,
+    DEFAULT_MODEL,
+    DEFAULT_OLLAMA_URL,
+    is_model_loaded,
+    preload_model,
+    prime_system_prompt,
+)
+
+
+# =========================
+# 基本設定（可用環境變數覆蓋）
+# =========================
+# keep-warm ping 間隔（秒）；需小於 keep_alive，模型才不會在兩次 ping 之間被卸載
+WARM_INTERVAL = int(os.getenv("OLLAMA_WARM_INTERVAL", "240"))
+# 多久內有請求才算「有流量」（秒）；超過就停止 ping，讓模型可以自然卸載
+WARM_TRAFFIC_WINDOW = int(os.getenv("OLLAMA_WARM_TRAFFIC_WINDOW", "1800"))
+# 設成 0 可完全關閉預熱（例如本機開發沒有 Ollama）
+WARM_ENABLED = os.getenv("OLLAMA_WARMUP", "1") not in ("0", "false", "False")
+
+
+class ModelWarmer:
+    """
+    - start()：背景執行緒先 preload 模型，再用各 system prompt 預先填 prompt cache
+    - touch()：每個 LLM 請求呼叫一次，記錄最近流量
+    - 只要最近 WARM_TRAFFIC_WINDOW 秒內有流量，就每 WARM_INTERVAL 秒 ping 一次
+    - status()：給 /ready 用，回報模型是否真的已載入
+    """
+
+    def __init__(
+        self,
+        system_prompts: Optional[List[str]] = None,
+        model: str = DEFAULT_MODEL,
+        url: str = DEFAULT_OLLAMA_URL,
+        keep_alive: str = DEFAULT_KEEP_ALIVE,
+        interval: int = WARM_INTERVAL,
+        traffic_window: int = WARM_TRAFFIC_WINDOW,
+    ):
+        self.system_prompts = list(system_prompts or [])
+        self.model = model
+        self.url = url
+        self.keep_alive = keep_alive
+        self.interval = interval
+        self.traffic_window = traffic_window
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._warmed = False
+        self._last_traffic = 0.0
+        self._last_ping = 0.0
+        self._last_error = ""
+
+    # -------------------------
+    # 對外
+    # -------------------------
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ollama-warmer", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def touch(self) -> None:
+        self._last_traffic = time.time()
+
+    def status(self) -> Dict[str, Any]:
+        loaded = is_model_loaded(self.model, self.url)
+        return {
+            "model": self.model,
+            "loaded": loaded,
+            "warmed": self._warmed,
+            "last_ping": self._last_ping or None,
+            "last_traffic": self._last_traffic or None,
+            "last_error": self._last_error or None,
+        }
+
+    # -------------------------
+    # 內部
+    # -------------------------
+    def warm_up(self) -> bool:
+        try:
+            preload_model(self.model, self.url, keep_alive=self.keep_alive)
+            for sp in self.system_prompts:
+                prime_system_prompt(sp, self.model, self.url, keep_alive=self.keep_alive)
+            self._warmed = True
+            self._last_ping = time.time()
+            self._last_error = ""
+            return True
+        except Exception as e:
+            self._last_error = str(e)
+            return False
+
+    def _has_recent_traffic(self) -> bool:
+        return (time.time() - self._last_traffic) <= self.traffic_window
+
+    def _run(self) -> None:
+        # 啟動預熱：Ollama 可能比 Flask 晚起來，失敗就隔一段時間重試
+        while not self._stop.is_set() and not self.warm_up():
+            self._stop.wait(min(self.interval, 30))
+
+        while not self._stop.wait(self.interval):
+            if not self._has_recent_traffic():
+                continue
+            try:
+                preload_model(self.model, self.url, keep_alive=self.keep_alive)
+                self._last_ping = time.time()
+                self._last_error = ""
+            except Exception as e:
+                self._last_error = str(e)
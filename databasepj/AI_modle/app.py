@@ -1,10 +1,14 @@
+import os
 import json
-import requests
-import json5
+import threading
+import time
 import traceback
-from typing import Any, Dict, List, Optional, Tuple
-from flask import Flask, render_template, request, jsonify, abort
-from logic.value_metrics import compute_value_metrics
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
+from flask import Flask, Response, render_template, request, jsonify, abort
+from werkzeug.exceptions import HTTPException
+from logic.answers import NormalizedAnswers, normalize_answers
+from logic.value_metrics import classify_profile, compute_value_metrics, compute_value_metrics_batch, likert_to_0_100
 
 
 
@@ -13,27 +17,71 @@ from logic.scoring import compute_insurance_scoring
 from database.product_repository import (
     recommend_top3_products,
     attach_riders_to_mains,
-    get_product_by_id,
+    get_product_entry,
     get_db_connection,
+    preload_catalog,
+    compact_product,
+    prompt_product,
+    hot_queries,
+)
+from database.query_trace import QUERY_STATS, analyze_freshness, explain_plan, index_inventory
+from database.recommendation_table import RecommendationTable
+from database.result_store import KIND_SUBMISSION, ResultStore
+from ai.ollama_client import DEFAULT_KEEP_ALIVE, GenerationCancelled, probe_generate, scan_json_stream
+from ai.llm_telemetry import LLM_TELEMETRY, StreamMeter
+from ai.backends import get_backend
+from ai.warmup import ModelWarmer, WARM_ENABLED
+from ai.circuit_breaker import CircuitBreaker, LLM_LATENCY_BUDGET
+from ai.schemas import apply_report_defaults, loads_fast, ollama_format
+from ai.report_sections import REPORT_FANOUT_PARALLEL, ReportSection, merge_sections, sections_for
+from ai.model_router import ROUTER_SLO_SECONDS, ModelRouter, parse_models
+from ai.speculative import AnswerPrior, SpeculativeReports
+from ai.report_cache import (
+    ValuesNarrativeCache,
+    profile_key,
+    VALUES_CACHE_ENABLED,
+    VALUES_CACHE_MIN_ANSWERED,
+)
+from static_assets import ASSETS, register_static_assets
+from metrics import REGISTRY, install_flask_metrics, record_error, span
+from http_cache import (
+    REVALIDATE_PRIVATE,
+    REVALIDATE_PUBLIC,
+    compress_body,
+    dumps_compact,
+    is_not_modified,
+    make_etag,
+    render_last_modified,
+    render_version,
+    validator_headers,
 )
 
 app = Flask(__name__)
 app.config["JSON_AS_ASCII"] = False
+# 雜湊檔名資源（/assets/）與 /service-worker.js
+register_static_assets(app)
+# 每個請求的延遲 / 狀態碼 / 進行中數量 + /metrics（Prometheus 文字格式）
+install_flask_metrics(app)
 
 
 @app.errorhandler(Exception)
 def _handle_all_errors(e):
+    # 404 這類 HTTP 錯誤照原狀回傳，不要變成 500
+    if isinstance(e, HTTPException):
+        return e
+    record_error(request.url_rule.rule if request.url_rule else None, e)
     traceback.print_exc()
     if request.path == "/submit":
         return jsonify({"status": "error", "message": str(e)}), 500
     return f"Server Error: {e}", 500
 
 
-USER_DATA_STORE = {}
-AI_RESULT_STORE = {}
+# 問卷原始答案 + AI 結果：記憶體 LRU 熱層 + SQLite 冷層，有上限、有 TTL、重啟不遺失
+RESULT_STORE = ResultStore()
 
-LLAMA_MODEL = "llama3:8b-instruct-q4_k_m"
-OLLAMA_URL = "http://127.0.0.1:11434/api/generate"
+LLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3:8b-instruct-q4_k_m")
+# 壓測時可指向 fake_ollama_server.py，或設 LLM_BACKEND=fake 完全不走網路
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434/api/generate")
 
 SYSTEM_PROMPT_VALUES = """你是一位專業的保險顧問 AI，必須使用「繁體中文」回答。
 請根據提供的用戶數據，執行專業的個人價值觀分析。
@@ -89,40 +137,310 @@ SYSTEM_PROMPT_INSURANCE = """你是一位專業的保險顧問 AI。你會收到
 """
 
 
-def call_ollama_api(system_prompt: str, user_input_json: str) -> str:
-    payload = {
-        "model": LLAMA_MODEL,
-        "prompt": user_input_json,
+MODEL_WARMER = ModelWarmer(
+    system_prompts=[SYSTEM_PROMPT_VALUES, SYSTEM_PROMPT_INSURANCE],
+    model=LLAMA_MODEL,
+    url=OLLAMA_URL,
+)
+
+
+# 多模型路由：LLM_MODELS 依品質由低到高列出本機模型，每次呼叫依 SLO 與預期輸出長度挑一個；
+# 沒設就只有 LLAMA_MODEL
+MODEL_ROUTER = ModelRouter(parse_models(os.getenv("LLM_MODELS", ""), LLAMA_MODEL), url=OLLAMA_URL)
+
+
+# 連續逾時/失敗就斷路：/submit 直接回規則版報告，不再每次都等滿 timeout
+LLM_BREAKER = CircuitBreaker(probe=lambda: probe_generate(LLAMA_MODEL, OLLAMA_URL))
+
+
+# 價值觀報告文案快取（依量化輪廓分桶）
+VALUES_CACHE = ValuesNarrativeCache()
+
+
+# 推薦結果查表（build_recommendation_table.py 離線產生）
+RECO_TABLE = RecommendationTable()
+
+
+# 問卷作答中依進度快照先在背景生成報告（/progress）；/submit 時答案相同就直接沿用
+SPECULATIVE = SpeculativeReports(
+    # 背景推測不算進 scoring / prompt_build 等階段耗時與文案快取命中率
+    prepare=lambda quiz_id, answers: _prepare_report(quiz_id, answers, record_metrics=False),
+    generate=lambda *args: _try_llm_report(*args),
+    remember=lambda ctx, ai_data: _finalize_report(ctx, ai_data, ""),
+    prior=AnswerPrior(
+        lambda quiz_id: (
+            sub.get("answers")
+            for sub in RESULT_STORE.iter_items(KIND_SUBMISSION)
+            if isinstance(sub, dict) and sub.get("quiz_id") == quiz_id
+        )
+    ),
+)
+
+
+# 共享狀態（商品目錄 / 推薦表 / 模板）預熱方式：
+#   background（預設）：背景執行緒載入，process 一啟動就能回 /health，載入完成前 /ready 回 503
+#   sync：呼叫端直接等載入完（gunicorn preload 在 master fork 前用這個，worker 一出生就是就緒狀態）
+SHARED_STATE_WARMUP = os.getenv("SHARED_STATE_WARMUP", "background").lower().strip()
+SHARED_STATE_READY = threading.Event()
+SHARED_STATE_INFO: Dict[str, Any] = {}
+
+
+def _collect_state_metrics() -> List[str]:
+    """/metrics scrape 時才讀的狀態：斷路器、結果儲存、推薦查表"""
+    breaker = LLM_BREAKER.status()
+    store = RESULT_STORE.stats()
+    reco = RECO_TABLE.stats()
+    return [
+        "# TYPE llm_breaker_open gauge",
+        f"llm_breaker_open {0 if breaker['state'] == 'closed' else 1}",
+        "# TYPE llm_breaker_trips_total counter",
+        f"llm_breaker_trips_total {breaker['trips']}",
+        "# TYPE result_store_hot_items gauge",
+        f"result_store_hot_items {store['hot_items']}",
+        "# TYPE result_store_pending_writes gauge",
+        f"result_store_pending_writes {store['pending_writes']}",
+        "# TYPE app_shared_state_ready gauge",
+        f"app_shared_state_ready {1 if SHARED_STATE_READY.is_set() else 0}",
+        "# TYPE reco_table_lookups_total counter",
+        f'reco_table_lookups_total{{result="hit"}} {reco["hits"]}',
+        f'reco_table_lookups_total{{result="miss"}} {reco["misses"]}',
+    ]
+
+
+REGISTRY.add_collector(_collect_state_metrics)
+
+
+def warm_shared_state() -> Dict[str, Any]:
+    """
+    載入商品目錄、文案快取、編譯所有模板。
+    正式部署時在 fork 前（master）呼叫一次，各 worker copy-on-write 共用這些唯讀資料。
+    每一項都可以晚點再載：還沒完成前進來的請求照樣能服務，只是走逐筆查 DB / 即時查詢 / 當場編譯模板。
+    """
+    t0 = time.perf_counter()
+    info: Dict[str, Any] = {}
+    try:
+        info["catalog"] = preload_catalog()
+    except Exception as e:
+        # 沒有 policies 表時仍可啟動，詳情頁會退回逐筆查 DB
+        info["catalog_error"] = str(e)
+    info["reco_table"] = RECO_TABLE.load().stats()
+    info["values_cache"] = VALUES_CACHE.stats()
+    info["assets"] = ASSETS.load().stats()
+    templates = app.jinja_env.list_templates()
+    for name in templates:
+        app.jinja_env.get_template(name)
+    info["templates"] = len(templates)
+    info["seconds"] = round(time.perf_counter() - t0, 3)
+    SHARED_STATE_INFO.update(info)
+    SHARED_STATE_READY.set()
+    return info
+
+
+def _warm_shared_state_in_background() -> None:
+    try:
+        warm_shared_state()
+    except Exception as e:
+        # 預熱失敗不影響服務（各項都有即時退路）；標記就緒避免 /ready 永遠卡在 503
+        traceback.print_exc()
+        SHARED_STATE_INFO["error"] = str(e)
+        SHARED_STATE_READY.set()
+
+
+def start_shared_state_warmup() -> Dict[str, Any]:
+    """依 SHARED_STATE_WARMUP 同步或背景預熱；已經載入過就直接回傳"""
+    if SHARED_STATE_READY.is_set():
+        return SHARED_STATE_INFO
+    if SHARED_STATE_WARMUP == "sync":
+        return warm_shared_state()
+    threading.Thread(target=_warm_shared_state_in_background, name="shared-state-warmup", daemon=True).start()
+    return {"mode": "background"}
+
+
+def init_model_warmup() -> None:
+    """啟動背景預熱（只需在真正服務請求的 process 呼叫一次）"""
+    if WARM_ENABLED:
+        MODEL_WARMER.start()
+
+
+def _route_slo(deadline: float) -> float:
+    """這次呼叫實際剩下的時間（不超過 LLM_ROUTER_SLO）：fan-out 後面幾批剩沒幾秒時，路由就不會挑慢的大模型"""
+    return min(ROUTER_SLO_SECONDS, max(0.0, deadline - time.time()))
+
+
+def call_ollama_report(
+    system_prompt: str,
+    user_input_json: str,
+    quiz_id: str = "",
+    section: Optional[ReportSection] = None,
+    cancel: Optional[threading.Event] = None,
+    deadline: Optional[float] = None,
+) -> dict:
+    """
+    串流呼叫 Ollama，最外層 JSON 一閉合就中止生成並直接回傳 dict。
+    連線/逾時錯誤往上丟（給斷路器記錄）；內容解析失敗則回 status=error 的 dict。
+    section：只生成報告的其中一段（fan-out），prompt 最後加上分段指示、format 換成子 schema。
+    cancel：投機預先生成用；設起來就中止串流並丟 GenerationCancelled。
+    deadline：time.time() 秒；fan-out 各段共用同一個（整份報告一個預算），沒給就從現在起算 LLM_LATENCY_BUDGET。
+    """
+    MODEL_WARMER.touch()
+    if deadline is None:
+        deadline = time.time() + LLM_LATENCY_BUDGET
+    prompt, prompt_type = _report_prompt(user_input_json, quiz_id, section)
+    model = MODEL_ROUTER.route(prompt_type, len(system_prompt) + len(prompt), slo_s=_route_slo(deadline)).model
+    payload = _report_payload(model, system_prompt, prompt, quiz_id, section)
+    # 吞吐量遙測（prefill / decode tokens/sec、冷載入），依 模型 × 問卷（分段時 × 段落）分組；路由也讀這份實測速率
+    meter = StreamMeter(model, prompt_type)
+    try:
+        # (連線逾時, 讀取逾時)：等第一個 token 最多等滿預算；deadline 同時交給後端，
+        # 卡在單一 chunk 的讀取也會在 deadline 被中斷，不是只在 chunk 之間檢查
+        with span("llm.generate"):
+            chunks = get_backend().generate_stream(
+                OLLAMA_URL, payload, timeout=(5, LLM_LATENCY_BUDGET), deadline=deadline
+            )
+            sc = scan_json_stream(chunks, deadline=deadline, meter=meter, cancel=cancel)
+    except GenerationCancelled:
+        raise
+    except Exception as e:
+        raise Exception(f"AI 服務連線失敗：{e}")
+    finally:
+        LLM_TELEMETRY.record(meter.finish())
+    return _parse_report(sc)
+
+
+# =========================
+# 同步 / 非同步（asgi_app.py）共用的報告組裝與結果處理
+# =========================
+def _report_prompt(user_input_json: str, quiz_id: str, section: Optional[ReportSection]) -> Tuple[str, str]:
+    """回傳 (prompt, prompt_type)；分段時加上分段指示，遙測與路由依段落分組"""
+    if section:
+        return section.prompt(user_input_json), section.prompt_type
+    return user_input_json, quiz_id
+
+
+def _report_payload(
+    model: str, system_prompt: str, prompt: str, quiz_id: str, section: Optional[ReportSection]
+) -> Dict[str, Any]:
+    return {
+        "model": model,
+        "prompt": prompt,
         "system": system_prompt,
-        "stream": False,
-        "format": "json",
+        # 有 schema 就用 structured output，模型只能吐出符合欄位的 JSON
+        "format": section.ollama_format() if section else ollama_format(quiz_id),
+        "keep_alive": DEFAULT_KEEP_ALIVE,
     }
+
+
+def _parse_report(sc) -> dict:
+    """串流掃描結果 → dict：JSON 已閉合就直接解析，否則退回寬鬆解析"""
+    with span("llm.parse"):
+        if sc.done:
+            try:
+                return sc.parse()
+            except Exception:
+                pass
+        return _safe_parse_json(sc.full_text())
+
+
+def _merge_fanout(outcomes: List[Tuple[ReportSection, Optional[dict], Optional[BaseException]]]) -> dict:
+    """各段 (section, 結果, 例外)：全部失敗就丟第一個例外（算斷路器的一次失敗），否則合併"""
+    errors = [e for _, _, e in outcomes if e is not None]
+    if errors and len(errors) == len(outcomes):
+        raise errors[0]
+    return merge_sections([(s, out, str(e) if e is not None else "") for s, out, e in outcomes])
+
+
+def _report_outcome(ai_data: Optional[dict], error: Optional[BaseException]) -> Tuple[Optional[dict], str]:
+    """LLM 呼叫結束後更新斷路器並回傳 (ai_data, degraded_reason)"""
+    if isinstance(error, GenerationCancelled):
+        return None, "cancelled"
+    if error is not None:
+        LLM_BREAKER.record_failure(error)
+        return None, "llm_unavailable"
+    LLM_BREAKER.record_success()
+    return ai_data, ""
+
+
+# fan-out 各段共用的執行緒池（第一次用到才建立：gunicorn preload 時不會在 master 建好執行緒再 fork）
+REPORT_FANOUT_THREADS = int(os.getenv("REPORT_FANOUT_THREADS", "64"))
+_section_pool: Optional[ThreadPoolExecutor] = None
+_section_pool_lock = threading.Lock()
+
+
+def _get_section_pool() -> ThreadPoolExecutor:
+    global _section_pool
+    if _section_pool is None:
+        with _section_pool_lock:
+            if _section_pool is None:
+                _section_pool = ThreadPoolExecutor(max_workers=REPORT_FANOUT_THREADS, thread_name_prefix="report-section")
+    return _section_pool
+
+
+def call_ollama_report_sections(
+    system_prompt: str,
+    user_input_json: str,
+    quiz_id: str,
+    sections: List[ReportSection],
+    cancel: Optional[threading.Event] = None,
+) -> dict:
+    """
+    報告拆段同時生成，每批最多 REPORT_FANOUT_PARALLEL 段，合併成整份報告的形狀。
+    全部段落都連線失敗才往上丟（算斷路器的一次失敗）；部分失敗記在 sections_failed。
+    所有段落（含後面幾批）共用一個 deadline：整份報告的等待上限仍是 LLM_LATENCY_BUDGET，不會每批各算一次。
+    """
+    pool = _get_section_pool()
+    deadline = time.time() + LLM_LATENCY_BUDGET
+    outcomes: List[Tuple[ReportSection, Optional[dict], Optional[BaseException]]] = []
+    with span("llm.fanout"):
+        for i in range(0, len(sections), REPORT_FANOUT_PARALLEL):
+            wave = sections[i : i + REPORT_FANOUT_PARALLEL]
+            if time.time() >= deadline:
+                # 預算已經用完：後面幾批不再送出，直接算失敗（用規則版補）
+                outcomes.extend((s, None, TimeoutError("LLM 生成超過延遲預算")) for s in wave)
+                continue
+            futures = [
+                (s, pool.submit(call_ollama_report, system_prompt, user_input_json, quiz_id, s, cancel, deadline))
+                for s in wave
+            ]
+            for s, fut in futures:
+                try:
+                    outcomes.append((s, fut.result(), None))
+                except Exception as e:
+                    outcomes.append((s, None, e))
+    return _merge_fanout(outcomes)
+
+
+def _try_llm_report(
+    system_prompt: str, ai_input: str, quiz_id: str, cancel: Optional[threading.Event] = None
+) -> Tuple[Optional[dict], str]:
+    """
+    回傳 (ai_data, degraded_reason)：
+    - 斷路中：不呼叫 LLM，直接 (None, "circuit_open")
+    - 逾時/連線失敗：記一次失敗，(None, "llm_unavailable")
+    - 被取消（投機生成用不到了）：(None, "cancelled")，不算斷路器的失敗
+    - 成功：(解析後 dict, "")
+    """
+    if not LLM_BREAKER.allow_request():
+        return None, "circuit_open"
+    sections = sections_for(quiz_id)
     try:
-        resp = requests.post(OLLAMA_URL, json=payload, timeout=90)
-        resp.raise_for_status()
-        data = resp.json()
-        full = (data.get("response") or "").strip()
-
-        s = full
-        if "```json" in s:
-            s = s.split("```json", 1)[1].split("```", 1)[0]
-        elif "```" in s:
-            s = s.split("```", 1)[1].split("```", 1)[0]
-        s = s.strip()
-
-        if not s.startswith("{"):
-            start = s.find("{")
-            end = s.rfind("}")
-            if start != -1 and end != -1 and end > start:
-                s = s[start : end + 1].strip()
-        return s
+        if sections:
+            ai_data = call_ollama_report_sections(system_prompt, ai_input, quiz_id, sections, cancel)
+        else:
+            ai_data = call_ollama_report(system_prompt, ai_input, quiz_id, cancel=cancel)
     except Exception as e:
-        raise Exception(f"AI 服務連線失敗：{e}")
+        return _report_outcome(None, e)
+    return _report_outcome(ai_data, None)
+
+
+def _mark_degraded(report: Dict[str, Any], reason: str) -> Dict[str, Any]:
+    report["degraded"] = True
+    report["degraded_reason"] = reason
+    return report
 
 
 def _safe_parse_json(ai_text: str) -> dict:
     try:
-        return json5.loads(ai_text)
+        return loads_fast(ai_text)
     except Exception:
         pass
     try:
@@ -130,7 +448,7 @@ def _safe_parse_json(ai_text: str) -> dict:
         start = s.find("{")
         end = s.rfind("}")
         if start != -1 and end != -1 and end > start:
-            return json5.loads(s[start : end + 1])
+            return loads_fast(s[start : end + 1])
     except Exception:
         pass
     return {"status": "error", "message": "AI 回傳不是合法 JSON", "raw": (ai_text or "")[:1200]}
@@ -172,65 +490,18 @@ def _infer_quiz_id_from_answers(explicit_quiz_id: str, answers) -> str:
 # =========================
 # Values：量化拆維度 + 圖表資料
 # =========================
-def _choice_to_1_5(v: Any) -> Optional[int]:
-    """
-    把各種 answers 格式盡量轉成 1~5 分：
-    - 數字/字串數字：1~5
-    - A/B/C/D/E：1~5
-    - dict：優先 score/value，其次 choice（含 A. / B.）
-    """
-    if v is None:
-        return None
-
-    if isinstance(v, dict):
-        for key in ("score", "value", "val"):
-            if key in v:
-                return _choice_to_1_5(v.get(key))
-        if "choice" in v:
-            return _choice_to_1_5(v.get("choice"))
-        return None
-
-    if isinstance(v, (int, float)):
-        x = int(round(float(v)))
-        if 1 <= x <= 5:
-            return x
-        return None
-
-    s = str(v).strip()
-    if s.isdigit():
-        x = int(s)
-        if 1 <= x <= 5:
-            return x
-        return None
-
-    # "A." / "A" / "B ..." / "C、"
-    up = s.upper()
-    if len(up) >= 1 and up[0] in ("A", "B", "C", "D", "E"):
-        mp = {"A": 1, "B": 2, "C": 3, "D": 4, "E": 5}
-        return mp.get(up[0])
-
-    return None
-
-
-def _collect_q_scores(answers: Dict[str, Any], n: int = 10) -> Tuple[List[Optional[int]], int]:
+def _collect_q_scores(answers: NormalizedAnswers, n: int = 10) -> Tuple[List[Optional[int]], int]:
+    # 1~5 分（數字 / A~E）；選項字串的解析結果在 logic.answers 依字串快取
     scores: List[Optional[int]] = []
     answered = 0
     for i in range(1, n + 1):
-        v = answers.get(f"q{i}")
-        sc = _choice_to_1_5(v)
+        sc = answers.get(f"Q{i}").choice.likert
         scores.append(sc)
         if sc is not None:
             answered += 1
     return scores, answered
 
 
-def _to_0_100(x_1_5: Optional[int]) -> Optional[int]:
-    if x_1_5 is None:
-        return None
-    # 1->10, 5->90（留點邊界讓圖好看）
-    return int(round(10 + (x_1_5 - 1) * 20))
-
-
 def _avg(vals: List[Optional[int]]) -> Optional[int]:
     xs = [v for v in vals if v is not None]
     if not xs:
@@ -238,9 +509,17 @@ def _avg(vals: List[Optional[int]]) -> Optional[int]:
     return int(round(sum(xs) / len(xs)))
 
 
-def _build_value_metrics(answers: Dict[str, Any]) -> Dict[str, Any]:
-    q, answered = _collect_q_scores(answers, 10)
-    q100 = [_to_0_100(x) for x in q]
+PROFILE_REASONS = {
+    "成長進取型": "你願意承擔波動換取長期成長，且具備規劃能力；適合以「保障打底 + 成長配置」的方式布局。",
+    "穩健防禦型": "你優先追求可預期與安全感，風險承受度較保守；適合先把醫療/意外/重大傷病缺口補齊。",
+    "責任規劃型": "你重視保障與長期可控，願意用規劃降低不確定性；適合分層保費、分階段完成保障與資產目標。",
+    "均衡務實型": "你在風險與穩定間取得平衡，會兼顧眼前需求與長期目標；適合用核心保障穩住，再做彈性加值。",
+}
+
+
+def _build_value_metrics(answers: Union[Dict[str, Any], NormalizedAnswers]) -> Dict[str, Any]:
+    q, answered = _collect_q_scores(normalize_answers(answers), 10)
+    q100 = [likert_to_0_100(x) for x in q]
 
     # 維度拆分（你可以之後按實際問卷語意微調映射）
     # 假設：q1~q10 都是 1~5 越高越偏向「該特徵更強」
@@ -253,23 +532,9 @@ def _build_value_metrics(answers: Dict[str, Any]) -> Dict[str, Any]:
         "彈性與流動性偏好": _avg([q100[6], q100[9]]),     # q7, q10（偏彈性）
     }
 
-    # profile 判斷：用幾個關鍵維度組合出「可說的故事」
-    rt = dims.get("風險承受度") or 50
-    sec = dims.get("保障安全感需求") or 50
-    plan = dims.get("長期規劃程度") or 50
-
-    if rt >= 70 and plan >= 65 and sec <= 55:
-        ptype = "成長進取型"
-        reason = "你願意承擔波動換取長期成長，且具備規劃能力；適合以「保障打底 + 成長配置」的方式布局。"
-    elif sec >= 70 and rt <= 55:
-        ptype = "穩健防禦型"
-        reason = "你優先追求可預期與安全感，風險承受度較保守；適合先把醫療/意外/重大傷病缺口補齊。"
-    elif sec >= 65 and plan >= 65:
-        ptype = "責任規劃型"
-        reason = "你重視保障與長期可控，願意用規劃降低不確定性；適合分層保費、分階段完成保障與資產目標。"
-    else:
-        ptype = "均衡務實型"
-        reason = "你在風險與穩定間取得平衡，會兼顧眼前需求與長期目標；適合用核心保障穩住，再做彈性加值。"
+    # profile 判斷：用幾個關鍵維度組合出「可說的故事」（門檻在 logic.value_metrics，批次分析共用）
+    ptype = classify_profile(dims["風險承受度"], dims["保障安全感需求"], dims["長期規劃程度"])
+    reason = PROFILE_REASONS[ptype]
 
     confidence = int(round((answered / 10) * 100))
 
@@ -292,6 +557,20 @@ def _build_value_metrics(answers: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+def _values_cache_key(answers: Union[Dict[str, Any], NormalizedAnswers], metrics: Dict[str, Any]) -> Optional[str]:
+    """作答題數足夠才給 key；不足時輪廓沒代表性，直接走 LLM"""
+    if not VALUES_CACHE_ENABLED:
+        return None
+    try:
+        answered = int(str(metrics.get("completion") or "0").split("/")[0])
+    except ValueError:
+        answered = 0
+    if answered < VALUES_CACHE_MIN_ANSWERED:
+        return None
+    ptype = (_build_value_metrics(answers).get("profile") or {}).get("Type", "")
+    return profile_key(ptype, metrics["charts"]["radar"]["data"])
+
+
 def _values_fallback_report(metrics: Dict[str, Any]) -> Dict[str, Any]:
     p = metrics.get("profile", {})
     dims = metrics.get("dims", {}) or {}
@@ -368,6 +647,28 @@ def _values_fallback_report(metrics: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+def _insurance_fallback_report(scoring: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "status": "success",
+        "quiz_id": "insurance",
+        "person_summary": "（AI 文案暫時無法產生，以下為系統依問卷規則產生的推薦結果。）",
+        "top_categories": [
+            {"name": c.get("name") or c.get("key") or "未提供", "reason": (c.get("reason") or "")[:30]}
+            for c in scoring.get("top_categories", [])
+        ][:3],
+        "next_step": [
+            "如需更精準建議，可補充：目前保單狀況、預算、是否有家族病史。",
+            "確認保障缺口：醫療實支、重大傷病、長照、意外、壽險。",
+            "先選主約再挑附約，避免保障重複或保費失衡。",
+        ],
+        "product_advice": [
+            "比較重點：承保年齡、繳費期間、保障範圍與除外責任。",
+            "若有多個類別需求，優先補齊醫療與意外，再做長期與資產規劃。",
+            "附約/條款建議搭配主約選擇，並確認是否可附加與續保條件。",
+        ],
+    }
+
+
 # =========================
 # Routes：頁面
 # =========================
@@ -388,132 +689,272 @@ def quiz_entry(quiz_id: str):
         return render_template("questionnaire.html", quiz_id="values", quiz_title="價值觀分析系統")
 
 
+def _not_modified_response(etag: str, last_modified: Optional[float], cache_control: str) -> Optional[Response]:
+    """客戶端快取仍有效就直接回 304（不查模板、不渲染）"""
+    if is_not_modified(request.headers.get("If-None-Match"), request.headers.get("If-Modified-Since"), etag, last_modified):
+        return Response(status=304, headers=validator_headers(etag, last_modified, cache_control))
+    return None
+
+
+def _with_validators(body: str, etag: str, last_modified: Optional[float], cache_control: str) -> Response:
+    resp = Response(body, mimetype="text/html")
+    resp.headers.update(validator_headers(etag, last_modified, cache_control))
+    return resp
+
+
 @app.route("/result/<user_id>")
 def result_page(user_id: str):
-    result_data = AI_RESULT_STORE.get(user_id)
-    if not result_data:
+    entry = RESULT_STORE.get_result_entry(user_id)
+    if not entry:
         return render_template("result_display.html", error="找不到該用戶的分析結果，請重新填寫。")
-    return render_template("result_display.html", final_result=result_data)
+    result_data, written_at = entry
+
+    # 結果寫入後不會再變：ETag = 結果 id + 寫入時間 + 模板/靜態資源版本
+    etag = make_etag("result", user_id, written_at, render_version(ASSETS.version))
+    last_modified = render_last_modified(written_at)
+    cached = _not_modified_response(etag, last_modified, REVALIDATE_PRIVATE)
+    if cached is not None:
+        return cached
+    with span("render"):
+        body = render_template("result_display.html", final_result=result_data)
+    return _with_validators(body, etag, last_modified, REVALIDATE_PRIVATE)
 
 
 @app.route("/product/<product_id>")
 def product_detail(product_id: str):
-    p = get_product_by_id(product_id)
+    p, db_mtime = get_product_entry(product_id)
     if not p:
         return render_template("product_detail.html", error="找不到此商品，可能資料庫沒有該商品或 ID 不正確。")
-    return render_template("product_detail.html", product=p)
+
+    # 商品只在重新匯入 product.db 時改變：用「這份內容」載入時的 DB 檔案時間當版本
+    etag = make_etag("product", p.get("product_id"), db_mtime, render_version(ASSETS.version))
+    last_modified = render_last_modified(db_mtime)
+    cached = _not_modified_response(etag, last_modified, REVALIDATE_PUBLIC)
+    if cached is not None:
+        return cached
+    with span("render"):
+        body = render_template("product_detail.html", product=p)
+    return _with_validators(body, etag, last_modified, REVALIDATE_PUBLIC)
 
 
 # =========================
 # Routes：API
 # =========================
+def _parse_submit_payload(data: Dict[str, Any]) -> Tuple[str, Any]:
+    explicit_quiz = (data.get("quiz_id") or data.get("quiz") or "values").lower().strip()
+    answers = data.get("answers")
+    if answers is None:
+        answers = data  # 兼容舊版
+    return _infer_quiz_id_from_answers(explicit_quiz, answers), answers
+
+
+def _prepare_report(quiz_id: str, answers: Any, record_metrics: bool = True) -> Dict[str, Any]:
+    """
+    LLM 之前的所有工作（規則計分、DB 推薦、量化指標、快取查詢、組 prompt）。
+    回傳 ctx；ctx["ai_input"] 為 None 代表不需要呼叫 LLM（例如文案快取命中）。
+    同步 /submit 與 asgi_app.py 的非同步 /submit 共用；
+    record_metrics=False（/progress 背景推測）：不記階段耗時、不算文案快取命中率。
+    """
+    # 答案只在這裡正規化一次，後面的計分/量化都讀同一份；原始 answers 仍原樣給 LLM 與存檔
+    normalized = normalize_answers(answers)
+
+    # =========================
+    # 推薦保單系統：規則+DB+AI文案
+    # =========================
+    if quiz_id == "insurance":
+        with span("scoring", record_metrics):
+            scoring = compute_insurance_scoring(normalized)
+
+        user_meta = {"age": _age_group_to_age(normalized.get("Q2").choice.text)}
+
+        # 先查離線預算好的推薦表（一次 dict 查詢）；沒有表 / 表過期 / 查不到才即時查 DB
+        with span("recommend", record_metrics):
+            products = RECO_TABLE.lookup(scoring, user_meta=user_meta, count=record_metrics)
+            if products is None:
+                products = recommend_top3_products(scoring, user_meta=user_meta)
+                products = attach_riders_to_mains(products, scoring, user_meta=user_meta, limit=2)
+
+        payload_obj = {
+            "quiz_id": "insurance",
+            "answers": answers,
+            "scoring_result": {
+                "top_categories": scoring.get("top_categories", []),
+                "scores": scoring.get("scores", {}),
+                "channels": scoring.get("channels", {}),
+                "meta": scoring.get("meta", {}),
+            },
+            # 只送統一欄位 + 離線摘要/賣點（沒有摘要才送原始說明），prefill tokens 少很多
+            "recommended_products": [prompt_product(p) for p in products],
+        }
+        with span("prompt_build", record_metrics):
+            ai_input = json.dumps(payload_obj, ensure_ascii=False, indent=2)
+        return {
+            "quiz_id": "insurance",
+            "answers": answers,
+            "scoring": scoring,
+            "products": products,
+            "system_prompt": SYSTEM_PROMPT_INSURANCE,
+            "ai_input": ai_input,
+        }
+
+    # =========================
+    # 價值觀分析：量化 metrics + AI 報告（失敗就 fallback）
+    # =========================
+    with span("scoring", record_metrics):
+        value_metrics = compute_value_metrics(normalized)
+        cache_key = _values_cache_key(normalized, value_metrics)
+    cached = VALUES_CACHE.get(cache_key, count=record_metrics) if cache_key else None
+
+    ai_input = None
+    if not cached:
+        payload_obj = {"quiz_id": "values", "answers": answers}
+        with span("prompt_build", record_metrics):
+            ai_input = json.dumps(payload_obj, ensure_ascii=False, indent=2)
+    return {
+        "quiz_id": "values",
+        "answers": answers,
+        "normalized": normalized,
+        "value_metrics": value_metrics,
+        "cache_key": cache_key,
+        "cached": cached,
+        "system_prompt": SYSTEM_PROMPT_VALUES,
+        "ai_input": ai_input,
+    }
+
+
+def _fill_failed_sections(ai_data: Dict[str, Any], fallback: Dict[str, Any]) -> None:
+    """fan-out 有段落失敗：那幾個欄位用規則版內容補、標記為部分降級；sections_failed 只是內部訊號，不存進報告"""
+    for field in ai_data.pop("sections_failed", None) or []:
+        if field in fallback:
+            ai_data[field] = fallback[field]
+    _mark_degraded(ai_data, "sections_failed")
+
+
+def _finalize_report(ctx: Dict[str, Any], ai_data: Optional[dict], degraded_reason: str) -> Dict[str, Any]:
+    """把 LLM 結果（或 None = 沒有/失敗）組成最終存檔的報告"""
+    if ai_data is not None:
+        # 投機生成的結果可能被 finalize 兩次（先收進文案快取、/submit 再用一次）：不改呼叫端的 dict
+        ai_data = dict(ai_data)
+    if ctx["quiz_id"] == "insurance":
+        scoring = ctx["scoring"]
+        if ai_data is None:
+            ai_data = _mark_degraded(_insurance_fallback_report(scoring), degraded_reason)
+        elif ai_data.get("status") != "success":
+            ai_data = _insurance_fallback_report(scoring)
+            ai_data["person_summary"] = "（AI 文案解析失敗，以下為系統依問卷規則產生的推薦結果。）"
+        elif ai_data.get("sections_failed"):
+            # fan-out 有段落失敗：只有那幾個欄位用規則版內容補
+            _fill_failed_sections(ai_data, _insurance_fallback_report(scoring))
+
+        ai_data = apply_report_defaults("insurance", ai_data)
+        ai_data.setdefault("quiz_id", "insurance")
+
+        # top_categories 的預設值不是常數，而是規則計分結果
+        if not ai_data.get("top_categories"):
+            ai_data["top_categories"] = [
+                {"name": c.get("name") or c.get("key"), "reason": (c.get("reason") or "")[:30]}
+                for c in scoring.get("top_categories", [])
+            ][:3]
+
+        ai_data["recommended_products"] = ctx["products"] or []
+        return ai_data
+
+    cache_key = ctx["cache_key"]
+    if ctx["cached"]:
+        ai_data = {"status": "success", "quiz_id": "values", **ctx["cached"], "narrative_source": "cache"}
+    elif ai_data is None:
+        ai_data = _mark_degraded(_values_fallback_report(_build_value_metrics(ctx["normalized"])), degraded_reason)
+    elif ai_data.get("sections_failed"):
+        # 拼湊出來的報告不進文案快取，免得規則版內容被當成 LLM 文案重複使用
+        _fill_failed_sections(ai_data, _values_fallback_report(_build_value_metrics(ctx["normalized"])))
+    elif cache_key and ai_data.get("status") == "success":
+        VALUES_CACHE.put(cache_key, apply_report_defaults("values", dict(ai_data)))
+
+    ai_data = apply_report_defaults("values", ai_data)
+
+    # ✅ 關鍵：塞進量化指標（圖表用）
+    ai_data["value_metrics"] = ctx["value_metrics"]
+    return ai_data
+
+
 @app.route("/submit", methods=["POST"])
 def submit():
     data = request.get_json(silent=True) or {}
     if not data:
         return jsonify({"status": "error", "message": "未收到任何數據"}), 400
 
-    explicit_quiz = (data.get("quiz_id") or data.get("quiz") or "values").lower().strip()
-    answers = data.get("answers")
-    if answers is None:
-        answers = data  # 兼容舊版
+    quiz_id, answers = _parse_submit_payload(data)
 
-    quiz_id = _infer_quiz_id_from_answers(explicit_quiz, answers)
+    user_id = RESULT_STORE.new_id()
+    RESULT_STORE.put_submission(user_id, {"quiz_id": quiz_id, "answers": answers})
 
-    user_id = str(len(USER_DATA_STORE) + 1)
-    USER_DATA_STORE[user_id] = {"quiz_id": quiz_id, "answers": answers}
+    try:
+        ctx = _prepare_report(quiz_id, answers)
+        ai_data, degraded_reason = None, ""
+        # 作答途中已經用同樣的答案先跑過（或正在跑）：直接沿用，不再重新生成
+        reused = SPECULATIVE.take(data.get("session_id"), ctx, LLM_LATENCY_BUDGET)
+        if reused is not None:
+            ai_data, degraded_reason = reused
+        elif ctx["ai_input"] is not None:
+            ai_data, degraded_reason = _try_llm_report(ctx["system_prompt"], ctx["ai_input"], quiz_id)
+        with span("finalize"):
+            report = _finalize_report(ctx, ai_data, degraded_reason)
+        with span("store"):
+            RESULT_STORE.put_result(user_id, report)
+        # degraded：這份是規則版（LLM 失敗 / 逾時 / 斷路），壓測據此算降級率
+        return jsonify({"status": "success", "user_id": user_id, "degraded": bool(report.get("degraded"))}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-    
 
+def _parse_progress_payload(data: Dict[str, Any]) -> Tuple[str, str, Optional[Dict[str, Any]], Optional[int]]:
+    answers = data.get("answers")
+    if not isinstance(answers, dict):
+        return "", "", None, None
+    explicit_quiz = (data.get("quiz_id") or data.get("quiz") or "values").lower().strip()
     try:
-        # =========================
-        # 推薦保單系統：規則+DB+AI文案
-        # =========================
-        if quiz_id == "insurance":
-            scoring = compute_insurance_scoring(answers)
-
-            q2_choice = ""
-            if isinstance(answers.get("Q2"), dict):
-                q2_choice = answers.get("Q2", {}).get("choice") or ""
-            user_meta = {"age": _age_group_to_age(q2_choice)}
-
-            products = recommend_top3_products(scoring, user_meta=user_meta)
-            products = attach_riders_to_mains(products, scoring, user_meta=user_meta, limit=2)
-
-            payload_obj = {
-                "quiz_id": "insurance",
-                "answers": answers,
-                "scoring_result": {
-                    "top_categories": scoring.get("top_categories", []),
-                    "scores": scoring.get("scores", {}),
-                    "channels": scoring.get("channels", {}),
-                    "meta": scoring.get("meta", {}),
-                },
-                "recommended_products": products,
-            }
+        total = int(data.get("total") or 0) or None
+    except (TypeError, ValueError):
+        total = None
+    return str(data.get("session_id") or ""), _infer_quiz_id_from_answers(explicit_quiz, answers), answers, total
 
-            ai_input = json.dumps(payload_obj, ensure_ascii=False, indent=2)
-            ai_text = call_ollama_api(SYSTEM_PROMPT_INSURANCE, ai_input)
-            ai_data = _safe_parse_json(ai_text)
-
-            if ai_data.get("status") != "success":
-                ai_data = {
-                    "status": "success",
-                    "quiz_id": "insurance",
-                    "person_summary": "（AI 文案解析失敗，以下為系統依問卷規則產生的推薦結果。）",
-                    "top_categories": [
-                        {"name": c.get("name") or c.get("key") or "未提供", "reason": (c.get("reason") or "")[:30]}
-                        for c in scoring.get("top_categories", [])
-                    ][:3],
-                    "next_step": [
-                        "如需更精準建議，可補充：目前保單狀況、預算、是否有家族病史。",
-                        "確認保障缺口：醫療實支、重大傷病、長照、意外、壽險。",
-                        "先選主約再挑附約，避免保障重複或保費失衡。",
-                    ],
-                    "product_advice": [
-                        "比較重點：承保年齡、繳費期間、保障範圍與除外責任。",
-                        "若有多個類別需求，優先補齊醫療與意外，再做長期與資產規劃。",
-                        "附約/條款建議搭配主約選擇，並確認是否可附加與續保條件。",
-                    ],
-                }
-
-            ai_data.setdefault("quiz_id", "insurance")
-            ai_data.setdefault("person_summary", "（系統未回傳完整摘要）")
-
-            if not ai_data.get("top_categories"):
-                ai_data["top_categories"] = [
-                    {"name": c.get("name") or c.get("key"), "reason": (c.get("reason") or "")[:30]}
-                    for c in scoring.get("top_categories", [])
-                ][:3]
-
-            ai_data.setdefault("next_step", [])
-            ai_data.setdefault("product_advice", [])
-            ai_data["recommended_products"] = products or []
-
-            AI_RESULT_STORE[user_id] = ai_data
-            return jsonify({"status": "success", "user_id": user_id}), 200
-
-        # =========================
-        # 價值觀分析：量化 metrics + AI 報告（失敗就 fallback）
-        # =========================
-        else:
-            payload_obj = {"quiz_id": "values", "answers": answers}
-            ai_input = json.dumps(payload_obj, ensure_ascii=False, indent=2)
-            ai_text = call_ollama_api(SYSTEM_PROMPT_VALUES, ai_input)
-            ai_data = _safe_parse_json(ai_text)
 
-            ai_data.setdefault("value_profile", {"Type": "未知", "Reason": "AI 回傳格式不完整"})
-            ai_data.setdefault("insurance_advice", [])
+@app.route("/progress", methods=["POST"])
+def progress():
+    """作答中的進度快照：作答夠完整就在背景先生成報告（ai/speculative.py）；前端不等回應"""
+    session_id, quiz_id, answers, total = _parse_progress_payload(request.get_json(silent=True) or {})
+    if answers is None:
+        return jsonify({"status": "error", "message": "缺少 answers"}), 400
+    return jsonify(SPECULATIVE.observe(session_id, quiz_id, answers, total)), 202
 
-            # ✅ 關鍵：塞進量化指標（圖表用）
-            ai_data["value_metrics"] = compute_value_metrics(answers)
 
-            AI_RESULT_STORE[user_id] = ai_data
-            return jsonify({"status": "success", "user_id": user_id}), 200
+def compact_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """/api/result 的精簡投影：推薦商品只留統一欄位（原本中英欄位各存一份）"""
+    out = dict(result)
+    if "recommended_products" in out:
+        out["recommended_products"] = [compact_product(p) for p in (out.get("recommended_products") or [])]
+    return out
 
 
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+@app.route("/api/result/<user_id>")
+def api_result(user_id: str):
+    entry = RESULT_STORE.get_result_entry(user_id)
+    if not entry:
+        return jsonify({"status": "error", "message": "找不到該用戶的分析結果"}), 404
+    result_data, written_at = entry
+
+    etag = make_etag("api-result", user_id, written_at)
+    cached = _not_modified_response(etag, written_at, REVALIDATE_PRIVATE)
+    if cached is not None:
+        return cached
+
+    body, encoding = compress_body(dumps_compact(compact_result(result_data)), request.headers.get("Accept-Encoding"))
+    resp = Response(body, mimetype="application/json")
+    resp.headers.update(validator_headers(etag, written_at, REVALIDATE_PRIVATE))
+    resp.headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    return resp
 
 
 @app.route("/health")
@@ -521,20 +962,93 @@ def health():
     return jsonify({"status": "ok"}), 200
 
 
-@app.route("/db_check")
-def db_check():
+@app.route("/ready")
+def ready():
+    """
+    /health 只代表 Flask 活著；/ready 代表共享狀態與模型都已載入，可以接 /submit。
+    """
+    st = MODEL_WARMER.status()
+    st["breaker"] = LLM_BREAKER.status()
+    st["shared_state"] = {"ready": SHARED_STATE_READY.is_set(), **SHARED_STATE_INFO}
+    ok = bool(st.get("loaded")) and SHARED_STATE_READY.is_set()
+    return jsonify({"status": "ready" if ok else "warming", **st}), 200 if ok else 503
+
+
+@app.route("/llm/telemetry")
+def llm_telemetry():
+    """最近 N 次 LLM 呼叫的吞吐量摘要（硬體規劃、比較 prompt 縮減前後）；?recent=20 附上逐筆紀錄"""
+    out = {
+        "status": "ok",
+        **LLM_TELEMETRY.summary(),
+        "router": MODEL_ROUTER.status(),
+        "speculative": SPECULATIVE.stats(),
+    }
+    # 負數 / 非數字當 0（不附逐筆紀錄），上限 200
+    n = max(0, min(request.args.get("recent", 0, type=int), 200))
+    if n:
+        out["recent"] = LLM_TELEMETRY.last(n)
+    return jsonify(out), 200
+
+
+def values_cohort_report() -> Dict[str, Any]:
+    """全部已儲存的價值觀問卷做群體統計（NumPy 批次計算）；同步與非同步版路由共用"""
+    t0 = time.perf_counter()
+    answer_sets = [
+        sub.get("answers") or {}
+        for sub in RESULT_STORE.iter_items(KIND_SUBMISSION)
+        if isinstance(sub, dict) and sub.get("quiz_id") == "values"
+    ]
+    t1 = time.perf_counter()
+    cohort = compute_value_metrics_batch(answer_sets)["cohort"]
+    t2 = time.perf_counter()
+    return {
+        "status": "ok",
+        "cohort": cohort,
+        "timing_ms": {"load": round((t1 - t0) * 1000, 2), "compute": round((t2 - t1) * 1000, 2)},
+    }
+
+
+@app.route("/analytics/values")
+def values_cohort():
+    """後台：價值觀問卷群體統計"""
+    return jsonify(values_cohort_report()), 200
+
+
+def db_check_report() -> Tuple[Dict[str, Any], int]:
+    """
+    除了表/筆數，另外回報：索引、熱門查詢的 EXPLAIN QUERY PLAN（full_scan 標記）、
+    ANALYZE 統計是否過期、DB_TRACE=1 時的查詢彙總與慢查詢。回傳 (body, status)
+    """
+    conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
         tables = [r[0] for r in cur.fetchall()]
         count = None
+        plans = {}
         if "policies" in tables:
             cur.execute("SELECT COUNT(*) FROM policies")
             count = cur.fetchone()[0]
-        return jsonify({"status": "ok", "tables": tables, "policies_count": count}), 200
+            for name, sql, params, scan_expected in hot_queries():
+                plans[name] = explain_plan(conn, sql, params)
+                plans[name]["full_scan_expected"] = scan_expected
+        return {
+            "status": "ok",
+            "tables": tables,
+            "policies_count": count,
+            "indexes": index_inventory(conn),
+            "query_plans": plans,
+            # 不該全表掃描卻掃了（索引被刪、查詢改壞）
+            "full_scan_regressions": sorted(
+                name for name, p in plans.items() if p["full_scan"] and not p["full_scan_expected"]
+            ),
+            "analyze": analyze_freshness(conn, [t for t in tables if not t.startswith("sqlite_")]),
+            "query_trace": QUERY_STATS.snapshot(),
+            "result_store": RESULT_STORE.stats(),
+        }, 200
     except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+        return {"status": "error", "message": str(e)}, 500
     finally:
         try:
             conn.close()
@@ -542,6 +1056,16 @@ def db_check():
             pass
 
 
+@app.route("/db_check")
+def db_check():
+    body, status = db_check_report()
+    return jsonify(body), status
+
+
 if __name__ == "__main__":
     print("Server starting on http://127.0.0.1:5000")
+    # debug reloader 會起兩個 process，只在實際服務的子 process 預熱
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_shared_state_warmup()
+        init_model_warmup()
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
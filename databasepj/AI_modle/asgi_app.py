@@ -0,0 +1,408 @@
+# asgi_app.py
+# 功能：app.py 的 asyncio 版本（Quart = Flask API 的 ASGI 實作，模板/路由寫法相同）
+#   - 呼叫 Ollama 用 httpx 非同步串流：等待生成時不佔 OS 執行緒
+#   - 規則計分 / DB 推薦 / 量化指標等同步程式碼丟到執行緒池
+# 用法：hypercorn asgi_app:app --bind 0.0.0.0:5000
+#       （需要 pip install quart httpx hypercorn）
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from werkzeug.exceptions import HTTPException
+from quart import Quart, Response, abort, g, jsonify, make_response, render_template, request, send_file
+
+import app as sync_app
+from ai.async_client import ascan_json_stream, get_async_backend
+from ai.circuit_breaker import LLM_LATENCY_BUDGET
+from ai.llm_telemetry import LLM_TELEMETRY, StreamMeter
+from ai.report_sections import REPORT_FANOUT_PARALLEL, ReportSection, sections_for
+from database.product_repository import get_product_entry
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    HTTP_IN_FLIGHT,
+    METRICS_ENABLED,
+    REGISTRY,
+    endpoint_label,
+    observe_request,
+    record_error,
+    span,
+)
+from http_cache import (
+    REVALIDATE_PRIVATE,
+    REVALIDATE_PUBLIC,
+    compress_body,
+    dumps_compact,
+    is_not_modified,
+    make_etag,
+    render_last_modified,
+    render_version,
+    validator_headers,
+)
+from static_assets import ASSETS, ASSET_URL_PREFIX, IMMUTABLE_CACHE_CONTROL, asset_url, service_worker_context
+
+# 同步工作（SQLite、計分）用的執行緒池；LLM 等待不佔這裡的執行緒
+OFFLOAD_THREADS = int(os.getenv("ASYNC_OFFLOAD_THREADS", "16"))
+
+app = Quart(__name__)
+app.config["JSON_AS_ASCII"] = False
+app.jinja_env.globals["asset_url"] = asset_url
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+async def _offload(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, fn, *args)
+
+
+@app.before_serving
+async def _startup():
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=OFFLOAD_THREADS, thread_name_prefix="offload")
+    # 背景預熱共享狀態：不擋住 before_serving，伺服器立刻開始 accept（SHARED_STATE_WARMUP=sync 時才會在這裡等）
+    await _offload(sync_app.start_shared_state_warmup)
+    get_async_backend()
+    sync_app.init_model_warmup()
+
+
+@app.after_serving
+async def _shutdown():
+    await get_async_backend().aclose()
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+
+
+@app.errorhandler(Exception)
+async def _handle_all_errors(e):
+    import traceback
+
+    if isinstance(e, HTTPException):
+        return e
+
+    record_error(request.url_rule.rule if request.url_rule else None, e)
+    traceback.print_exc()
+    if request.path == "/submit":
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return f"Server Error: {e}", 500
+
+
+# =========================
+# 請求計時（與 metrics.install_flask_metrics 相同的指標）
+# =========================
+if METRICS_ENABLED:
+
+    @app.before_request
+    async def _metrics_start():
+        g._metrics_t0 = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+
+    @app.after_request
+    async def _metrics_record(resp):
+        t0 = g.pop("_metrics_t0", None)
+        if t0 is not None:
+            observe_request(endpoint_label(request), request.method, resp.status_code, time.perf_counter() - t0)
+            HTTP_IN_FLIGHT.dec()
+            g._metrics_done = True
+        return resp
+
+    @app.teardown_request
+    async def _metrics_teardown(exc):
+        if not g.pop("_metrics_done", False) and g.pop("_metrics_t0", None) is not None:
+            HTTP_IN_FLIGHT.dec()
+
+
+# =========================
+# LLM（非同步）
+# =========================
+async def call_ollama_report_async(
+    system_prompt: str,
+    user_input_json: str,
+    quiz_id: str = "",
+    section: Optional[ReportSection] = None,
+    deadline: Optional[float] = None,
+) -> dict:
+    """app.call_ollama_report 的非同步版，行為相同（payload 組裝與解析共用 app 的 helper）"""
+    sync_app.MODEL_WARMER.touch()
+    if deadline is None:
+        deadline = time.time() + LLM_LATENCY_BUDGET
+    prompt, prompt_type = sync_app._report_prompt(user_input_json, quiz_id, section)
+    router = sync_app.MODEL_ROUTER
+    # 路由可能要查 /api/ps（同步 HTTP）：多模型時丟到執行緒池，單一模型直接算；SLO = 這次實際剩下的時間
+    if router.enabled:
+        decision = await _offload(
+            router.route, prompt_type, len(system_prompt) + len(prompt), sync_app._route_slo(deadline)
+        )
+    else:
+        decision = router.route(prompt_type, slo_s=sync_app._route_slo(deadline))
+    payload = sync_app._report_payload(decision.model, system_prompt, prompt, quiz_id, section)
+    meter = StreamMeter(decision.model, prompt_type)
+    try:
+        with span("llm.generate"):
+            chunks = get_async_backend().generate_stream(
+                sync_app.OLLAMA_URL, payload, timeout=(5, LLM_LATENCY_BUDGET)
+            )
+            sc = await asyncio.wait_for(
+                ascan_json_stream(chunks, deadline=deadline, meter=meter), timeout=max(0.0, deadline - time.time())
+            )
+    except Exception as e:
+        raise Exception(f"AI 服務連線失敗：{e}")
+    finally:
+        LLM_TELEMETRY.record(meter.finish())
+    return sync_app._parse_report(sc)
+
+
+async def call_ollama_report_sections_async(
+    system_prompt: str, user_input_json: str, quiz_id: str, sections: List[ReportSection]
+) -> dict:
+    """app.call_ollama_report_sections 的非同步版：各段是同一個 event loop 上的 coroutine，共用一個 deadline"""
+    deadline = time.time() + LLM_LATENCY_BUDGET
+    outcomes = []
+    with span("llm.fanout"):
+        for i in range(0, len(sections), REPORT_FANOUT_PARALLEL):
+            wave = sections[i : i + REPORT_FANOUT_PARALLEL]
+            if time.time() >= deadline:
+                outcomes.extend((s, None, TimeoutError("LLM 生成超過延遲預算")) for s in wave)
+                continue
+            outs = await asyncio.gather(
+                *(call_ollama_report_async(system_prompt, user_input_json, quiz_id, s, deadline) for s in wave),
+                return_exceptions=True,
+            )
+            for s, out in zip(wave, outs):
+                if isinstance(out, BaseException):
+                    outcomes.append((s, None, out))
+                else:
+                    outcomes.append((s, out, None))
+    return sync_app._merge_fanout(outcomes)
+
+
+async def _try_llm_report_async(system_prompt: str, ai_input: str, quiz_id: str) -> Tuple[Optional[dict], str]:
+    if not sync_app.LLM_BREAKER.allow_request():
+        return None, "circuit_open"
+    sections = sections_for(quiz_id)
+    try:
+        if sections:
+            ai_data = await call_ollama_report_sections_async(system_prompt, ai_input, quiz_id, sections)
+        else:
+            ai_data = await call_ollama_report_async(system_prompt, ai_input, quiz_id)
+    except Exception as e:
+        return sync_app._report_outcome(None, e)
+    return sync_app._report_outcome(ai_data, None)
+
+
+# =========================
+# Routes：頁面
+# =========================
+@app.route("/")
+async def home():
+    return await render_template("index.html")
+
+
+@app.route("/quiz/<quiz_id>")
+async def quiz_entry(quiz_id: str):
+    quiz_id = (quiz_id or "").lower().strip()
+    if quiz_id not in ("insurance", "values"):
+        abort(404)
+
+    if quiz_id == "insurance":
+        return await render_template("main_questionnaire.html", quiz_id="insurance", quiz_title="推薦保單系統")
+    return await render_template("questionnaire.html", quiz_id="values", quiz_title="價值觀分析系統")
+
+
+def _not_modified_response(etag, last_modified, cache_control):
+    if is_not_modified(request.headers.get("If-None-Match"), request.headers.get("If-Modified-Since"), etag, last_modified):
+        return Response(b"", status=304, headers=validator_headers(etag, last_modified, cache_control))
+    return None
+
+
+def _with_validators(body: str, etag, last_modified, cache_control):
+    return Response(body, mimetype="text/html", headers=validator_headers(etag, last_modified, cache_control))
+
+
+@app.route("/result/<user_id>")
+async def result_page(user_id: str):
+    entry = await _offload(sync_app.RESULT_STORE.get_result_entry, user_id)
+    if not entry:
+        return await render_template("result_display.html", error="找不到該用戶的分析結果，請重新填寫。")
+    result_data, written_at = entry
+
+    etag = make_etag("result", user_id, written_at, render_version(ASSETS.version))
+    last_modified = render_last_modified(written_at)
+    cached = _not_modified_response(etag, last_modified, REVALIDATE_PRIVATE)
+    if cached is not None:
+        return cached
+    with span("render"):
+        body = await render_template("result_display.html", final_result=result_data)
+    return _with_validators(body, etag, last_modified, REVALIDATE_PRIVATE)
+
+
+@app.route("/product/<product_id>")
+async def product_detail(product_id: str):
+    p, db_mtime = await _offload(get_product_entry, product_id)
+    if not p:
+        return await render_template("product_detail.html", error="找不到此商品，可能資料庫沒有該商品或 ID 不正確。")
+
+    etag = make_etag("product", p.get("product_id"), db_mtime, render_version(ASSETS.version))
+    last_modified = render_last_modified(db_mtime)
+    cached = _not_modified_response(etag, last_modified, REVALIDATE_PUBLIC)
+    if cached is not None:
+        return cached
+    with span("render"):
+        body = await render_template("product_detail.html", product=p)
+    return _with_validators(body, etag, last_modified, REVALIDATE_PUBLIC)
+
+
+@app.route(ASSET_URL_PREFIX + "<path:filename>")
+async def hashed_asset(filename: str):
+    hit = ASSETS.resolve(filename, request.headers.get("Accept-Encoding", ""))
+    if hit is None:
+        abort(404)
+    path, mimetype, encoding = hit
+    resp = await send_file(path, mimetype=mimetype, conditional=True)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
+
+
+@app.route("/service-worker.js")
+async def service_worker():
+    resp = await make_response(await render_template("service-worker.js", **service_worker_context()))
+    resp.headers["Content-Type"] = "application/javascript; charset=utf-8"
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+# =========================
+# Routes：API
+# =========================
+@app.route("/submit", methods=["POST"])
+async def submit():
+    data = await request.get_json(silent=True) or {}
+    if not data:
+        return jsonify({"status": "error", "message": "未收到任何數據"}), 400
+
+    quiz_id, answers = sync_app._parse_submit_payload(data)
+
+    store = sync_app.RESULT_STORE
+    user_id = store.new_id()
+    await _offload(store.put_submission, user_id, {"quiz_id": quiz_id, "answers": answers})
+
+    try:
+        ctx = await _offload(sync_app._prepare_report, quiz_id, answers)
+        ai_data, degraded_reason = None, ""
+        # 作答途中已經用同樣的答案先跑過（或正在跑）：等那個結果，不佔執行緒
+        reused = await _await_speculative(data.get("session_id"), ctx)
+        if reused is not None:
+            ai_data, degraded_reason = reused
+        elif ctx["ai_input"] is not None:
+            ai_data, degraded_reason = await _try_llm_report_async(ctx["system_prompt"], ctx["ai_input"], quiz_id)
+        with span("finalize"):
+            report = await _offload(sync_app._finalize_report, ctx, ai_data, degraded_reason)
+        with span("store"):
+            await _offload(store.put_result, user_id, report)
+        return jsonify({"status": "success", "user_id": user_id, "degraded": bool(report.get("degraded"))}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+async def _await_speculative(session_id: Optional[str], ctx: dict) -> Optional[Tuple[Optional[dict], str]]:
+    """
+    SPECULATIVE.take 的非同步版：投機工作在同步 app 的執行緒池裡跑，這裡只 await 它的 Future；
+    只等這個工作剩下的預算，等過了還失敗就回降級結果、不再重跑（SpeculativeReports.settle）
+    """
+    speculative = sync_app.SPECULATIVE
+    job = speculative.claim(session_id, ctx)
+    if job is None:
+        return None
+    waited = not job.future.done()
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(job.future), job.remaining(LLM_LATENCY_BUDGET))
+    except Exception as e:
+        return speculative.settle(job, waited, None, e)
+    return speculative.settle(job, waited, result, None)
+
+
+@app.route("/progress", methods=["POST"])
+async def progress():
+    session_id, quiz_id, answers, total = sync_app._parse_progress_payload(await request.get_json(silent=True) or {})
+    if answers is None:
+        return jsonify({"status": "error", "message": "缺少 answers"}), 400
+    return jsonify(await _offload(sync_app.SPECULATIVE.observe, session_id, quiz_id, answers, total)), 202
+
+
+@app.route("/api/result/<user_id>")
+async def api_result(user_id: str):
+    entry = await _offload(sync_app.RESULT_STORE.get_result_entry, user_id)
+    if not entry:
+        return jsonify({"status": "error", "message": "找不到該用戶的分析結果"}), 404
+    result_data, written_at = entry
+
+    etag = make_etag("api-result", user_id, written_at)
+    cached = _not_modified_response(etag, written_at, REVALIDATE_PRIVATE)
+    if cached is not None:
+        return cached
+
+    body, encoding = compress_body(
+        dumps_compact(sync_app.compact_result(result_data)), request.headers.get("Accept-Encoding")
+    )
+    resp = Response(body, mimetype="application/json", headers=validator_headers(etag, written_at, REVALIDATE_PRIVATE))
+    resp.headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    return resp
+
+
+if METRICS_ENABLED:
+
+    @app.route("/metrics")
+    async def metrics_endpoint():
+        return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route("/llm/telemetry")
+async def llm_telemetry():
+    out = {
+        "status": "ok",
+        **LLM_TELEMETRY.summary(),
+        "router": sync_app.MODEL_ROUTER.status(),
+        "speculative": sync_app.SPECULATIVE.stats(),
+    }
+    # 負數 / 非數字當 0（不附逐筆紀錄），上限 200
+    n = max(0, min(request.args.get("recent", 0, type=int), 200))
+    if n:
+        out["recent"] = LLM_TELEMETRY.last(n)
+    return jsonify(out), 200
+
+
+@app.route("/analytics/values")
+async def values_cohort():
+    return jsonify(await _offload(sync_app.values_cohort_report)), 200
+
+
+@app.route("/db_check")
+async def db_check():
+    body, status = await _offload(sync_app.db_check_report)
+    return jsonify(body), status
+
+
+@app.route("/health")
+async def health():
+    return jsonify({"status": "ok"}), 200
+
+
+@app.route("/ready")
+async def ready():
+    st = await _offload(sync_app.MODEL_WARMER.status)
+    st["breaker"] = sync_app.LLM_BREAKER.status()
+    st["shared_state"] = {"ready": sync_app.SHARED_STATE_READY.is_set(), **sync_app.SHARED_STATE_INFO}
+    ok = bool(st.get("loaded")) and sync_app.SHARED_STATE_READY.is_set()
+    return jsonify({"status": "ready" if ok else "warming", **st}), 200 if ok else 503
+
+
+if __name__ == "__main__":
+    print("Async server starting on http://127.0.0.1:5000")
+    app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,290 @@
+# bench.py
+# 功能：熱路徑微基準（repository / 規則計分 / 價值觀量化 / LLM 回應解析）+ 與基準線比較
+# 用法：python bench.py                          → 跑全部，與 bench_baseline.json 比較（變慢超過門檻 exit 1）
+#       python bench.py --save-baseline          → 把這次結果存成新的基準線
+#       python bench.py --sizes 10000,100000     → 合成商品目錄（複製 policies 放大）的筆數，預設 10k 與 100k
+#       python bench.py --filter recommend --json out.json
+#   - 每個 case 先自動校準迴圈次數（每輪至少 --min-time 秒），取 --repeat 輪的中位數（µs / 次）
+#   - 基準線跟機器綁定：換機器或升級 Python/SQLite 後先 --save-baseline 再比較
+#   - 合成目錄放在暫存目錄，同樣 rows/seed 會重用，--regen 強制重建
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+import database.product_repository as repo
+from ai.ollama_client import _extract_first_json_object
+from loadtest import load_questions
+from logic.scoring import compute_insurance_scoring
+from logic.value_metrics import compute_value_metrics
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BASE_DIR, "bench_baseline.json")
+# 中位數比基準線慢超過這個倍數 → 視為退化
+DEFAULT_THRESHOLD = float(os.getenv("BENCH_THRESHOLD", "1.25"))
+
+AGE_TEXTS = ["0歲~74歲", "15足歲~64歲", "15足歲~80歲", "20歲以上", "65歲以下", "6個月~70歲", "", "依條款"]
+
+
+# =========================
+# 合成商品目錄
+# =========================
+def make_synthetic_catalog(rows: int, seed: int = 7, regen: bool = False) -> str:
+    """
+    以 product.db 的 policies 為樣本放大到 rows 筆：名稱加序號、承保年齡隨機換，
+    其他欄位照抄（關鍵字命中比例與真實資料相近）。建同樣的索引並 ANALYZE。
+    """
+    path = os.path.join(tempfile.gettempdir(), f"ai_modle_bench_{rows}_{seed}.db")
+    if os.path.exists(path) and not regen:
+        return path
+    if os.path.exists(path):
+        os.remove(path)
+
+    src = sqlite3.connect(repo.DB_PATH)
+    try:
+        ddl = src.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='policies'").fetchone()[0]
+        cols = [r[1] for r in src.execute('PRAGMA table_info("policies")').fetchall()]
+        sample = src.execute("SELECT * FROM policies").fetchall()
+    finally:
+        src.close()
+
+    name_i = cols.index("保險名稱")
+    age_i = cols.index("承保年齡")
+    rng = random.Random(seed)
+
+    def gen():
+        for i in range(rows):
+            r = list(sample[i % len(sample)])
+            if i >= len(sample):
+                r[name_i] = f"{r[name_i]}（S{i}）"
+                r[age_i] = rng.choice(AGE_TEXTS)
+            yield r
+
+    dst = sqlite3.connect(path)
+    try:
+        dst.execute(ddl)
+        placeholders = ",".join("?" * len(cols))
+        dst.executemany(f'INSERT INTO "policies" VALUES ({placeholders})', gen())
+        dst.execute("CREATE INDEX IF NOT EXISTS idx_policies_name ON policies(保險名稱)")
+        dst.execute("ANALYZE")
+        dst.commit()
+    finally:
+        dst.close()
+    return path
+
+
+# =========================
+# 計時
+# =========================
+def measure(fn: Callable[[], Any], min_time: float, repeat: int) -> Dict[str, Any]:
+    # 校準：迴圈次數加倍直到單輪超過 min_time
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        dt = time.perf_counter() - t0
+        if dt >= min_time or loops >= 1 << 24:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(dt, 1e-9) * 1.1))
+
+    per_call: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        per_call.append((time.perf_counter() - t0) / loops * 1e6)
+    return {
+        "median_us": round(statistics.median(per_call), 3),
+        "min_us": round(min(per_call), 3),
+        "stdev_us": round(statistics.pstdev(per_call), 3),
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+# =========================
+# 測試資料
+# =========================
+SCORINGS = [
+    {"top_categories": [{"key": "health_medical"}, {"key": "accident"}, {"key": "life_protection"}]},
+    {"top_categories": [{"key": "travel"}, {"key": "investment"}]},
+    {"top_categories": [{"key": "long_term_care"}, {"key": "group"}, {"key": "health_medical"}]},
+]
+
+def _fixed_answers(quiz_id: str) -> Dict[str, Any]:
+    """
+    依前端題庫（static/script.js，與 loadtest 同一份解析）組出固定的一份答案，選項文字跟正式問卷一字不差：
+    單選依題號輪流挑不同選項、多選取前三個；保單問卷用前端送出的 {choice / multi} 格式。
+    """
+    answers: Dict[str, Any] = {}
+    for i, (qid, options, multi) in enumerate(load_questions()[quiz_id]):
+        if not options:
+            continue
+        if quiz_id == "values":
+            answers[qid] = options[(i * 3 + 1) % len(options)]
+        elif multi:
+            answers[qid] = {"multi": options[:3]}
+        else:
+            answers[qid] = {"choice": options[(i * 2 + 1) % len(options)]}
+    return answers
+
+
+INSURANCE_ANSWERS = _fixed_answers("insurance")
+VALUES_ANSWERS = _fixed_answers("values")
+
+LLM_CLEAN = json.dumps({
+    "status": "success",
+    "quiz_id": "values",
+    "person_summary": "你重視穩定與家庭，做決定前會先評估風險。" * 4,
+    "dimensions": [{"name": f"維度{i}", "score": 60 + i, "comment": "說明文字" * 10} for i in range(5)],
+    "suggestions": ["建議" * 15 for _ in range(5)],
+}, ensure_ascii=False)
+# 模型常見的「前後多講幾句」輸出
+LLM_NOISY = "好的，以下是分析結果：\n```json\n" + LLM_CLEAN + "\n```\n希望對你有幫助！"
+
+
+def build_cases(sizes: List[int], regen: bool) -> Dict[str, Any]:
+    # 延後 import：app 會載入 Flask 與模板，只有需要 _safe_parse_json 時才付這個成本
+    from app import _safe_parse_json
+
+    cases: Dict[str, Any] = {}
+
+    catalogs = [("real", repo.DB_PATH)] + [(str(n), make_synthetic_catalog(n, regen=regen)) for n in sizes]
+    for label, path in catalogs:
+        def recommend(path=path):
+            repo.DB_PATH = path
+            for sc in SCORINGS:
+                repo.recommend_top3_products(sc, user_meta={"age": 38})
+
+        def product_db(path=path):
+            repo.DB_PATH = path
+            repo.get_product_by_id(7)
+
+        cases[f"repo.recommend_top3_products[{label}]"] = recommend
+        cases[f"repo.get_product_by_id.db[{label}]"] = product_db
+
+    real_db = repo.DB_PATH
+
+    def product_cached():
+        repo.get_product_by_id(7)
+
+    def product_cached_setup():
+        repo.DB_PATH = real_db
+        repo.preload_catalog()
+
+    cases["repo.get_product_by_id.catalog"] = (product_cached_setup, product_cached)
+
+    def age_ok():
+        for t in AGE_TEXTS:
+            repo._age_ok(t, 38)
+
+    cases["repo._age_ok[x8]"] = age_ok
+    cases["logic.compute_insurance_scoring"] = lambda: compute_insurance_scoring(INSURANCE_ANSWERS)
+    cases["logic.compute_value_metrics"] = lambda: compute_value_metrics(VALUES_ANSWERS)
+    cases["ai._extract_first_json_object[noisy]"] = lambda: _extract_first_json_object(LLM_NOISY)
+    cases["app._safe_parse_json[clean]"] = lambda: _safe_parse_json(LLM_CLEAN)
+    cases["app._safe_parse_json[noisy]"] = lambda: _safe_parse_json(LLM_NOISY)
+    return cases
+
+
+def run(cases: Dict[str, Any], name_filter: str, min_time: float, repeat: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    saved_db, saved_catalog = repo.DB_PATH, repo._CATALOG
+    try:
+        for name, case in cases.items():
+            if name_filter and name_filter not in name:
+                continue
+            setup, fn = case if isinstance(case, tuple) else (None, case)
+            repo._CATALOG = None
+            if setup is not None:
+                setup()
+            fn()  # 暖身（lru_cache、SQLite page cache）
+            results[name] = measure(fn, min_time, repeat)
+            print(f"{name:48s} {results[name]['median_us']:>12.2f} µs  (loops={results[name]['loops']})")
+    finally:
+        repo.DB_PATH, repo._CATALOG = saved_db, saved_catalog
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    base = baseline.get("results") or {}
+    regressions: List[str] = []
+    print(f"\n{'case':48s} {'baseline':>12s} {'now':>12s} {'ratio':>7s}")
+    for name, r in results.items():
+        b = base.get(name)
+        if not b:
+            print(f"{name:48s} {'-':>12s} {r['median_us']:>12.2f}    new")
+            continue
+        ratio = r["median_us"] / b["median_us"] if b["median_us"] else 1.0
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{name:48s} {b['median_us']:>12.2f} {r['median_us']:>12.2f} {ratio:>7.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": int(time.time()),
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="熱路徑微基準 + 基準線比較")
+    ap.add_argument("--sizes", default="10000,100000", help="合成商品目錄筆數（逗號分隔；空字串 = 只用真實 product.db）")
+    ap.add_argument("--filter", default="", help="只跑名稱包含這段文字的 case")
+    ap.add_argument("--min-time", type=float, default=0.2, help="每輪最少秒數")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--json", default="", help="結果另存成 JSON（CI 用）")
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    ap.add_argument("--regen", action="store_true", help="重建合成商品目錄")
+    args = ap.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    results = run(build_cases(sizes, args.regen), args.filter, args.min_time, args.repeat)
+    report = {"env": environment(), "threshold": args.threshold, "results": results}
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n[基準線] 已寫入 {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\n[基準線] 找不到 {args.baseline}，先跑 --save-baseline")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if (baseline.get("env") or {}).get("python") != report["env"]["python"]:
+        print(f"[注意] 基準線是 Python {baseline['env'].get('python')}，這次是 {report['env']['python']}")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n[退化] {len(regressions)} 個 case 比基準線慢超過 {args.threshold:.2f} 倍")
+        return 1
+    print("\n[通過] 沒有超過門檻的退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# build_assets.py
+# 功能：靜態資源建置步驟（部署前跑一次；改了 css/js 後再跑）
+# 用法：python build_assets.py            → 產生 static/dist/ 與 asset-manifest.json
+#       python build_assets.py --clean    → 先清空 static/dist/
+#   - 檔名加內容雜湊：style.css → style.3f2a1b9c0d.css（內容不變雜湊不變，瀏覽器快取一直有效）
+#   - 文字檔另存 .gz（最高壓縮）與 .br（有裝 brotli 套件才產生）
+#   - manifest.webmanifest 內的 icon 路徑改寫成雜湊後網址
+#   - version = 全部雜湊的雜湊，Service Worker 用它當快取名稱
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, List
+
+from static_assets import (
+    COMPRESSIBLE_EXTS,
+    DIST_DIR,
+    HASH_LEN,
+    MANIFEST_PATH,
+    hashed_name,
+    list_source_files,
+    read_source,
+)
+
+try:
+    import brotli  # 選用：pip install brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _compress(path: str, data: bytes) -> List[str]:
+    encodings = []
+    if brotli is not None:
+        _write(path + ".br", brotli.compress(data, quality=11))
+        encodings.append("br")
+    # mtime=0：同樣內容每次 build 出一樣的 .gz
+    _write(path + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+    encodings.append("gzip")
+    return encodings
+
+
+def build(clean: bool = False) -> Dict[str, object]:
+    if clean and os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+
+    sources = list_source_files()
+    # webmanifest 引用 icons，最後處理才拿得到 icon 的雜湊檔名
+    sources.sort(key=lambda rel: rel.endswith(".webmanifest"))
+
+    assets: Dict[str, str] = {}
+    encodings: Dict[str, List[str]] = {}
+    for rel in sources:
+        data = read_source(rel, assets)
+        hashed = hashed_name(rel, data)
+        out_path = os.path.join(DIST_DIR, *hashed.split("/"))
+        _write(out_path, data)
+        assets[rel] = hashed
+
+        if os.path.splitext(rel)[1] in COMPRESSIBLE_EXTS:
+            encodings[hashed] = _compress(out_path, data)
+
+    version = hashlib.sha256("\n".join(sorted(assets.values())).encode("utf-8")).hexdigest()[:HASH_LEN]
+    manifest = {"version": version, "assets": assets, "encodings": encodings}
+    _write(MANIFEST_PATH, json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="產生雜湊檔名 + 預先壓縮的靜態資源")
+    parser.add_argument("--clean", action="store_true", help="先清空 static/dist/")
+    args = parser.parse_args()
+
+    manifest = build(clean=args.clean)
+    for src, hashed in manifest["assets"].items():
+        encs = ",".join(manifest["encodings"].get(hashed, [])) or "-"
+        print(f"{src:28s} → {hashed}  [{encs}]")
+    print(f"version={manifest['version']}  brotli={'yes' if brotli is not None else 'no (pip install brotli)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# build_product_summaries.py
+# 功能：離線用本機 Ollama 為每個商品產生固定格式的「摘要 + 重點賣點」，寫回 policies 的額外欄位
+# 用法：python build_product_summaries.py              → 只處理來源內容有變（或還沒有摘要）的商品
+#       python build_product_summaries.py --dry-run    → 只列出需要重新產生的筆數
+#       python build_product_summaries.py --force --limit 20
+#   - 來源欄位（名稱 / 主附約 / 說明 / 賠償項目 / 商品條款）的雜湊存在「摘要來源雜湊」，
+#     雜湊沒變就跳過；每筆產生完立刻 commit，中斷後重跑會從還沒做完的地方接著做
+#   - 單筆解析 / 生成失敗只記錄並跳過；連不上 Ollama 才整批停下
+#   - --dry-run 不動 schema：摘要欄位還不存在時視為全部待產生
+#   - import_nanshan_to_product_db.py 匯入完成後會自動呼叫 build()（Ollama 沒開只印警告，不影響匯入）
+#   - /submit 的保單 prompt 改送摘要與賣點（database.product_repository.prompt_product），不再送整段原文
+
+import argparse
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from ai.ollama_client import DEFAULT_MODEL, DEFAULT_OLLAMA_URL, call_ollama_json
+from database import product_repository as repo
+from database.product_repository import (
+    POINTS_COL,
+    SUMMARY_COL,
+    SUMMARY_COLUMNS,
+    SUMMARY_HASH_COL,
+    SUMMARY_SOURCE_COLUMNS,
+    summary_source_hash,
+)
+
+SUMMARY_MODEL = os.getenv("PRODUCT_SUMMARY_MODEL", DEFAULT_MODEL)
+SUMMARY_MAX_CHARS = 60
+POINT_MAX_CHARS = 20
+POINTS_N = 3
+
+SYSTEM_PROMPT_PRODUCT_SUMMARY = f"""你是保險商品文案編輯，必須使用「繁體中文」。
+你會收到一個保險商品的原始資料（名稱、主約/附約、說明、賠償項目、條款）。
+請整理成固定格式的商品摘要，給保險顧問 AI 在推薦時引用。
+
+嚴格規則：
+- 只能輸出「純 JSON」，不得有 Markdown 或多餘文字
+- 只根據提供的資料，不可編造保額、費率或原文沒有的保障
+- 原文只有「見條款細節」這類佔位字時，依商品名稱寫出保守的描述
+
+輸出格式：
+{{
+  "summary": "一句話說明這是什麼商品、保障什麼（{SUMMARY_MAX_CHARS} 字以內）",
+  "selling_points": ["重點賣點1（{POINT_MAX_CHARS} 字以內）", "重點賣點2", "重點賣點3"]
+}}
+"""
+
+SUMMARY_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "selling_points": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["summary", "selling_points"],
+}
+
+
+def _columns(conn: sqlite3.Connection) -> set:
+    return {r[1] for r in conn.execute('PRAGMA table_info("policies")').fetchall()}
+
+
+def ensure_columns(conn: sqlite3.Connection) -> None:
+    have = _columns(conn)
+    for col in SUMMARY_COLUMNS:
+        if col not in have:
+            conn.execute(f'ALTER TABLE policies ADD COLUMN "{col}" TEXT')
+    conn.commit()
+
+
+def pending_rows(conn: sqlite3.Connection, force: bool = False) -> List[Dict[str, Any]]:
+    """來源雜湊跟存的不一樣（或還沒有摘要）的商品；摘要欄位還沒建立就是全部"""
+    have = _columns(conn)
+    stored = tuple(c for c in (SUMMARY_COL, SUMMARY_HASH_COL) if c in have)
+    if len(stored) < 2:
+        force = True
+    cols = ", ".join(f'"{c}"' for c in SUMMARY_SOURCE_COLUMNS + stored)
+    out: List[Dict[str, Any]] = []
+    for r in conn.execute(f"SELECT rowid AS product_id, {cols} FROM policies ORDER BY rowid").fetchall():
+        row = dict(r)
+        row["_hash"] = summary_source_hash(row)
+        if force or not row.get(SUMMARY_COL) or row.get(SUMMARY_HASH_COL) != row["_hash"]:
+            out.append(row)
+    return out
+
+
+def _normalize(obj: Any) -> Optional[Dict[str, Any]]:
+    """固定格式：摘要截到上限、賣點剛好 POINTS_N 點（不足就不補，寧缺勿濫）"""
+    if not isinstance(obj, dict):
+        return None
+    summary = str(obj.get("summary") or "").strip()
+    if not summary:
+        return None
+    points = [str(p).strip()[:POINT_MAX_CHARS] for p in (obj.get("selling_points") or []) if str(p).strip()]
+    return {"summary": summary[:SUMMARY_MAX_CHARS], "selling_points": points[:POINTS_N]}
+
+
+def summarize(row: Dict[str, Any], model: str, url: str) -> Optional[Dict[str, Any]]:
+    source = {c: row.get(c) for c in SUMMARY_SOURCE_COLUMNS if repo._clean(row.get(c))}
+    obj = call_ollama_json(
+        SYSTEM_PROMPT_PRODUCT_SUMMARY,
+        source,
+        model=model,
+        url=url,
+        schema=SUMMARY_SCHEMA,
+        prompt_type="product_summary",
+        input_label="商品資料",
+    )
+    return _normalize(obj)
+
+
+def _is_connection_error(e: BaseException) -> bool:
+    """call_ollama_json 會把底層例外包一層：沿著例外鏈找連線失敗（Ollama 沒開 / 中途掛掉）"""
+    import requests
+
+    seen = 0
+    while e is not None and seen < 10:
+        if isinstance(e, (requests.ConnectionError, ConnectionError)):
+            return True
+        e = e.__cause__ or e.__context__
+        seen += 1
+    return False
+
+
+def build(
+    db_path: Optional[str] = None,
+    model: str = SUMMARY_MODEL,
+    url: str = DEFAULT_OLLAMA_URL,
+    limit: int = 0,
+    force: bool = False,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    conn = sqlite3.connect(db_path or repo.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    stats = {"pending": 0, "done": 0, "failed": 0, "seconds": 0.0}
+    t0 = time.time()
+    try:
+        rows = pending_rows(conn, force=force)
+        stats["pending"] = len(rows)
+        if dry_run:
+            # 只回報筆數：不 ALTER TABLE
+            return stats
+        ensure_columns(conn)
+        if limit:
+            rows = rows[:limit]
+        for i, row in enumerate(rows, 1):
+            try:
+                out = summarize(row, model, url)
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"[摘要] #{row['product_id']} {row['保險名稱']} 失敗：{e}")
+                # 連不上 Ollama（沒開 / 中途掛掉）：直接停，別把剩下每一筆都等到失敗；已完成的都已 commit
+                if _is_connection_error(e):
+                    raise
+                continue
+            if out is None:
+                stats["failed"] += 1
+                print(f"[摘要] #{row['product_id']} {row['保險名稱']} 回傳格式不符，跳過")
+                continue
+            conn.execute(
+                f'UPDATE policies SET "{SUMMARY_COL}" = ?, "{POINTS_COL}" = ?, "{SUMMARY_HASH_COL}" = ? WHERE rowid = ?',
+                (out["summary"], "\n".join(out["selling_points"]), row["_hash"], row["product_id"]),
+            )
+            conn.commit()
+            stats["done"] += 1
+            if i % 20 == 0:
+                print(f"[摘要] {i}/{len(rows)}")
+    finally:
+        conn.close()
+        stats["seconds"] = round(time.time() - t0, 1)
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description="離線產生商品摘要與重點賣點")
+    ap.add_argument("--model", default=SUMMARY_MODEL)
+    ap.add_argument("--url", default=DEFAULT_OLLAMA_URL)
+    ap.add_argument("--limit", type=int, default=0, help="最多處理幾筆（0 = 全部）")
+    ap.add_argument("--force", action="store_true", help="忽略雜湊，全部重新產生")
+    ap.add_argument("--dry-run", action="store_true", help="只列出需要重新產生的筆數")
+    args = ap.parse_args()
+
+    stats = build(model=args.model, url=args.url, limit=args.limit, force=args.force, dry_run=args.dry_run)
+    print(f"[摘要] 需要產生 {stats['pending']} 筆；完成 {stats['done']}、失敗 {stats['failed']}（{stats['seconds']}s）")
+
+
+if __name__ == "__main__":
+    main()
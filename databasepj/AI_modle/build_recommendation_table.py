@@ -0,0 +1,71 @@
+# build_recommendation_table.py
+# 功能：離線產生「推薦結果查表」recommendation_table.json（商品目錄每次匯入後重跑）
+# 用法：python build_recommendation_table.py
+#   - 規則計分的 top_categories 最多 3 個、類別只有 CATEGORY_NAMES 這幾種，
+#     所以直接列舉所有「有序 1~3 個類別」→ 正規化後的類別 key，涵蓋所有可達的計分結果
+#     （不必列舉整個答案空間；自由填寫不影響計分，也不會多出新的 key）
+#   - 每個 (類別 key, 年齡) 跑一次 recommend_top3_products + attach_riders_to_mains，只存商品 id
+#   - import_nanshan_to_product_db.py 匯入完成後會自動呼叫 build()
+
+import argparse
+import json
+import os
+import time
+from itertools import permutations
+from typing import Any, Dict, List
+
+from database.product_repository import attach_riders_to_mains, recommend_top3_products
+from database.recommendation_table import (
+    REACHABLE_AGES,
+    RECO_TABLE_PATH,
+    catalog_version,
+    recommendation_key,
+)
+from logic.scoring import CATEGORY_NAMES
+
+
+def reachable_scorings() -> List[Dict[str, Any]]:
+    """每個不同的 recommendation_key（不含年齡）取一個代表性的 scoring"""
+    seen: Dict[str, Dict[str, Any]] = {}
+    cats = list(CATEGORY_NAMES)
+    for n in (1, 2, 3):
+        for combo in permutations(cats, n):
+            scoring = {"top_categories": [{"key": k} for k in combo]}
+            seen.setdefault(recommendation_key(scoring, None), scoring)
+    return list(seen.values())
+
+
+def build(path: str = RECO_TABLE_PATH) -> Dict[str, Any]:
+    version = catalog_version()
+    entries: Dict[str, List[List[Any]]] = {}
+    for scoring in reachable_scorings():
+        for age in REACHABLE_AGES:
+            user_meta = {"age": age}
+            products = recommend_top3_products(scoring, user_meta=user_meta)
+            products = attach_riders_to_mains(products, scoring, user_meta=user_meta, limit=2)
+            entries[recommendation_key(scoring, age)] = [
+                [p.get("product_id"), [r.get("product_id") for r in p.get("riders") or []]]
+                for p in products
+            ]
+
+    table = {"catalog_version": version, "built_at": int(time.time()), "entries": entries}
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(table, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="離線產生推薦結果查表")
+    parser.add_argument("--out", default=RECO_TABLE_PATH, help="輸出路徑（預設 RECO_TABLE_PATH）")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    table = build(args.out)
+    print(f"[完成] {len(table['entries'])} 筆（catalog_version={table['catalog_version']}）")
+    print(f"[完成] 耗時 {time.perf_counter() - t0:.2f}s → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
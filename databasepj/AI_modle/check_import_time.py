@@ -0,0 +1,112 @@
+# check_import_time.py
+# 功能：啟動時間守門（python -X importtime）——import app 變慢或重型模組又被提前載入就 exit 1
+# 用法：python check_import_time.py                    → 檢查 app（預設）
+#       python check_import_time.py --module asgi_app    → 用 asgi_app 自己的預算（MODULE_BUDGETS_MS）
+#       python check_import_time.py --module app --budget-ms 200
+#       python check_import_time.py --top 15           → 額外列出最慢的 15 個模組（找兇手用）
+#   - 子 process 跑 -X importtime，重複 --runs 次取最小值（排除磁碟快取 / 排程雜訊）
+#   - 兩道關卡：
+#       1) 總載入時間（cumulative）不得超過 --budget-ms（沒給就用該模組的預算）
+#       2) 延後載入的重型模組不得出現在 import 階段（requests / json5 / numpy / pandas …）
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "300"))
+
+# 各模組自己的預算：asgi_app 必須在模組頂層建立 Quart app，Quart 連帶載入 hypercorn / h2 / wsproto
+# （約 180 ms）再加上 asyncio，這部分延後不了；同樣保留約兩倍的餘裕
+MODULE_BUDGETS_MS = {
+    "asgi_app": float(os.getenv("IMPORT_TIME_BUDGET_MS_ASGI", "600")),
+}
+
+# 只在實際用到時才載入的模組：出現在 import 階段代表有人又在模組頂層 import 了
+LAZY_MODULES = {
+    "app": ("requests", "json5", "numpy", "pandas", "httpx", "asyncio", "openpyxl", "waitress"),
+    "wsgi": ("requests", "json5", "numpy", "pandas", "httpx", "asyncio", "openpyxl"),
+    # ASGI 版本身就需要 asyncio / httpx
+    "asgi_app": ("requests", "json5", "numpy", "pandas", "openpyxl"),
+}
+
+_RE_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def measure_once(module: str) -> Tuple[Dict[str, Tuple[int, int]], int]:
+    """回傳 ({模組: (self µs, cumulative µs)}, 目標模組 cumulative µs)"""
+    env = dict(os.environ)
+    # 量的是 import 本身：不讓環境設定觸發額外的網路 / 模型動作
+    env.setdefault("LLM_BACKEND", "fake")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True, encoding="utf-8", errors="replace",
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} 失敗：\n{proc.stderr[-2000:]}")
+
+    mods: Dict[str, Tuple[int, int]] = {}
+    total = 0
+    for line in proc.stderr.splitlines():
+        m = _RE_LINE.match(line)
+        if not m:
+            continue
+        self_us, cum_us, name = int(m.group(1)), int(m.group(2)), m.group(4)
+        mods[name] = (self_us, cum_us)
+        if name == module and not m.group(3).strip(" "):
+            total = cum_us
+    return mods, total
+
+
+def measure(module: str, runs: int) -> Tuple[Dict[str, Tuple[int, int]], int]:
+    best_mods: Dict[str, Tuple[int, int]] = {}
+    best_total = -1
+    for _ in range(max(1, runs)):
+        mods, total = measure_once(module)
+        if best_total < 0 or total < best_total:
+            best_mods, best_total = mods, total
+    return best_mods, best_total
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="import 時間預算檢查（python -X importtime）")
+    ap.add_argument("--module", default="app")
+    ap.add_argument("--budget-ms", type=float, default=None, help="預設：MODULE_BUDGETS_MS，其餘模組 IMPORT_TIME_BUDGET_MS")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=10, help="列出 self 時間最長的 N 個模組")
+    args = ap.parse_args()
+    if args.budget_ms is None:
+        args.budget_ms = MODULE_BUDGETS_MS.get(args.module, DEFAULT_BUDGET_MS)
+
+    mods, total_us = measure(args.module, args.runs)
+    total_ms = total_us / 1000
+    failures: List[str] = []
+
+    print(f"[importtime] import {args.module}: {total_ms:.1f} ms（預算 {args.budget_ms:.0f} ms，{args.runs} 次取最小）")
+    if total_ms > args.budget_ms:
+        failures.append(f"總載入時間 {total_ms:.1f} ms 超過預算 {args.budget_ms:.0f} ms")
+
+    eager = [m for m in LAZY_MODULES.get(args.module, ()) if m in mods]
+    for m in eager:
+        failures.append(f"{m} 在 import 階段就被載入（{mods[m][1] / 1000:.1f} ms）；請改成在用到的函式內 import")
+
+    if args.top:
+        print(f"\n{'module':40s} {'self ms':>9s} {'cum ms':>9s}")
+        for name, (self_us, cum_us) in sorted(mods.items(), key=lambda kv: -kv[1][0])[: args.top]:
+            print(f"{name:40s} {self_us / 1000:>9.2f} {cum_us / 1000:>9.2f}")
+
+    if failures:
+        print("\n[失敗]")
+        for f in failures:
+            print(f"  - {f}")
+        return 1
+    print("\n[通過]")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,16 @@
 # AI_modle/database/product_repository.py
+import hashlib
+import json
 import os
 import re
 import sqlite3
+import threading
+import time
 from typing import Any, Dict, List, Optional, Tuple
 
+from database.query_trace import connection_factory
+from metrics import span, timed
+
 
 # -------------------------
 # DB 連線
@@ -12,7 +19,8 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.normpath(os.path.join(BASE_DIR, "..", "product.db"))
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    # DB_TRACE=1 時換成會記錄每個查詢耗時/筆數的 TracingConnection
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, factory=connection_factory())
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -147,17 +155,8 @@ def _infer_channel(source_file: str) -> str:
 # -------------------------
 # 從 policies 撈候選
 # -------------------------
-def _fetch_candidates_by_keywords(
-    conn: sqlite3.Connection,
-    keywords: List[str],
-    age: Optional[int] = None,
-    limit: int = 80,
-) -> List[Dict[str, Any]]:
-    if not keywords:
-        return []
-
-    cur = conn.cursor()
-
+def _keyword_query(keywords: List[str], limit: int) -> Optional[Tuple[str, List[Any]]]:
+    """組出 _fetch_candidates_by_keywords 的 SQL；沒有有效關鍵字回 None"""
     # WHERE：保險名稱/說明/來源檔案 任一命中
     where_parts = []
     params: List[Any] = []
@@ -179,7 +178,7 @@ def _fetch_candidates_by_keywords(
         where_parts.append("(" + " OR ".join(sub) + ")")
 
     if not where_parts:
-        return []
+        return None
 
     sql = f"""
         SELECT rowid AS product_id, *
@@ -187,7 +186,24 @@ def _fetch_candidates_by_keywords(
         WHERE {" OR ".join(where_parts)}
         LIMIT {int(limit)}
     """
-    cur.execute(sql, params)
+    return sql, params
+
+
+def _fetch_candidates_by_keywords(
+    conn: sqlite3.Connection,
+    keywords: List[str],
+    age: Optional[int] = None,
+    limit: int = 80,
+) -> List[Dict[str, Any]]:
+    if not keywords:
+        return []
+
+    query = _keyword_query(keywords, limit)
+    if query is None:
+        return []
+
+    cur = conn.cursor()
+    cur.execute(*query)
     rows = cur.fetchall()
 
     results: List[Dict[str, Any]] = []
@@ -234,18 +250,20 @@ def _fetch_candidates_by_keywords(
     return results
 
 
+_FALLBACK_SQL = """
+        SELECT rowid AS product_id, *
+        FROM policies
+        ORDER BY rowid DESC
+        LIMIT {limit}
+    """
+
+
 def _fetch_fallback_any(conn: sqlite3.Connection, age: Optional[int], limit: int = 120) -> List[Dict[str, Any]]:
     """
     當分類關鍵字找不到東西時，至少抓一些商品出來避免空畫面。
     """
     cur = conn.cursor()
-    sql = f"""
-        SELECT rowid AS product_id, *
-        FROM policies
-        ORDER BY rowid DESC
-        LIMIT {int(limit)}
-    """
-    cur.execute(sql)
+    cur.execute(_FALLBACK_SQL.format(limit=int(limit)))
     rows = cur.fetchall()
 
     results: List[Dict[str, Any]] = []
@@ -274,6 +292,7 @@ def _fetch_fallback_any(conn: sqlite3.Connection, age: Optional[int], limit: int
 # -------------------------
 # 對外 API：推薦 Top3
 # -------------------------
+@timed("db.recommend")
 def recommend_top3_products(
     scoring: Dict[str, Any],
     user_meta: Optional[Dict[str, Any]] = None
@@ -351,51 +370,245 @@ def attach_riders_to_mains(
 
 
 # -------------------------
-# 對外 API：商品詳情（/product/<id>）
+# /db_check 用：請求路徑上實際會跑的查詢（用真實 SQL 做 EXPLAIN QUERY PLAN）
+# 第 4 欄 = 是否本來就是全表掃描：'%關鍵字%' 用不到索引、fallback 是 rowid 倒序 + LIMIT；
+# 其餘查詢若變成全表掃描就是退化
 # -------------------------
-def get_product_by_id(product_id: Any) -> Optional[Dict[str, Any]]:
-    # product_id 可能是字串，這裡盡量轉 int
+def hot_queries() -> List[Tuple[str, str, List[Any], bool]]:
+    out: List[Tuple[str, str, List[Any], bool]] = []
+    for key in ("health_medical", "travel"):
+        query = _keyword_query(CATEGORY_KEYWORDS[key], 120)
+        if query is not None:
+            out.append((f"candidates_by_keywords:{key}", query[0], query[1], True))
+    out.append(("fallback_any", _FALLBACK_SQL.format(limit=200), [], True))
+    out.append(("product_by_id", _PRODUCT_BY_ID_SQL, [1], False))
+    return out
+
+
+# -------------------------
+# 預載商品目錄（多 worker 部署：fork 前載入，各 worker copy-on-write 共用）
+# -------------------------
+_CATALOG: Optional[Dict[Any, Dict[str, Any]]] = None
+# 目錄載入時 product.db 的檔案時間：商品詳情頁的 ETag / Last-Modified 用這個，不是「現在」的檔案時間
+_CATALOG_MTIME: Optional[float] = None
+_CATALOG_LOCK = threading.Lock()
+# 多久才 stat 一次 product.db 檢查是否重新匯入（秒）；每次查詢都 stat 會讓查 dict 慢好幾倍。0 = 每次都檢查
+CATALOG_CHECK_INTERVAL = float(os.getenv("CATALOG_CHECK_INTERVAL", "2"))
+_CATALOG_CHECKED_AT = 0.0
+
+
+def _db_mtime() -> Optional[float]:
     try:
-        pid = int(str(product_id).strip())
-    except Exception:
-        pid = product_id
+        return os.path.getmtime(DB_PATH)
+    except OSError:
+        return None
 
+
+def preload_catalog() -> int:
+    """把 policies 整張表讀進記憶體，之後 get_product_by_id 直接查 dict"""
+    global _CATALOG, _CATALOG_MTIME
+    # 讀之前先記檔案時間：讀的途中 DB 又被改，下一次請求會看到時間不符再重載
+    mtime = _db_mtime()
     conn = get_db_connection()
     try:
         cur = conn.cursor()
-        cur.execute("SELECT rowid AS product_id, * FROM policies WHERE rowid = ?", (pid,))
-        row = cur.fetchone()
-        if not row:
-            return None
-
-        d = dict(row)
+        cur.execute("SELECT rowid AS product_id, * FROM policies")
+        catalog = {r["product_id"]: _to_product_detail(dict(r)) for r in cur.fetchall()}
+    finally:
+        conn.close()
+    # 先換目錄再換時間（讀的一方先讀時間）：最差是舊時間配新內容，下一輪驗證就會更新，不會把舊內容標成新版本
+    _CATALOG = catalog
+    _CATALOG_MTIME = mtime
+    return len(catalog)
 
-        # ===== 統一欄位（商品詳情頁會用到）=====
-        d["product_id"] = d.get("product_id")
-        d["product_name"] = d.get("保險名稱") or "（未命名商品）"
 
-        d["main_rider"] = d.get("主約/附約/附加條款/批註條款") or ""
-        d["currency"] = d.get("幣別") or ""
-        d["insure_age"] = d.get("承保年齡") or ""
-        d["pay_type"] = d.get("繳費方式") or ""
-        d["pay_period"] = d.get("繳費期間") or ""
+def _refresh_catalog_if_changed() -> None:
+    """
+    product.db 重新匯入過（檔案時間變了）就重載預載目錄；
+    最多每 CATALOG_CHECK_INTERVAL 秒 stat 一次，其餘查詢只比一次 monotonic 時間
+    """
+    global _CATALOG_CHECKED_AT
+    if _CATALOG is None:
+        return
+    now = time.monotonic()
+    if now - _CATALOG_CHECKED_AT < CATALOG_CHECK_INTERVAL:
+        return
+    _CATALOG_CHECKED_AT = now
+    if _db_mtime() == _CATALOG_MTIME:
+        return
+    with _CATALOG_LOCK:
+        if _CATALOG is None or _db_mtime() == _CATALOG_MTIME:
+            return
+        try:
+            preload_catalog()
+        except sqlite3.Error:
+            # 匯入進行中（policies 正被 replace）讀不到：先沿用舊目錄，下一次請求再試
+            pass
+
+
+def _to_product_detail(d: Dict[str, Any]) -> Dict[str, Any]:
+    # ===== 統一欄位（商品詳情頁會用到）=====
+    d["product_id"] = d.get("product_id")
+    d["product_name"] = d.get("保險名稱") or "（未命名商品）"
+
+    d["main_rider"] = d.get("主約/附約/附加條款/批註條款") or ""
+    d["currency"] = d.get("幣別") or ""
+    d["insure_age"] = d.get("承保年齡") or ""
+    d["pay_type"] = d.get("繳費方式") or ""
+    d["pay_period"] = d.get("繳費期間") or ""
+
+    d["description"] = d.get("說明") or ""
+    d["note"] = d.get("註記") or ""
+    d["benefits"] = d.get("賠償項目") or ""
+
+    d["source"] = d.get("來源檔案") or ""
+    d["channel"] = _infer_channel(d.get("source", ""))
+
+    d["departure"] = d.get("出發地點") or ""
+    d["insurance_period"] = d.get("保險期間") or ""
+    d["target"] = d.get("該保險提供對象") or ""
+
+    d["product_code"] = d.get("商品代號") or ""
+    d["terms"] = d.get("商品條款") or ""
+
+    d["gender_limit"] = ""
+
+    # 離線產生的摘要 / 賣點（還沒跑 build_product_summaries.py 時是空的）
+    d["summary"] = _clean(d.get(SUMMARY_COL))
+    d["selling_points"] = [s.strip() for s in str(d.get(POINTS_COL) or "").split("\n") if s.strip()]
+    d.setdefault("riders", [])
+    return d
 
-        d["description"] = d.get("說明") or ""
-        d["note"] = d.get("註記") or ""
-        d["benefits"] = d.get("賠償項目") or ""
 
-        d["source"] = d.get("來源檔案") or ""
-        d["channel"] = _infer_channel(d.get("source", ""))
+# -------------------------
+# 對外 API：商品詳情（/product/<id>）
+# -------------------------
+_PRODUCT_BY_ID_SQL = "SELECT rowid AS product_id, * FROM policies WHERE rowid = ?"
 
-        d["departure"] = d.get("出發地點") or ""
-        d["insurance_period"] = d.get("保險期間") or ""
-        d["target"] = d.get("該保險提供對象") or ""
 
-        d["product_code"] = d.get("商品代號") or ""
-        d["terms"] = d.get("商品條款") or ""
+def get_product_entry(product_id: Any) -> Tuple[Optional[Dict[str, Any]], Optional[float]]:
+    """
+    回傳 (商品, 版本時間)；版本時間是這份內容來源的 product.db 檔案時間，給 ETag / Last-Modified 用。
+    預載目錄的內容跟版本一起取，重新匯入後目錄會先重載，不會拿新的時間配舊的內容。
+    """
+    # product_id 可能是字串，這裡盡量轉 int（推薦表查詢傳進來的本來就是 int，不必繞一圈字串）
+    if isinstance(product_id, int):
+        pid = product_id
+    else:
+        try:
+            pid = int(str(product_id).strip())
+        except Exception:
+            pid = product_id
+
+    # 節流檢查寫在這裡（而不是每次都進 _refresh_catalog_if_changed）：熱路徑只多一次 monotonic()
+    if time.monotonic() - _CATALOG_CHECKED_AT >= CATALOG_CHECK_INTERVAL:
+        _refresh_catalog_if_changed()
+    version, catalog = _CATALOG_MTIME, _CATALOG
+    if catalog is not None:
+        p = catalog.get(pid)
+        if p is None:
+            return None, version
+        d = dict(p)
+        d["riders"] = list(p.get("riders") or [])
+        return d, version
+
+    version = _db_mtime()
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        with span("db.product_lookup"):
+            cur.execute(_PRODUCT_BY_ID_SQL, (pid,))
+            row = cur.fetchone()
+        if not row:
+            return None, version
 
-        d["gender_limit"] = ""
-        d.setdefault("riders", [])
-        return d
+        return _to_product_detail(dict(row)), version
     finally:
         conn.close()
+
+
+def get_product_by_id(product_id: Any) -> Optional[Dict[str, Any]]:
+    return get_product_entry(product_id)[0]
+
+
+# -------------------------
+# 離線商品摘要（build_product_summaries.py 產生，存在 policies 的額外欄位）
+# -------------------------
+SUMMARY_COL = "商品摘要"
+POINTS_COL = "重點賣點"  # 一行一點
+SUMMARY_HASH_COL = "摘要來源雜湊"
+SUMMARY_COLUMNS = (SUMMARY_COL, POINTS_COL, SUMMARY_HASH_COL)
+# 摘要的來源欄位：這幾欄內容變了才需要重新產生
+SUMMARY_SOURCE_COLUMNS = ("保險名稱", "主約/附約/附加條款/批註條款", "說明", "賠償項目", "商品條款")
+
+
+def summary_source_hash(row: Dict[str, Any]) -> str:
+    src = [str(row.get(c) or "").strip() for c in SUMMARY_SOURCE_COLUMNS]
+    return hashlib.sha1(json.dumps(src, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+# -------------------------
+# 給 LLM 的商品投影：有離線摘要就只送摘要 + 賣點，沒有才送原始說明 / 給付 / 條款
+# （完整商品 dict 中英欄位各一份，整包 json.dumps 進 prompt 會多出大量 prefill tokens）
+# -------------------------
+PROMPT_PRODUCT_FIELDS = ("product_id", "product_name", "main_rider", "currency", "insure_age", "pay_period", "channel")
+
+
+def prompt_product(p: Dict[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for k in PROMPT_PRODUCT_FIELDS:
+        v = p.get(k)
+        if k == "product_id":
+            if v is not None:
+                out[k] = v
+        elif _clean(v):
+            out[k] = _clean(v)
+    # 即時查詢路徑的商品 dict 沒經過 _to_product_detail：直接讀原始欄位
+    summary = p.get("summary") or _clean(p.get(SUMMARY_COL))
+    points = p.get("selling_points") or [s.strip() for s in str(p.get(POINTS_COL) or "").split("\n") if s.strip()]
+    if summary:
+        out["summary"] = summary
+        if points:
+            out["selling_points"] = list(points)
+    else:
+        for k in ("description", "benefits", "terms"):
+            if _clean(p.get(k)):
+                out[k] = _clean(p.get(k))
+    riders = [prompt_product(r) for r in (p.get("riders") or []) if isinstance(r, dict)]
+    if riders:
+        out["riders"] = riders
+    return out
+
+
+# -------------------------
+# 精簡投影（/api/result 用）：只留英文統一欄位，拿掉重複的中文原始欄位與空值
+# -------------------------
+COMPACT_PRODUCT_FIELDS = (
+    "product_id",
+    "product_name",
+    "main_rider",
+    "currency",
+    "insure_age",
+    "pay_type",
+    "pay_period",
+    "description",
+    "benefits",
+    "source",
+    "channel",
+)
+
+
+def compact_product(p: Dict[str, Any]) -> Dict[str, Any]:
+    # 佔位文字（見條款細節…）也拿掉，前端自己顯示預設字樣
+    out: Dict[str, Any] = {}
+    for k in COMPACT_PRODUCT_FIELDS:
+        v = p.get(k)
+        if k == "product_id":
+            if v is not None:
+                out[k] = v
+        elif _clean(v):
+            out[k] = _clean(v)
+    riders = [compact_product(r) for r in (p.get("riders") or []) if isinstance(r, dict)]
+    if riders:
+        out["riders"] = riders
+    return out
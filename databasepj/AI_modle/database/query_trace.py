@@ -0,0 +1,224 @@
+# AI_modle/database/query_trace.py
+# 功能：SQLite 查詢追蹤（選用）+ 慢查詢紀錄 + 執行計畫檢查
+#   DB_TRACE=1 時，product_repository 的連線改用 TracingConnection：
+#     每個查詢記錄「正規化後的語句、耗時、回傳筆數」，依語句彙總（次數 / 總耗時 / 最慢 / 筆數）
+#   超過 DB_SLOW_QUERY_MS 的查詢寫一行 [slow-query] 警告到本模組的 logger，並留在最近 N 筆的環狀紀錄
+#   /db_check 另外回報：索引清單、熱門查詢的 EXPLAIN QUERY PLAN、ANALYZE 統計是否過期
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+QUERY_TRACE_ENABLED = os.getenv("DB_TRACE", "0") in ("1", "true", "True")
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "50"))
+SLOW_LOG_SIZE = int(os.getenv("DB_SLOW_LOG_SIZE", "100"))
+# sqlite_stat1 的列數估計跟實際差超過這個比例就當作過期
+ANALYZE_STALE_RATIO = float(os.getenv("DB_ANALYZE_STALE_RATIO", "0.1"))
+
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_duration_seconds", "SQLite statement latency (DB_TRACE=1 only)", ("op", "table")
+)
+
+
+# =========================
+# 語句正規化
+# =========================
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_SPACE = re.compile(r"\s+")
+# _fetch_candidates_by_keywords 依關鍵字數量重複 "(... LIKE ? OR ...)"：收成一組，同一類查詢才會彙總在一起
+_RE_REPEATED_GROUP = re.compile(r"(\([^()]*\))(?:\s+OR\s+\1)+")
+_RE_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+([\w\"]+)", re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    s = _RE_STRING.sub("?", sql or "")
+    s = _RE_NUMBER.sub("?", s)
+    s = _RE_SPACE.sub(" ", s).strip()
+    return _RE_REPEATED_GROUP.sub(r"\1 OR …", s)
+
+
+def _op_and_table(normalized: str) -> Tuple[str, str]:
+    op = normalized.split(" ", 1)[0].upper() if normalized else ""
+    m = _RE_TABLE.search(normalized)
+    return op, (m.group(1).strip('"') if m else "")
+
+
+# =========================
+# 彙總 + 慢查詢紀錄
+# =========================
+class QueryStats:
+    def __init__(self, slow_ms: float = SLOW_QUERY_MS, slow_log_size: int = SLOW_LOG_SIZE):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._by_stmt: Dict[str, List[float]] = {}  # normalized → [count, total_s, max_s, rows]
+        self.slow: Deque[Dict[str, Any]] = deque(maxlen=slow_log_size)
+
+    def record(self, sql: str, seconds: float, rows: int) -> None:
+        stmt = normalize_sql(sql)
+        DB_QUERY_SECONDS.observe(seconds, *_op_and_table(stmt))
+        with self._lock:
+            st = self._by_stmt.get(stmt)
+            if st is None:
+                st = self._by_stmt[stmt] = [0, 0.0, 0.0, 0]
+            st[0] += 1
+            st[1] += seconds
+            st[2] = max(st[2], seconds)
+            st[3] += max(rows, 0)
+
+        ms = seconds * 1000
+        if ms >= self.slow_ms:
+            self.slow.append({"at": time.time(), "ms": round(ms, 2), "rows": rows, "statement": stmt})
+            logger.warning("[slow-query] %.1fms rows=%d %s", ms, rows, stmt[:300])
+
+    def snapshot(self, top: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._by_stmt.items()]
+        items.sort(key=lambda kv: kv[1][1], reverse=True)
+        return {
+            "enabled": QUERY_TRACE_ENABLED,
+            "slow_query_ms": self.slow_ms,
+            "statements": [
+                {
+                    "statement": k,
+                    "count": int(v[0]),
+                    "total_ms": round(v[1] * 1000, 2),
+                    "avg_ms": round(v[1] * 1000 / v[0], 3) if v[0] else 0.0,
+                    "max_ms": round(v[2] * 1000, 2),
+                    "rows": int(v[3]),
+                }
+                for k, v in items[:top]
+            ],
+            "slow": list(self.slow),
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._by_stmt.clear()
+            self.slow.clear()
+
+
+QUERY_STATS = QueryStats()
+
+
+# =========================
+# 追蹤用的 Connection / Cursor
+# =========================
+class TracingCursor(sqlite3.Cursor):
+    """
+    execute 開始計時；第一次 fetch 完成時（fetchall 全部 / fetchone 一筆）才記錄，
+    `for row in cur` 則在迭代結束時記錄（筆數 = 迭代到的列數）；
+    耗時包含 SQLite 實際逐列掃描的時間，不只是 prepare。
+    """
+
+    _pending: Optional[Tuple[str, float]] = None
+    _iter_rows = 0
+
+    def execute(self, sql: str, parameters: Sequence[Any] = ()):
+        self._flush(-1)
+        self._iter_rows = 0
+        t0 = time.perf_counter()
+        super().execute(sql, parameters)
+        if self.description is None:
+            # 非查詢（INSERT / UPDATE / DDL）：執行完就結束了
+            QUERY_STATS.record(sql, time.perf_counter() - t0, self.rowcount)
+        else:
+            self._pending = (sql, t0)
+        return self
+
+    def fetchall(self) -> List[Any]:
+        rows = super().fetchall()
+        self._flush(len(rows))
+        return rows
+
+    def fetchone(self) -> Any:
+        row = super().fetchone()
+        self._flush(0 if row is None else 1)
+        return row
+
+    def __next__(self) -> Any:
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._flush(self._iter_rows)
+            raise
+        self._iter_rows += 1
+        return row
+
+    def close(self) -> None:
+        # 沒讀完就關掉：記下已迭代的筆數（沒迭代過就是 -1 = 未知）
+        self._flush(self._iter_rows or -1)
+        super().close()
+
+    def _flush(self, rows: int) -> None:
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            QUERY_STATS.record(pending[0], time.perf_counter() - pending[1], rows)
+
+
+class TracingConnection(sqlite3.Connection):
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters: Sequence[Any] = ()):
+        return self.cursor().execute(sql, parameters)
+
+
+def connection_factory():
+    """給 sqlite3.connect(factory=...)：沒開 DB_TRACE 就是原生 Connection，零額外成本"""
+    return TracingConnection if QUERY_TRACE_ENABLED else sqlite3.Connection
+
+
+# =========================
+# 執行計畫 / 索引 / ANALYZE
+# =========================
+def explain_plan(conn: sqlite3.Connection, sql: str, params: Sequence[Any] = ()) -> Dict[str, Any]:
+    rows = conn.execute("EXPLAIN QUERY PLAN " + sql, tuple(params)).fetchall()
+    steps = [str(r[3]) for r in rows]
+    # "SCAN policies" = 全表掃描；"SCAN ... USING (COVERING) INDEX" 是走索引的有序掃描，不算
+    full_scans = [s for s in steps if s.startswith("SCAN ") and " USING " not in s]
+    return {"plan": steps, "full_scan": bool(full_scans)}
+
+
+def index_inventory(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    rows = conn.execute(
+        "SELECT name, tbl_name FROM sqlite_master WHERE type='index' ORDER BY tbl_name, name"
+    ).fetchall()
+    for name, table in rows:
+        cols = [r[2] for r in conn.execute(f'PRAGMA index_info("{name}")').fetchall()]
+        out.append({"name": name, "table": table, "columns": cols, "auto": name.startswith("sqlite_autoindex")})
+    return out
+
+
+def analyze_freshness(conn: sqlite3.Connection, tables: Sequence[str]) -> Dict[str, Any]:
+    """
+    sqlite_stat1 的第一個數字 = ANALYZE 當下的列數；跟現在的 COUNT(*) 比，
+    差太多代表匯入後沒重跑 ANALYZE，查詢規劃器可能選錯索引。
+    """
+    has_stat = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'"
+    ).fetchone() is not None
+    report: Dict[str, Any] = {}
+    for t in tables:
+        actual = conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0]
+        est = None
+        if has_stat:
+            row = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (t,)).fetchone()
+            if row and row[0]:
+                est = int(str(row[0]).split()[0])
+        if est is None:
+            stale = actual > 0
+        else:
+            stale = abs(actual - est) > max(1, actual) * ANALYZE_STALE_RATIO
+        report[t] = {"analyzed": est is not None, "stat_rows": est, "actual_rows": actual, "stale": stale}
+    return report
@@ -0,0 +1,190 @@
+# AI_modle/database/recommendation_table.py
+# 功能：預先算好的「推薦結果查表」
+#   推薦只取決於（規則計分的 top 類別 → 正規化後的類別 key, 年齡區間），
+#   保單問卷又都是固定選項，可達的組合很少；build_recommendation_table.py 離線全部算好，
+#   /submit 只要一次 dict 查詢 + 從記憶體商品目錄取出商品，不必每次跑 LIKE 查詢。
+#   表內記錄 catalog_version，商品目錄變了（重新匯入）就不會誤用舊表；
+#   表檔或 product.db 的檔案時間一變，下一次查詢就重新載入（重算 catalog_version 再比對）。
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from database.product_repository import (
+    SUMMARY_COLUMNS,
+    _db_mtime,
+    _normalize_category_keys,
+    _pick_category_keys,
+    get_db_connection,
+    get_product_by_id,
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RECO_TABLE_PATH = os.getenv(
+    "RECO_TABLE_PATH", os.path.normpath(os.path.join(BASE_DIR, "..", "recommendation_table.json"))
+)
+RECO_TABLE_ENABLED = os.getenv("RECO_TABLE", "1") not in ("0", "false", "False")
+
+# recommend_top3_products 找不到任何類別時的預設
+DEFAULT_CATEGORY_KEYS = ["health_medical", "accident", "life"]
+
+# app._age_group_to_age 可能產生的年齡（None = Q2 未作答 / 認不得）
+REACHABLE_AGES = (None, 18, 26, 38, 53, 65)
+
+
+def catalog_version() -> str:
+    """
+    policies 表內容的雜湊（欄位 + 每一列），重新匯入後就會改變。
+    離線摘要欄位不算：推薦表只存商品 id，摘要更新不影響推薦結果。
+    """
+    h = hashlib.sha1()
+    conn = get_db_connection()
+    try:
+        cols = [r[1] for r in conn.execute('PRAGMA table_info("policies")').fetchall() if r[1] not in SUMMARY_COLUMNS]
+        select = ", ".join(f'"{c}"' for c in cols)
+        cur = conn.execute(f"SELECT rowid AS product_id, {select} FROM policies ORDER BY rowid")
+        h.update("|".join(d[0] for d in cur.description).encode("utf-8"))
+        for row in cur:
+            h.update(json.dumps(list(row), ensure_ascii=False, default=str).encode("utf-8"))
+    finally:
+        conn.close()
+    return h.hexdigest()[:16]
+
+
+def _file_mtime(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def recommendation_key(scoring: Dict[str, Any], age: Optional[int]) -> str:
+    """
+    與 recommend_top3_products 相同的類別正規化；例：'health_medical,accident,life|38'
+    """
+    keys = _normalize_category_keys(_pick_category_keys(scoring)) or DEFAULT_CATEGORY_KEYS
+    return ",".join(keys) + "|" + ("" if age is None else str(int(age)))
+
+
+class RecommendationTable:
+    """
+    檔案格式：
+    {
+      "catalog_version": "…",
+      "entries": {"health_medical,accident,life|38": [[主約 id, [附約 id…]], …], …}
+    }
+    """
+
+    def __init__(self, path: str = RECO_TABLE_PATH, enabled: bool = RECO_TABLE_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.entries: Dict[str, List[List[Any]]] = {}
+        self.version = ""
+        self.status = "not_loaded"
+        # 載入時的 (表檔, product.db) 檔案時間；任一個變了就重載
+        self._mtimes: Tuple[Optional[float], Optional[float]] = (None, None)
+        self.reloads = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _current_mtimes(self) -> Tuple[Optional[float], Optional[float]]:
+        return _file_mtime(self.path), _db_mtime()
+
+    def load(self, expected_version: Optional[str] = None) -> "RecommendationTable":
+        with self._lock:
+            self._load_locked(expected_version)
+        return self
+
+    def _load_locked(self, expected_version: Optional[str] = None) -> None:
+        # 讀之前先記檔案時間：讀的途中又被改寫，下一次查詢會再重載
+        mtimes = self._current_mtimes()
+        if self._loaded:
+            self.reloads += 1
+        self.entries = {}
+        self.version = ""
+        if not self.enabled:
+            self.status = "disabled"
+        else:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                version = data.get("catalog_version") or ""
+                current = expected_version or catalog_version()
+                if version != current:
+                    # 商品目錄已更新但表還沒重建：整張表不用，走即時查詢
+                    self.status = f"stale (table={version}, catalog={current})"
+                else:
+                    self.entries = data.get("entries") or {}
+                    self.version = version
+                    self.status = "ok"
+            except FileNotFoundError:
+                self.status = "missing"
+            except (OSError, ValueError) as e:
+                self.status = f"error: {e}"
+        self._mtimes = mtimes
+        self._loaded = True
+
+    def _ensure_current(self) -> None:
+        """還沒載入、或表檔 / product.db 換過（重建推薦表、重新匯入商品）就重載"""
+        if self._loaded and (not self.enabled or self._current_mtimes() == self._mtimes):
+            return
+        with self._lock:
+            if not self._loaded or self._current_mtimes() != self._mtimes:
+                try:
+                    self._load_locked()
+                except sqlite3.Error as e:
+                    # 匯入進行中讀不到 policies：這段期間不用表，走即時查詢，下一次再試
+                    self.entries = {}
+                    self.status = f"error: {e}"
+
+    def lookup(
+        self, scoring: Dict[str, Any], user_meta: Optional[Dict[str, Any]] = None, count: bool = True
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        查到就回傳與 recommend_top3_products + attach_riders_to_mains 相同的商品清單；查不到回 None。
+        count=False：不算進 hits / misses（/progress 背景推測）
+        """
+        self._ensure_current()
+        entries = self.entries
+        if not entries:
+            return None
+        hit = entries.get(recommendation_key(scoring, (user_meta or {}).get("age")))
+        if hit is None:
+            if count:
+                self._count(hit=False)
+            return None
+
+        products: List[Dict[str, Any]] = []
+        for main_id, rider_ids in hit:
+            p = get_product_by_id(main_id)
+            if p is None:
+                if count:
+                    self._count(hit=False)
+                return None
+            p["riders"] = [r for r in (get_product_by_id(rid) for rid in rider_ids) if r is not None]
+            products.append(p)
+        if count:
+            self._count(hit=True)
+        return products
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "status": self.status,
+                "entries": len(self.entries),
+                "catalog_version": self.version,
+                "reloads": self.reloads,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,275 @@
+# AI_modle/database/result_store.py
+# 功能：取代 app.py 裡無上限的 USER_DATA_STORE / AI_RESULT_STORE dict
+#   - 熱層：記憶體 LRU（同時限制筆數與估計位元組）；存 JSON 字串，每次讀都解出新物件，呼叫端改了也不會污染快取
+#   - 冷層：SQLite（WAL），背景執行緒批次寫入（write-behind）
+#   - id：隨機 token，不會在多執行緒/多 worker/重啟後撞號
+#   - TTL：過期資料讀不到，並在寫入批次時順便清掉
+import atexit
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# =========================
+# 基本設定（可用環境變數覆蓋）
+# =========================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULT_DB_PATH = os.getenv("RESULT_STORE_DB", os.path.normpath(os.path.join(BASE_DIR, "..", "results.db")))
+RESULT_TTL = int(os.getenv("RESULT_STORE_TTL", str(7 * 24 * 3600)))
+HOT_MAX_ITEMS = int(os.getenv("RESULT_STORE_HOT_ITEMS", "2000"))
+HOT_MAX_BYTES = int(os.getenv("RESULT_STORE_HOT_BYTES", str(64 * 1024 * 1024)))
+# 0 = 每次寫入都同步落地（多 worker 部署時，別的 worker 才讀得到剛寫入的結果）
+WRITE_BEHIND = os.getenv("RESULT_STORE_WRITE_BEHIND", "1") not in ("0", "false", "False")
+FLUSH_INTERVAL = float(os.getenv("RESULT_STORE_FLUSH_INTERVAL", "0.5"))
+FLUSH_BATCH = int(os.getenv("RESULT_STORE_FLUSH_BATCH", "64"))
+
+KIND_SUBMISSION = "submission"
+KIND_RESULT = "result"
+
+
+class ResultStore:
+    def __init__(
+        self,
+        db_path: str = RESULT_DB_PATH,
+        ttl: int = RESULT_TTL,
+        hot_max_items: int = HOT_MAX_ITEMS,
+        hot_max_bytes: int = HOT_MAX_BYTES,
+        write_behind: bool = WRITE_BEHIND,
+        flush_interval: float = FLUSH_INTERVAL,
+        flush_batch: int = FLUSH_BATCH,
+    ):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.hot_max_items = max(1, hot_max_items)
+        self.hot_max_bytes = max(1, hot_max_bytes)
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.flush_batch = max(1, flush_batch)
+
+        self._lock = threading.Lock()
+        # (kind, id) -> (payload_json, size_bytes, expires_at)
+        self._hot: "OrderedDict[Tuple[str, str], Tuple[str, int, float]]" = OrderedDict()
+        self._hot_bytes = 0
+        # (kind, id) -> (payload_json, created_at, expires_at)
+        self._pending: Dict[Tuple[str, str], Tuple[str, float, float]] = {}
+        # 正在寫入 SQLite 的批次：已離開 _pending、還沒 commit，被熱層踢掉的資料在這段期間仍要讀得到
+        self._flushing: Dict[Tuple[str, str], Tuple[str, float, float]] = {}
+        self._wake = threading.Event()
+        self._local = threading.local()
+        self._writer: Optional[threading.Thread] = None
+
+        self.evictions = 0
+        self.expirations = 0
+        self.hot_hits = 0
+        self.cold_hits = 0
+        self.misses = 0
+        self.flushed = 0
+
+        self._init_db()
+        if self.write_behind:
+            self._writer = threading.Thread(target=self._writer_loop, name="result-store-writer", daemon=True)
+            self._writer.start()
+        atexit.register(self.flush)
+
+    # -------------------------
+    # SQLite
+    # -------------------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        # 每個執行緒一條連線，避免共用 connection 造成鎖競爭
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self) -> None:
+        conn = self._connect()
+        try:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS result_store (
+                    kind TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (kind, id)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_result_store_expires ON result_store(expires_at)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _write_rows(self, rows: List[Tuple[str, str, str, float, float]]) -> None:
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO result_store VALUES (?, ?, ?, ?, ?)", rows)
+            cur = conn.execute("DELETE FROM result_store WHERE expires_at < ?", (time.time(),))
+            self.expirations += max(0, cur.rowcount or 0)
+        self.flushed += len(rows)
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            batch = self._pending
+            self._pending = {}
+            self._flushing = batch
+        rows = [(k[0], k[1], p, c, e) for k, (p, c, e) in batch.items()]
+        try:
+            self._write_rows(rows)
+        except sqlite3.Error:
+            # 寫入失敗就放回去，下一輪再試（新寫入的同 key 資料優先）
+            with self._lock:
+                for k, v in batch.items():
+                    self._pending.setdefault(k, v)
+                self._flushing = {}
+            raise
+        with self._lock:
+            self._flushing = {}
+
+    def _writer_loop(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                time.sleep(self.flush_interval)
+
+    # -------------------------
+    # 熱層 LRU
+    # -------------------------
+    def _hot_put_locked(self, key: Tuple[str, str], payload: str, size: int, expires_at: float) -> None:
+        old = self._hot.pop(key, None)
+        if old is not None:
+            self._hot_bytes -= old[1]
+        self._hot[key] = (payload, size, expires_at)
+        self._hot_bytes += size
+        while self._hot and (len(self._hot) > self.hot_max_items or self._hot_bytes > self.hot_max_bytes):
+            _, (_, sz, _) = self._hot.popitem(last=False)
+            self._hot_bytes -= sz
+            self.evictions += 1
+
+    # -------------------------
+    # 對外
+    # -------------------------
+    @staticmethod
+    def new_id() -> str:
+        return secrets.token_urlsafe(12)
+
+    def put(self, kind: str, item_id: str, obj: Any) -> None:
+        payload = json.dumps(obj, ensure_ascii=False, default=str)
+        now = time.time()
+        expires_at = now + self.ttl
+        key = (kind, str(item_id))
+        with self._lock:
+            self._hot_put_locked(key, payload, len(payload.encode("utf-8")), expires_at)
+            self._pending[key] = (payload, now, expires_at)
+            n_pending = len(self._pending)
+        if not self.write_behind:
+            self.flush()
+        elif n_pending >= self.flush_batch:
+            self._wake.set()
+
+    def get_entry(self, kind: str, item_id: str) -> Optional[Tuple[Any, float]]:
+        """回傳 (obj, 寫入時間)；寫入時間 = 到期時間 - TTL，給 ETag / Last-Modified 用"""
+        key = (kind, str(item_id))
+        now = time.time()
+        with self._lock:
+            hit = self._hot.get(key)
+            if hit is not None:
+                payload, _, expires_at = hit
+                if expires_at < now:
+                    self._hot_bytes -= self._hot.pop(key)[1]
+                    self.misses += 1
+                    return None
+                self._hot.move_to_end(key)
+                self.hot_hits += 1
+            else:
+                payload = None
+                pending = self._pending.get(key) or self._flushing.get(key)
+        if payload is not None:
+            return json.loads(payload), expires_at - self.ttl
+
+        if pending is not None:
+            payload, _, expires_at = pending
+        else:
+            row = self._conn().execute(
+                "SELECT payload, expires_at FROM result_store WHERE kind = ? AND id = ?", key
+            ).fetchone()
+            if row is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+            payload, expires_at = row
+
+        if expires_at < now:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self._hot_put_locked(key, payload, len(payload.encode("utf-8")), expires_at)
+            self.cold_hits += 1
+        return json.loads(payload), expires_at - self.ttl
+
+    def get(self, kind: str, item_id: str) -> Optional[Any]:
+        entry = self.get_entry(kind, item_id)
+        return entry[0] if entry is not None else None
+
+    def put_submission(self, item_id: str, data: Dict[str, Any]) -> None:
+        self.put(KIND_SUBMISSION, item_id, data)
+
+    def put_result(self, item_id: str, result: Dict[str, Any]) -> None:
+        self.put(KIND_RESULT, item_id, result)
+
+    def get_result(self, item_id: str) -> Optional[Dict[str, Any]]:
+        return self.get(KIND_RESULT, item_id)
+
+    def get_result_entry(self, item_id: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        return self.get_entry(KIND_RESULT, item_id)
+
+    def get_submission(self, item_id: str) -> Optional[Dict[str, Any]]:
+        return self.get(KIND_SUBMISSION, item_id)
+
+    def iter_items(self, kind: str) -> Iterator[Any]:
+        """後台分析用：逐筆讀出某一類的全部未過期資料（先落地待寫入的批次，直接掃 SQLite）"""
+        if self._pending:
+            self.flush()
+        cur = self._conn().execute(
+            "SELECT payload FROM result_store WHERE kind = ? AND expires_at >= ?", (kind, time.time())
+        )
+        for (payload,) in cur:
+            yield json.loads(payload)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hot_items": len(self._hot),
+                "hot_bytes": self._hot_bytes,
+                "hot_max_items": self.hot_max_items,
+                "hot_max_bytes": self.hot_max_bytes,
+                "pending_writes": len(self._pending),
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hot_hits": self.hot_hits,
+                "cold_hits": self.cold_hits,
+                "misses": self.misses,
+                "flushed": self.flushed,
+                "write_behind": self.write_behind,
+                "ttl": self.ttl,
+            }
@@ -0,0 +1,112 @@
+# fake_ollama_server.py
+# 功能：本機假 Ollama（只用標準函式庫），實作 /api/generate（串流/非串流）、/api/ps、/api/tags
+# 用法：
+#   python fake_ollama_server.py --port 11435 --latency lognormal:800,0.5 --token-rate 40 \
+#          --malformed-rate 0.05 --error-rate 0.01 --seed 42
+#   OLLAMA_URL=http://127.0.0.1:11435/api/generate python app.py
+
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ai.fake_llm import FakeLLM, FakeLLMConfig, FakeLLMError, _parse_model_speed, latency_arg
+
+
+def make_handler(llm: FakeLLM):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            # 壓測時大量請求，不逐筆印 log
+            pass
+
+        def _send_json(self, code: int, obj) -> None:
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/api/ps":
+                return self._send_json(200, {"models": llm.loaded_models()})
+            if self.path == "/api/tags":
+                return self._send_json(200, {"models": [{"name": m["name"]} for m in llm.loaded_models()]})
+            if self.path in ("/", "/api/version"):
+                return self._send_json(200, {"version": "fake", "config": llm.config.to_dict()})
+            return self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/api/generate":
+                return self._send_json(404, {"error": "not found"})
+
+            n = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(self.rfile.read(n) or b"{}")
+            except ValueError:
+                return self._send_json(400, {"error": "invalid json body"})
+
+            # Ollama 預設 stream=true
+            stream = payload.get("stream", True)
+
+            try:
+                if not stream:
+                    return self._send_json(200, llm.generate(payload))
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in llm.generate_stream(payload):
+                    line = (json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8")
+                    self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+            except FakeLLMError as e:
+                if not stream:
+                    return self._send_json(500, {"error": str(e)})
+                line = (json.dumps({"error": str(e)}, ensure_ascii=False) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # 客戶端提早斷線（逾時/取消），直接結束
+                pass
+
+    return Handler
+
+
+def main():
+    env = FakeLLMConfig.from_env()
+    ap = argparse.ArgumentParser(description="本機假 Ollama 伺服器（壓測/回歸用）")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--latency", type=latency_arg, default=env.latency, help="fixed:MS | uniform:LO,HI | lognormal:MEDIAN,SIGMA")
+    ap.add_argument("--token-rate", type=float, default=env.token_rate, help="每秒 token 數")
+    ap.add_argument("--malformed-rate", type=float, default=env.malformed_rate)
+    ap.add_argument("--error-rate", type=float, default=env.error_rate)
+    ap.add_argument("--load-ms", type=float, default=env.load_ms, help="冷載入耗時")
+    ap.add_argument("--seed", type=int, default=env.seed)
+    ap.add_argument("--model-speed", default=",".join(f"{k}={v}" for k, v in env.model_speed.items()),
+                    help="各模型相對速度，例：llama3.2:3b=3,llama3:8b=1（測多模型路由）")
+    args = ap.parse_args()
+
+    cfg = FakeLLMConfig(
+        latency=args.latency,
+        token_rate=args.token_rate,
+        malformed_rate=args.malformed_rate,
+        error_rate=args.error_rate,
+        load_ms=args.load_ms,
+        seed=args.seed,
+        model_speed=_parse_model_speed(args.model_speed),
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(FakeLLM(cfg)))
+    server.daemon_threads = True
+    print(f"[fake-ollama] http://{args.host}:{args.port}/api/generate  {cfg.to_dict()}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# gunicorn.conf.py
+# 用法：gunicorn -c gunicorn.conf.py wsgi:application
+# gunicorn 會在載入 app 之前先讀這個檔，所以這裡設定的環境變數對 app.py 也有效
+
+import multiprocessing
+import os
+
+# 多個 worker 各自有記憶體熱層，結果必須同步寫進 SQLite，
+# 否則 A worker 剛寫完、B worker 處理 /result 時會讀不到
+os.environ.setdefault("RESULT_STORE_WRITE_BEHIND", "0")
+# preload_app：共享狀態在 master fork 前同步載完，worker 直接繼承（背景執行緒不會跨 fork 存活）
+os.environ.setdefault("SHARED_STATE_WARMUP", "sync")
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# fork 前先載入 app（商品目錄、模板、文案快取），worker copy-on-write 共用
+preload_app = True
+
+# 每核一個 worker；每個 worker 用大量執行緒等 LLM（I/O bound，不吃 CPU）
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+
+# 投機預生成（ai/speculative.py）的工作只存在單一 worker 的記憶體：
+# /progress 跟 /submit 落在不同 worker 就接不上，背景生成只會白佔 Ollama，多 worker 時一律關掉
+if workers > 1 and os.getenv("SPECULATIVE_PREFETCH", "0") not in ("0", "false", "False"):
+    print(f"[gunicorn] workers={workers}：SPECULATIVE_PREFETCH 只支援單一 worker，已關閉")
+    os.environ["SPECULATIVE_PREFETCH"] = "0"
+
+# 單一請求最久 = LLM 延遲預算 + 規則/DB/模板的餘裕
+timeout = int(float(os.getenv("LLM_LATENCY_BUDGET", "25")) + 30)
+graceful_timeout = 30
+keepalive = 5
+
+# 定期回收 worker，避免長時間運行的記憶體碎片
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "500"))
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-")
+
+
+def post_fork(server, worker):
+    # 執行緒不會跨 fork 存活，背景預熱必須在每個 worker 內各自啟動
+    from app import init_model_warmup
+
+    init_model_warmup()
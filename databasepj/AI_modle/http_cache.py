@@ -0,0 +1,161 @@
+# http_cache.py
+# 功能：動態回應的「條件式 GET + 壓縮 + 精簡 JSON」小工具（Flask / Quart 共用，只依賴 werkzeug）
+#   - ETag / Last-Modified：結果寫入後就不會變，重新整理或分享連結直接回 304，不必重新渲染模板
+#   - 精簡 JSON：orjson（有裝時）或 json 無空白分隔
+#   - gzip / brotli：依 Accept-Encoding 協商，太小的回應不壓
+import gzip
+import hashlib
+import json
+import os
+from typing import Any, Optional, Tuple
+
+from werkzeug.http import http_date, parse_date, parse_etags
+
+try:
+    import orjson  # 選用
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import brotli  # 選用：pip install brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_DIR = os.path.join(BASE_DIR, "templates")
+
+# 小於這個大小壓縮不划算（header + CPU 成本比省下的還多）
+MIN_COMPRESS_BYTES = int(os.getenv("HTTP_MIN_COMPRESS_BYTES", "512"))
+GZIP_LEVEL = int(os.getenv("HTTP_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("HTTP_BROTLI_QUALITY", "5"))
+
+# 可以被瀏覽器快取，但每次都要回來驗證（驗證通過就是 304，幾乎不花成本）
+REVALIDATE_PRIVATE = "private, no-cache"
+REVALIDATE_PUBLIC = "public, no-cache"
+
+
+# =========================
+# 渲染版本：模板或靜態資源變了，舊的 ETag 自然失效
+# =========================
+def _template_fingerprint() -> Tuple[str, float]:
+    h = hashlib.sha256()
+    newest = 0.0
+    for root, _, files in os.walk(TEMPLATE_DIR):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            try:
+                with open(path, "rb") as f:
+                    h.update(name.encode("utf-8"))
+                    h.update(f.read())
+                newest = max(newest, os.path.getmtime(path))
+            except OSError:
+                continue
+    return h.hexdigest()[:12], newest
+
+
+_RENDER_VERSION: Optional[Tuple[str, float]] = None
+
+
+def _fingerprint() -> Tuple[str, float]:
+    global _RENDER_VERSION
+    if _RENDER_VERSION is None:
+        _RENDER_VERSION = _template_fingerprint()
+    return _RENDER_VERSION
+
+
+def render_version(extra: str = "") -> str:
+    """模板內容雜湊（行程內只算一次）+ 呼叫端附加的版本（例如靜態資源 manifest 版本）"""
+    version = _fingerprint()[0]
+    return f"{version}-{extra}" if extra else version
+
+
+def render_last_modified(*times: Optional[float]) -> float:
+    """Last-Modified 取資料時間與模板時間較新者，只送 If-Modified-Since 的客戶端才不會拿到舊版面"""
+    return max([_fingerprint()[1]] + [t for t in times if t is not None])
+
+
+def make_etag(*parts: Any) -> str:
+    h = hashlib.sha1()
+    for p in parts:
+        h.update(str(p).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()[:20]
+
+
+def is_not_modified(
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+    etag: str,
+    last_modified: Optional[float] = None,
+) -> bool:
+    """
+    RFC 9110：有 If-None-Match 就只看 ETag；沒有才看 If-Modified-Since。
+    """
+    if if_none_match:
+        return parse_etags(if_none_match).contains_weak(etag)
+    if if_modified_since and last_modified is not None:
+        since = parse_date(if_modified_since)
+        if since is not None:
+            return int(last_modified) <= int(since.timestamp())
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[float], cache_control: str) -> dict:
+    headers = {"ETag": f'"{etag}"', "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+# =========================
+# JSON + 壓縮
+# =========================
+def dumps_compact(obj: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    accepted = set()
+    for token in (accept_encoding or "").split(","):
+        parts = [p.strip() for p in token.split(";")]
+        if not parts[0]:
+            continue
+        q = 1.0
+        for p in parts[1:]:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(parts[0].lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress_body(body: bytes, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """回傳 (body, Content-Encoding 或 None)"""
+    if len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+    enc = negotiate_encoding(accept_encoding)
+    if enc == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if enc == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), "gzip"
+    return body, None
+
+
+def file_mtime(path: str, default: Optional[float] = None) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return default
+
@@ -73,9 +73,26 @@ def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
+def _keep_summaries(conn: sqlite3.Connection, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    replace 會把離線產生的摘要欄位一起清掉：先依保險名稱讀出舊摘要接回去。
+    摘要來源雜湊也一起保留，build_product_summaries 只會重跑內容真的變了的商品。
+    """
+    from database.product_repository import SUMMARY_COLUMNS
+
+    have = {r[1] for r in conn.execute('PRAGMA table_info("policies")').fetchall()}
+    if not all(c in have for c in SUMMARY_COLUMNS):
+        return df
+    cols = ", ".join(f'"{c}"' for c in ("保險名稱",) + SUMMARY_COLUMNS)
+    old = pd.read_sql_query(f"SELECT {cols} FROM policies", conn).drop_duplicates(subset=["保險名稱"])
+    df = df.drop(columns=[c for c in SUMMARY_COLUMNS if c in df.columns])
+    return df.merge(old, on="保險名稱", how="left")
+
 def import_to_sqlite(df: pd.DataFrame):
     conn = sqlite3.connect(DB_FILE)
     try:
+        df = _keep_summaries(conn, df)
+
         # policies 表：直接 replace（只會覆蓋 policies，不會動到其他表）
         df.to_sql("policies", conn, if_exists="replace", index=False)
 
@@ -86,6 +103,9 @@ def import_to_sqlite(df: pd.DataFrame):
         except Exception:
             pass
 
+        # 重新整理查詢規劃器的統計（/db_check 的 analyze 會檢查是否過期）
+        cur.execute("ANALYZE;")
+
         conn.commit()
     finally:
         conn.close()
@@ -99,5 +119,18 @@ def main():
     print(f"[完成] 筆數：{len(df)}")
     print(f"[完成] 資料庫位置：{DB_FILE}")
 
+    # 離線商品摘要：只重跑來源內容有變的商品；Ollama 沒開不擋匯入，之後再單獨跑 build_product_summaries.py
+    from build_product_summaries import build as build_product_summaries
+    try:
+        s = build_product_summaries()
+        print(f"[完成] 商品摘要：新產生 {s['done']} 筆、失敗 {s['failed']} 筆（需要 {s['pending']} 筆）")
+    except Exception as e:
+        print(f"[警告] 商品摘要未產生（{e}）；/submit 會先用原始商品說明")
+
+    # 商品目錄變了：重建推薦查表（catalog_version 不符的舊表 app 也不會採用）
+    from build_recommendation_table import build as build_recommendation_table
+    table = build_recommendation_table()
+    print(f"[完成] 推薦查表：{len(table['entries'])} 筆（catalog_version={table['catalog_version']}）")
+
 if __name__ == "__main__":
     main()
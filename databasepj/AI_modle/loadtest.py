@@ -0,0 +1,421 @@
+# loadtest.py
+# 功能：端到端壓測 /submit → /result/<id>（發版前量 p50/p99 與吞吐量上限）
+# 用法：
+#   同進程（預設）：直接驅動 Flask app，LLM 用同進程假模型，延遲由 --llm-latency 控制
+#     python loadtest.py --rate 5 --duration 30 --llm-latency lognormal:800,0.5
+#   打已啟動的伺服器（gunicorn / waitress / hypercorn），LLM 由 fake_ollama_server.py 代替：
+#     python fake_ollama_server.py --port 11435 --latency lognormal:800,0.5 &
+#     OLLAMA_URL=http://127.0.0.1:11435/api/generate gunicorn -c gunicorn.conf.py wsgi:application &
+#     python loadtest.py --url http://127.0.0.1:5000 --rate 5,10,20,40 --duration 30
+#   - --rate 給多個值 = 逐段加壓，報告每段實際吞吐量與延遲，並找出吞吐量上限
+#   - 開放式負載（依排程送出，不等前一個回來）；延遲從「排定送出時間」起算，排隊時間不會被藏掉
+#   - 問卷答案依 static/script.js 的題目與選項隨機合成（保單 Q1–Q9 dict/multi 格式、價值觀 q1–qN）
+#   - 伺服器端各階段延遲取自 /metrics 的 app_stage_duration_seconds（壓測前後相減）
+#   - 降級率：/submit 回傳 degraded=true（LLM 失敗 / 逾時 / 斷路 → 規則版報告）的比例；
+#     HTTP 200 但內容是規則版不算成功，吞吐量上限同時看錯誤率與降級率
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from ai.fake_llm import latency_arg
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_JS = os.path.join(BASE_DIR, "static", "script.js")
+
+
+# =========================
+# 問卷答案合成
+# =========================
+_RE_QID = re.compile(r'id:\s*"([QV]\d+)"')
+_RE_OPTION = re.compile(r'key:\s*"([A-Z])",\s*text:\s*"([^"]*)"')
+_RE_MULTI = re.compile(r"multi:\s*(true|false)")
+
+
+def load_questions(path: str = SCRIPT_JS) -> Dict[str, List[Tuple[str, List[str], bool]]]:
+    """從前端題庫抓出 [(題號, ["A. 選項", ...], 是否多選)]；題目改了壓測資料自動跟著變"""
+    with open(path, "r", encoding="utf-8") as f:
+        src = f.read()
+    marks = list(_RE_QID.finditer(src))
+    quizzes: Dict[str, List[Tuple[str, List[str], bool]]] = {"insurance": [], "values": []}
+    for i, m in enumerate(marks):
+        block = src[m.end(): marks[i + 1].start() if i + 1 < len(marks) else len(src)]
+        options = [f"{k}. {t}" for k, t in _RE_OPTION.findall(block)]
+        multi = _RE_MULTI.search(block)
+        qid = m.group(1)
+        if qid.startswith("Q"):
+            quizzes["insurance"].append((qid, options, bool(multi and multi.group(1) == "true")))
+        else:
+            # 後端價值觀問卷吃 q1~qN
+            quizzes["values"].append(("q" + qid[1:], options, False))
+    return quizzes
+
+
+class PayloadFactory:
+    def __init__(self, questions: Dict[str, List[Tuple[str, List[str], bool]]], seed: int,
+                 free_text_rate: float = 0.1, skip_rate: float = 0.03):
+        self.questions = questions
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.free_text_rate = free_text_rate
+        self.skip_rate = skip_rate
+
+    def make(self, quiz_id: str) -> Dict[str, Any]:
+        with self.lock:
+            rng = self.rng
+            answers: Dict[str, Any] = {}
+            for qid, options, multi in self.questions[quiz_id]:
+                if not options or rng.random() < self.skip_rate:
+                    continue
+                if quiz_id == "values":
+                    answers[qid] = rng.choice(options)
+                    continue
+                slot: Dict[str, Any] = {"choice": "", "multi": [], "free_text": ""}
+                if multi:
+                    slot["multi"] = rng.sample(options, rng.randint(1, min(4, len(options))))
+                else:
+                    slot["choice"] = rng.choice(options)
+                if rng.random() < self.free_text_rate:
+                    slot["free_text"] = "希望保費不要太高"
+                answers[qid] = slot
+            return {"quiz_id": quiz_id, "answers": answers}
+
+
+# =========================
+# 兩種驅動方式：同進程 test client / HTTP
+# =========================
+class InProcessTarget:
+    name = "in-process"
+
+    def __init__(self):
+        import app as app_module
+
+        app_module.warm_shared_state()
+        app_module.init_model_warmup()
+        self.app = app_module.app
+        self._local = threading.local()
+
+    def _client(self):
+        c = getattr(self._local, "client", None)
+        if c is None:
+            c = self._local.client = self.app.test_client()
+        return c
+
+    def post_json(self, path: str, obj: Dict[str, Any]) -> Tuple[int, Any]:
+        r = self._client().post(path, json=obj)
+        return r.status_code, r.get_json(silent=True)
+
+    def get(self, path: str) -> Tuple[int, int]:
+        r = self._client().get(path)
+        return r.status_code, len(r.get_data())
+
+    def metrics_text(self) -> str:
+        return self._client().get("/metrics").get_data(as_text=True)
+
+
+class HTTPTarget:
+    name = "http"
+
+    def __init__(self, base_url: str, timeout: float):
+        import requests
+
+        self.base = base_url.rstrip("/")
+        self.timeout = timeout
+        self._requests = requests
+        self._local = threading.local()
+
+    def _session(self):
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = self._local.session = self._requests.Session()
+        return s
+
+    def post_json(self, path: str, obj: Dict[str, Any]) -> Tuple[int, Any]:
+        r = self._session().post(self.base + path, json=obj, timeout=self.timeout)
+        try:
+            return r.status_code, r.json()
+        except ValueError:
+            return r.status_code, None
+
+    def get(self, path: str) -> Tuple[int, int]:
+        r = self._session().get(self.base + path, timeout=self.timeout)
+        return r.status_code, len(r.content)
+
+    def metrics_text(self) -> str:
+        return self._session().get(self.base + "/metrics", timeout=self.timeout).text
+
+
+# =========================
+# /metrics 解析（只取需要的幾個）
+# =========================
+_RE_SAMPLE = re.compile(r"^([a-zA-Z_:][\w:]*)(\{[^}]*\})?\s+(\S+)$")
+_RE_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_metrics(text: str) -> Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]:
+    out: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+    for line in (text or "").splitlines():
+        if not line or line.startswith("#"):
+            continue
+        m = _RE_SAMPLE.match(line)
+        if not m:
+            continue
+        labels = tuple(sorted(_RE_LABEL.findall(m.group(2) or "")))
+        try:
+            out[(m.group(1), labels)] = float(m.group(3))
+        except ValueError:
+            pass
+    return out
+
+
+def rss_from_metrics(samples) -> Optional[float]:
+    return samples.get(("process_resident_memory_bytes", ()))
+
+
+def stage_breakdown(before, after) -> Dict[str, Dict[str, Any]]:
+    """app_stage_duration_seconds 前後相減 → 每個階段的次數 / 平均 / 由 bucket 估的 p50、p99"""
+    name = "app_stage_duration_seconds"
+    stages: Dict[str, Dict[str, Any]] = {}
+    for (metric, labels), v in after.items():
+        if not metric.startswith(name):
+            continue
+        d = dict(labels)
+        stage = d.get("stage")
+        if stage is None:
+            continue
+        delta = v - before.get((metric, labels), 0.0)
+        st = stages.setdefault(stage, {"buckets": [], "sum": 0.0, "count": 0.0})
+        if metric == name + "_bucket":
+            le = d["le"]
+            st["buckets"].append((float("inf") if le == "+Inf" else float(le), delta))
+        elif metric == name + "_sum":
+            st["sum"] = delta
+        elif metric == name + "_count":
+            st["count"] = delta
+
+    report: Dict[str, Dict[str, Any]] = {}
+    for stage, st in stages.items():
+        n = st["count"]
+        if n <= 0:
+            continue
+        buckets = sorted(st["buckets"])
+
+        def q(p: float) -> Optional[float]:
+            # 累積 bucket 找到第一個 >= p·n 的上界（Prometheus histogram_quantile 的粗略版）
+            for le, c in buckets:
+                if c >= p * n:
+                    return None if le == float("inf") else le * 1000
+            return None
+
+        report[stage] = {
+            "count": int(n),
+            "mean_ms": round(st["sum"] / n * 1000, 2),
+            "p50_ms_le": q(0.5),
+            "p99_ms_le": q(0.99),
+        }
+    return report
+
+
+# =========================
+# 壓測本體
+# =========================
+def _pct(sorted_vals: List[float], p: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    i = min(len(sorted_vals) - 1, max(0, int(round(p * (len(sorted_vals) - 1)))))
+    return round(sorted_vals[i] * 1000, 1)
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lat: Dict[str, List[float]] = {"submit": [], "result": [], "total": []}
+        self.errors: Dict[str, int] = {}
+        self.done = 0
+        self.degraded = 0
+        self.by_quiz: Dict[str, int] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self.lock:
+            self.lat[stage].append(seconds)
+
+    def error(self, kind: str) -> None:
+        with self.lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def finish(self, quiz_id: str, degraded: bool = False) -> None:
+        with self.lock:
+            self.done += 1
+            if degraded:
+                self.degraded += 1
+            self.by_quiz[quiz_id] = self.by_quiz.get(quiz_id, 0) + 1
+
+
+def one_flow(target, payload: Dict[str, Any], scheduled: float, rec: Recorder) -> None:
+    try:
+        # 從排定時間起算：執行緒池滿了在排隊的時間也算進 submit 延遲（不然過載時 p99 看起來還很好）
+        code, body = target.post_json("/submit", payload)
+        t1 = time.perf_counter()
+        rec.add("submit", t1 - scheduled)
+        if code != 200 or not isinstance(body, dict) or body.get("status") != "success":
+            rec.error(f"submit_{code}")
+            return
+        code, _ = target.get(f"/result/{body['user_id']}")
+        t2 = time.perf_counter()
+        rec.add("result", t2 - t1)
+        if code != 200:
+            rec.error(f"result_{code}")
+            return
+        rec.add("total", t2 - scheduled)
+        rec.finish(payload["quiz_id"], bool(body.get("degraded")))
+    except Exception as e:
+        rec.error(type(e).__name__)
+
+
+def run_step(target, factory: PayloadFactory, rate: float, duration: float, concurrency: int,
+             insurance_share: float, poisson: bool, rng: random.Random, rss_sampler) -> Dict[str, Any]:
+    rec = Recorder()
+    rss: List[float] = []
+    before = parse_metrics(target.metrics_text())
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load")
+
+    start = time.perf_counter()
+    next_at = start
+    sent = 0
+    next_rss = start
+    while True:
+        now = time.perf_counter()
+        if now - start >= duration:
+            break
+        if now >= next_rss:
+            v = rss_sampler()
+            if v is not None:
+                rss.append(v)
+            next_rss = now + 1.0
+        if now < next_at:
+            time.sleep(min(next_at - now, 0.05))
+            continue
+        quiz = "insurance" if rng.random() < insurance_share else "values"
+        pool.submit(one_flow, target, factory.make(quiz), next_at, rec)
+        sent += 1
+        gap = rng.expovariate(rate) if poisson else 1.0 / rate
+        next_at += gap
+
+    pool.shutdown(wait=True)
+    elapsed = time.perf_counter() - start
+    after = parse_metrics(target.metrics_text())
+    v = rss_sampler()
+    if v is not None:
+        rss.append(v)
+
+    lat = {k: sorted(v) for k, v in rec.lat.items()}
+    errors = sum(rec.errors.values())
+    return {
+        "target_rps": rate,
+        "sent": sent,
+        "completed": rec.done,
+        "by_quiz": rec.by_quiz,
+        "elapsed_s": round(elapsed, 2),
+        "achieved_rps": round(rec.done / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(errors / sent, 4) if sent else 0.0,
+        "errors": rec.errors,
+        "degraded": rec.degraded,
+        "degraded_rate": round(rec.degraded / rec.done, 4) if rec.done else 0.0,
+        "latency_ms": {
+            stage: {"p50": _pct(v, 0.5), "p90": _pct(v, 0.9), "p99": _pct(v, 0.99), "max": _pct(v, 1.0)}
+            for stage, v in lat.items()
+        },
+        "server_stages": stage_breakdown(before, after),
+        "memory_mb": {
+            "start": round(rss[0] / 2 ** 20, 1) if rss else None,
+            "end": round(rss[-1] / 2 ** 20, 1) if rss else None,
+            "peak": round(max(rss) / 2 ** 20, 1) if rss else None,
+            "growth": round((rss[-1] - rss[0]) / 2 ** 20, 1) if len(rss) > 1 else None,
+        },
+    }
+
+
+def print_step(r: Dict[str, Any]) -> None:
+    print(f"\n=== 目標 {r['target_rps']} rps：送出 {r['sent']}、完成 {r['completed']} {r['by_quiz']}，"
+          f"實際 {r['achieved_rps']} rps，錯誤率 {r['error_rate']:.2%} {r['errors'] or ''}，"
+          f"降級率 {r['degraded_rate']:.2%}（規則版 {r['degraded']} 份）")
+    for stage, v in r["latency_ms"].items():
+        print(f"  client {stage:8s} p50={v['p50']}ms p90={v['p90']}ms p99={v['p99']}ms max={v['max']}ms")
+    for stage, v in sorted(r["server_stages"].items(), key=lambda kv: -kv[1]["mean_ms"]):
+        print(f"  server {stage:18s} n={v['count']:<6d} mean={v['mean_ms']}ms p50≤{v['p50_ms_le']}ms p99≤{v['p99_ms_le']}ms")
+    m = r["memory_mb"]
+    print(f"  RSS start={m['start']}MB end={m['end']}MB peak={m['peak']}MB growth={m['growth']}MB")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="端到端壓測 /submit → /result")
+    ap.add_argument("--url", default="", help="打已啟動的伺服器；不給就同進程驅動 Flask app")
+    ap.add_argument("--rate", default="2", help="每秒送出幾份問卷；逗號分隔 = 逐段加壓（例：5,10,20）")
+    ap.add_argument("--duration", type=float, default=20, help="每段秒數")
+    ap.add_argument("--concurrency", type=int, default=64, help="同時進行中的請求上限")
+    ap.add_argument("--insurance-share", type=float, default=0.5, help="保單問卷比例（其餘為價值觀）")
+    ap.add_argument("--poisson", action="store_true", help="到達間隔用指數分佈（預設固定間隔）")
+    ap.add_argument("--llm-latency", type=latency_arg, default="lognormal:800,0.5", help="同進程模式假模型的 prefill 延遲（FAKE_LLM_LATENCY 格式）")
+    ap.add_argument("--llm-token-rate", default="40", help="同進程模式假模型每秒 token 數")
+    ap.add_argument("--timeout", type=float, default=120)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--json", default="", help="結果另存成 JSON")
+    ap.add_argument("--max-error-rate", type=float, default=0.01, help="吞吐量上限判定：錯誤率上限")
+    ap.add_argument("--max-degraded-rate", type=float, default=0.01, help="吞吐量上限判定：降級（規則版報告）比例上限")
+    args = ap.parse_args()
+
+    if args.url:
+        target = HTTPTarget(args.url, args.timeout)
+        rss_sampler = lambda: rss_from_metrics(parse_metrics(target.metrics_text()))
+    else:
+        # 必須在 import app 之前設定：同進程假模型 + 不寫進正式 results.db
+        os.environ.setdefault("LLM_BACKEND", "fake")
+        os.environ.setdefault("FAKE_LLM_LATENCY", args.llm_latency)
+        os.environ.setdefault("FAKE_LLM_TOKEN_RATE", args.llm_token_rate)
+        os.environ.setdefault("FAKE_LLM_SEED", str(args.seed))
+        os.environ.setdefault("RESULT_STORE_DB", os.path.join(tempfile.mkdtemp(prefix="loadtest_"), "results.db"))
+        target = InProcessTarget()
+        from metrics import resident_memory_bytes
+
+        rss_sampler = resident_memory_bytes
+
+    factory = PayloadFactory(load_questions(), seed=args.seed)
+    rng = random.Random(args.seed)
+    rates = [float(x) for x in args.rate.split(",") if x.strip()]
+
+    print(f"[壓測] target={target.name} rates={rates} duration={args.duration}s concurrency={args.concurrency}")
+    steps = []
+    for rate in rates:
+        r = run_step(target, factory, rate, args.duration, args.concurrency,
+                     args.insurance_share, args.poisson, rng, rss_sampler)
+        print_step(r)
+        steps.append(r)
+
+    # 吞吐量上限：實際完成 ≥ 95% 目標、錯誤率與降級率都在門檻內的最高一段
+    ok = [
+        s for s in steps
+        if s["achieved_rps"] >= 0.95 * s["target_rps"]
+        and s["error_rate"] <= args.max_error_rate
+        and s["degraded_rate"] <= args.max_degraded_rate
+    ]
+    ceiling = max((s["achieved_rps"] for s in ok), default=None)
+    saturated = len(ok) < len(steps)
+    print(f"\n[結果] 可持續吞吐量 ≈ {ceiling} rps" + ("（更高的目標已跟不上）" if saturated else "（尚未達上限，可再加壓）"))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"target": target.name, "args": vars(args), "steps": steps,
+                       "sustainable_rps": ceiling, "saturated": saturated}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
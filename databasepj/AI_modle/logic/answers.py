@@ -0,0 +1,244 @@
+# AI_modle/logic/answers.py
+# 功能：問卷答案的「唯一」正規化階段（兩份問卷共用）
+#   /submit 進來時做一次：原始 answers（dict / str / list 各種格式）→ NormalizedAnswers
+#   之後規則計分（logic.scoring）、價值觀量化（logic.value_metrics）、報告 profile（app）都只讀這個結構，
+#   不再各自重新解析字串；選項文字的解析結果（0~100 分 / 1~5 分）依字串快取。
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# A-E 分數
+CHOICE_SCORE = {"A": 20, "B": 40, "C": 60, "D": 80, "E": 100}
+
+# 1-5 分數（Likert）
+LIKERT_SCORE = {"1": 20, "2": 40, "3": 60, "4": 80, "5": 100}
+
+CN_LIKERT = [
+    ("非常不同意", 20),
+    ("不同意", 40),
+    ("普通", 60),
+    ("一般", 60),
+    ("中立", 60),
+    ("同意", 80),
+    ("非常同意", 100),
+]
+
+CN_LEVEL = [
+    ("低", 30),
+    ("中", 60),
+    ("高", 90),
+]
+
+
+# =========================
+# 選項文字解析（依字串快取）
+# =========================
+class OptionInfo:
+    """
+    一個選項字串的解析結果
+      text    : 去頭尾空白後的文字
+      score100: 0~100 分（0 = 無法判讀）
+      likert  : 1~5 分（None = 無法判讀）
+    """
+
+    __slots__ = ("text", "score100", "likert")
+
+    def __init__(self, text: str, score100: int, likert: Optional[int]):
+        self.text = text
+        self.score100 = score100
+        self.likert = likert
+
+    def __repr__(self) -> str:
+        return f"OptionInfo({self.text!r}, score100={self.score100}, likert={self.likert})"
+
+
+def _score_100(s: str) -> int:
+    """
+    盡可能從答案中抓到 0~100 分：
+    支援：
+      - "A. ..." / "B" / "E..."
+      - "1"~"5" / "3. ..." / "5 分"
+      - 中文：非常不同意/不同意/普通/同意/非常同意
+      - 中文：低/中/高
+    """
+    if not s:
+        return 0
+
+    u = s.upper()
+
+    # 1) 先抓 A-E（允許前面有括號、空白）
+    for ch in ["A", "B", "C", "D", "E"]:
+        if u.startswith(ch) or u.startswith(f"{ch}.") or u.startswith(f"{ch}、") or u.startswith(f"({ch}") or u.startswith(f"【{ch}"):
+            return CHOICE_SCORE[ch]
+
+    # 也可能在中間出現「選 A」這種
+    for ch in ["A", "B", "C", "D", "E"]:
+        if f"選{ch}" in u or f"選項{ch}" in u:
+            return CHOICE_SCORE[ch]
+
+    # 2) 再抓 1-5（Likert）
+    # 常見： "3" / "3. ..." / "3分" / "5 分"
+    first = s[0]
+    if first in LIKERT_SCORE:
+        return LIKERT_SCORE[first]
+    for d in ["1", "2", "3", "4", "5"]:
+        if s.strip() == d or s.strip().startswith(d + ".") or (d + "分") in s or (d + " 分") in s:
+            return LIKERT_SCORE[d]
+
+    # 3) 中文 Likert（注意順序：非常不同意要先於不同意）
+    for key, score in CN_LIKERT:
+        if key in s:
+            return score
+
+    # 4) 低中高
+    for key, score in CN_LEVEL:
+        if key == s or key in s:
+            return score
+
+    return 0
+
+
+def _likert_1_5(s: str) -> Optional[int]:
+    """數字 1~5（小數四捨五入，例如滑桿的 3.6），或 "A." / "A" / "B ..." / "C、" → 1~5"""
+    if not s:
+        return None
+    try:
+        x = int(round(float(s)))
+    except (ValueError, OverflowError):
+        pass
+    else:
+        return x if 1 <= x <= 5 else None
+    up = s.upper()
+    if up[0] in ("A", "B", "C", "D", "E"):
+        return "ABCDE".index(up[0]) + 1
+    return None
+
+
+@lru_cache(maxsize=4096)
+def parse_option(text: str) -> OptionInfo:
+    s = (text or "").strip()
+    likert = _likert_1_5(s)
+    # 純數字（含小數）直接依 1~5 分換算，不看第一個字元（"2.6" 是 3 分不是 2 分）
+    if likert is not None and s[0].isdigit():
+        return OptionInfo(s, LIKERT_SCORE[str(likert)], likert)
+    return OptionInfo(s, _score_100(s), likert)
+
+
+def _with_score(option: OptionInfo, score: OptionInfo) -> OptionInfo:
+    """{"choice": "C. ...", "score": 4}：文字照 choice（規則計分比對用），分數以明確給的 score 為準"""
+    if score.likert is None and not score.score100:
+        return option
+    return OptionInfo(option.text or score.text, score.score100 or option.score100, score.likert)
+
+
+EMPTY_OPTION = parse_option("")
+
+
+# =========================
+# 正規化後的答案
+# =========================
+class QuizAnswer:
+    """
+    單一題目的答案
+      choice    : 單選（OptionInfo；沒作答為 EMPTY_OPTION）
+      multi     : 多選（OptionInfo tuple，保留作答順序）
+      free_text : 自由填寫文字
+    """
+
+    __slots__ = ("choice", "multi", "free_text")
+
+    def __init__(self, choice: OptionInfo, multi: Tuple[OptionInfo, ...], free_text: str):
+        self.choice = choice
+        self.multi = multi
+        self.free_text = free_text
+
+    @property
+    def answered(self) -> bool:
+        return bool(self.choice.text or self.multi or self.free_text)
+
+    def __repr__(self) -> str:
+        return f"QuizAnswer(choice={self.choice.text!r}, multi={len(self.multi)}, free_text={self.free_text!r})"
+
+
+EMPTY_ANSWER = QuizAnswer(EMPTY_OPTION, (), "")
+
+
+class NormalizedAnswers:
+    """題號一律為 Q1、Q2…；查不到的題目回傳 EMPTY_ANSWER"""
+
+    __slots__ = ("items",)
+
+    def __init__(self, items: Dict[str, QuizAnswer]):
+        self.items = items
+
+    def get(self, qid: str) -> QuizAnswer:
+        return self.items.get(qid, EMPTY_ANSWER)
+
+    def __contains__(self, qid: str) -> bool:
+        return qid in self.items
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+def canonical_qid(key: Any) -> Optional[str]:
+    """
+    支援 Q1 / q1 / question1 / question_1 / "1" 這種 key，統一轉成 Q1~Qn；認不得回 None
+    """
+    u = str(key).strip().upper()
+    if not u:
+        return None
+    if u.startswith("Q") and u[1:].isdigit():
+        return "Q" + u[1:]
+    if "QUESTION" in u:
+        digits = "".join(c for c in u if c.isdigit())
+        if digits:
+            return "Q" + digits
+    if u.isdigit():
+        return "Q" + u
+    return None
+
+
+def _scalar_text(v: Any) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, bool):
+        return str(v)
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return str(v).strip()
+
+
+def _normalize_one(raw: Any) -> QuizAnswer:
+    if isinstance(raw, dict):
+        # 常見前端：{choice:"A. ...", multi:[...], free_text:"..."}；也接受 {value:...} / {answer:...} / {text:...}
+        # 量表題也可能直接給 {score: 4} / {val: 4}：分數優先於選項文字
+        choice = raw.get("choice") or raw.get("value") or raw.get("answer") or raw.get("text") or ""
+        score = raw.get("score") if raw.get("score") is not None else raw.get("val")
+        multi = raw.get("multi") or []
+        free_text = raw.get("free_text") or ""
+    elif isinstance(raw, (list, tuple)):
+        choice, score, multi, free_text = "", None, raw, ""
+    else:
+        choice, score, multi, free_text = raw, None, [], ""
+
+    option = parse_option(_scalar_text(choice))
+    if score is not None:
+        option = _with_score(option, parse_option(_scalar_text(score)))
+    opts = tuple(parse_option(t) for t in (_scalar_text(x) for x in multi) if t)
+    return QuizAnswer(option, opts, _scalar_text(free_text))
+
+
+def normalize_answers(answers: Any) -> NormalizedAnswers:
+    """原始 answers → NormalizedAnswers；已正規化過的直接回傳"""
+    if isinstance(answers, NormalizedAnswers):
+        return answers
+    items: Dict[str, QuizAnswer] = {}
+    if isinstance(answers, dict):
+        for k, v in answers.items():
+            qid = canonical_qid(k)
+            if qid is not None:
+                items[qid] = _normalize_one(v)
+    return NormalizedAnswers(items)
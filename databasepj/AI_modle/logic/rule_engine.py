@@ -0,0 +1,160 @@
+# AI_modle/logic/rule_engine.py
+# 功能：把「關鍵字 → 加分」的問卷規則表編譯成 Aho-Corasick 多樣式比對器
+#   - 每題的所有關鍵字建成一個自動機，答案字串只掃一遍就知道命中哪些規則
+#   - 同一題內：exclusive 群組 = 原本的 if / elif（只取第一條命中），其他規則各自獨立觸發
+#   - 選項文字是固定題庫，掃描結果以 (題號, 文字) 快取，批次評分時幾乎不用重掃
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+class AhoCorasick:
+    """純 Python 的 Aho-Corasick；find_all 回傳命中的 pattern 編號集合"""
+
+    __slots__ = ("_goto", "_fail", "_out")
+
+    def __init__(self, patterns: Sequence[str]):
+        goto: List[Dict[str, int]] = [{}]
+        out: List[set] = [set()]
+        for idx, pat in enumerate(patterns):
+            if not pat:
+                continue
+            node = 0
+            for ch in pat:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    out.append(set())
+                node = nxt
+            out[node].add(idx)
+
+        # BFS 建 fail link，並把 fail 節點的輸出併進來
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                cand = goto[f].get(ch, 0)
+                fail[nxt] = cand if cand != nxt else 0
+                out[nxt] |= out[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = [frozenset(o) for o in out]
+
+    def find_all(self, text: str) -> set:
+        goto, fail, out = self._goto, self._fail, self._out
+        hits: set = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                hits |= out[node]
+        return hits
+
+
+class Rule:
+    """
+    一條規則（規則表的一列）
+      qid       : 題號（"Q5"）
+      patterns  : 任一關鍵字出現在答案中即命中
+      scores    : ((類別, 加分), ...)
+      reasons   : ((類別, 理由), ...)
+      channels  : ((通路, 加分), ...)
+      exclusive : 同題同群組只觸發第一條命中的規則（對應 if / elif）
+    """
+
+    __slots__ = ("qid", "patterns", "scores", "reasons", "channels", "exclusive")
+
+    def __init__(
+        self,
+        qid: str,
+        patterns: Sequence[str],
+        scores: Sequence[Tuple[str, int]] = (),
+        reasons: Sequence[Tuple[str, str]] = (),
+        channels: Sequence[Tuple[str, int]] = (),
+        exclusive: Optional[str] = None,
+    ):
+        self.qid = qid
+        self.patterns = tuple(patterns)
+        self.scores = tuple(scores)
+        self.reasons = tuple(reasons)
+        self.channels = tuple(channels)
+        self.exclusive = exclusive
+
+
+class _QuestionMatcher:
+    __slots__ = ("rules", "automaton", "pattern_rule", "_cache")
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        patterns: List[str] = []
+        self.pattern_rule: List[int] = []
+        for ri, rule in enumerate(rules):
+            for p in rule.patterns:
+                patterns.append(p)
+                self.pattern_rule.append(ri)
+        self.automaton = AhoCorasick(patterns)
+        self._cache: Dict[str, Tuple[Rule, ...]] = {}
+
+    def fired(self, text: str, cache_limit: int) -> Tuple[Rule, ...]:
+        """回傳這段答案會觸發的規則（依規則表順序，已套用 exclusive）"""
+        hit = self._cache.get(text)
+        if hit is not None:
+            return hit
+        matched = {self.pattern_rule[p] for p in self.automaton.find_all(text)}
+        fired: List[Rule] = []
+        used_groups = set()
+        for ri in sorted(matched):
+            rule = self.rules[ri]
+            if rule.exclusive is not None:
+                if rule.exclusive in used_groups:
+                    continue
+                used_groups.add(rule.exclusive)
+            fired.append(rule)
+        result = tuple(fired)
+        if len(self._cache) < cache_limit:
+            self._cache[text] = result
+        return result
+
+
+class CompiledRuleSet:
+    """
+    規則表編譯一次後重複使用。
+    evaluate() 依 question_order 的順序處理題目，理由的先後順序與手寫 if 版本一致。
+    """
+
+    def __init__(self, rules: Iterable[Rule], question_order: Sequence[str], cache_limit: int = 4096):
+        by_q: Dict[str, List[Rule]] = {}
+        for r in rules:
+            by_q.setdefault(r.qid, []).append(r)
+        self.question_order = [q for q in question_order if q in by_q]
+        self.matchers = {q: _QuestionMatcher(by_q[q]) for q in self.question_order}
+        self.cache_limit = cache_limit
+
+    def evaluate(
+        self,
+        texts_by_question: Dict[str, List[str]],
+        scores: Dict[str, Any],
+        reasons: Dict[str, List[str]],
+        channels: Dict[str, Any],
+    ) -> None:
+        """texts_by_question：每題的答案字串（單選 1 個、多選多個）；結果直接累加進傳入的 dict"""
+        for q in self.question_order:
+            matcher = self.matchers[q]
+            for text in texts_by_question.get(q) or ():
+                for rule in matcher.fired(text, self.cache_limit):
+                    for cat, w in rule.scores:
+                        scores[cat] += w
+                    for cat, msg in rule.reasons:
+                        reasons[cat].append(msg)
+                    for ch, w in rule.channels:
+                        channels[ch] += w
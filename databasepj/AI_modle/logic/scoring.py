@@ -2,7 +2,10 @@
 # 保單推薦：規則計分（平滑版）
 # 特色：不做硬篩選，只產生 category/channel 的偏好與 top3
 
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, Iterable, List, Union
+
+from logic.answers import NormalizedAnswers, normalize_answers
+from logic.rule_engine import CompiledRuleSet, Rule
 
 CATEGORY_NAMES = {
     "health_medical": "健康醫療",
@@ -17,135 +20,82 @@ CATEGORY_NAMES = {
     "health_management": "健康管理",
 }
 
-def _get_choice_text(answers: Dict[str, Any], qid: str) -> str:
-    v = answers.get(qid)
-    if isinstance(v, dict):
-        return str(v.get("choice") or "").strip()
-    if isinstance(v, str):
-        return v.strip()
-    return ""
-
-def _get_multi_list(answers: Dict[str, Any], qid: str) -> List[str]:
-    v = answers.get(qid)
-    if isinstance(v, dict):
-        arr = v.get("multi") or []
-        return [str(x).strip() for x in arr if str(x).strip()]
-    if isinstance(v, list):
-        return [str(x).strip() for x in v if str(x).strip()]
-    return []
-
-def _contains(s: str, *keys: str) -> bool:
-    ss = (s or "")
-    return any(k in ss for k in keys)
-
-def compute_insurance_scoring(answers: Dict[str, Any]) -> Dict[str, Any]:
-    # 初始化
-    scores = {k: 0 for k in CATEGORY_NAMES.keys()}
-    channels = {"online": 0, "bank": 0, "agent": 0}
-    reasons: Dict[str, List[str]] = {k: [] for k in CATEGORY_NAMES.keys()}
 
+# =========================
+# 規則表（smooth_v1）：題號、關鍵字 → 類別加分 / 理由 / 通路加分
+# 表格順序 = 原本 if 的順序（影響理由先後與 elif 的優先權）
+# =========================
+SINGLE_QUESTIONS = ("Q1", "Q4", "Q6", "Q7", "Q8")
+MULTI_QUESTIONS = ("Q5", "Q9")
+QUESTION_ORDER = ("Q1", "Q4", "Q5", "Q6", "Q7", "Q8", "Q9")
+
+INSURANCE_RULES: List[Rule] = [
     # ===== Q1 投保對象（影響：團體保險）=====
-    q1 = _get_choice_text(answers, "Q1")
-    if _contains(q1, "公司", "員工", "一群人") or _contains(q1, "E."):
-        scores["group"] += 4
-        reasons["group"].append("投保對象偏團體")
-        channels["agent"] += 1  # 多半需要業務/團體方案
+    Rule("Q1", ["公司", "員工", "一群人", "E."],
+         scores=[("group", 4)], reasons=[("group", "投保對象偏團體")],
+         channels=[("agent", 1)]),  # 多半需要業務/團體方案
 
     # ===== Q4 家庭狀況（影響：壽險/長照）=====
-    q4 = _get_choice_text(answers, "Q4")
-    if _contains(q4, "已婚", "小孩"):
-        scores["life_protection"] += 1
-        reasons["life_protection"].append("家庭責任較高")
-    if _contains(q4, "照顧", "長輩"):
-        scores["long_term_care"] += 2
-        reasons["long_term_care"].append("有長照情境")
-
-    # ===== Q5 擔心事項（核心，多選）=====
-    q5 = _get_multi_list(answers, "Q5")
-    for opt in q5:
-        if _contains(opt, "生病", "住院", "手術"):
-            scores["health_medical"] += 2
-            reasons["health_medical"].append("在意住院/手術支出")
-            scores["cancer_medical"] += 1
-        if _contains(opt, "癌症", "重大疾病"):
-            scores["cancer_medical"] += 2
-            reasons["cancer_medical"].append("擔心癌症/重疾")
-            scores["health_medical"] += 1
-        if _contains(opt, "失能", "長期照顧"):
-            scores["long_term_care"] += 3
-            reasons["long_term_care"].append("擔心失能/照護")
-        if _contains(opt, "身故", "家人生活"):
-            scores["life_protection"] += 3
-            reasons["life_protection"].append("重視家庭保障")
-        if _contains(opt, "車禍", "骨折", "意外"):
-            scores["accident"] += 3
-            reasons["accident"].append("意外風險較高")
-        if _contains(opt, "退休", "教育", "穩穩存", "穩穩領"):
-            scores["savings_annuity"] += 3
-            reasons["savings_annuity"].append("偏好穩健儲蓄/年金")
-        if _contains(opt, "投資", "漲跌", "報酬"):
-            scores["investment"] += 3
-            reasons["investment"].append("可接受投資波動")
-            channels["bank"] += 1
-        if _contains(opt, "健康檢查", "健康管理", "線上"):
-            scores["health_management"] += 3
-            reasons["health_management"].append("想要健康管理/服務")
-        if _contains(opt, "老闆", "管理者", "員工"):
-            scores["group"] += 3
-            reasons["group"].append("有員工保障需求")
+    Rule("Q4", ["已婚", "小孩"], scores=[("life_protection", 1)], reasons=[("life_protection", "家庭責任較高")]),
+    Rule("Q4", ["照顧", "長輩"], scores=[("long_term_care", 2)], reasons=[("long_term_care", "有長照情境")]),
+
+    # ===== Q5 擔心事項（核心，多選；每個選項各自比對）=====
+    Rule("Q5", ["生病", "住院", "手術"],
+         scores=[("health_medical", 2), ("cancer_medical", 1)], reasons=[("health_medical", "在意住院/手術支出")]),
+    Rule("Q5", ["癌症", "重大疾病"],
+         scores=[("cancer_medical", 2), ("health_medical", 1)], reasons=[("cancer_medical", "擔心癌症/重疾")]),
+    Rule("Q5", ["失能", "長期照顧"], scores=[("long_term_care", 3)], reasons=[("long_term_care", "擔心失能/照護")]),
+    Rule("Q5", ["身故", "家人生活"], scores=[("life_protection", 3)], reasons=[("life_protection", "重視家庭保障")]),
+    Rule("Q5", ["車禍", "骨折", "意外"], scores=[("accident", 3)], reasons=[("accident", "意外風險較高")]),
+    Rule("Q5", ["退休", "教育", "穩穩存", "穩穩領"],
+         scores=[("savings_annuity", 3)], reasons=[("savings_annuity", "偏好穩健儲蓄/年金")]),
+    Rule("Q5", ["投資", "漲跌", "報酬"],
+         scores=[("investment", 3)], reasons=[("investment", "可接受投資波動")], channels=[("bank", 1)]),
+    Rule("Q5", ["健康檢查", "健康管理", "線上"],
+         scores=[("health_management", 3)], reasons=[("health_management", "想要健康管理/服務")]),
+    Rule("Q5", ["老闆", "管理者", "員工"], scores=[("group", 3)], reasons=[("group", "有員工保障需求")]),
 
     # ===== Q6 保障時間（不做硬切，只加權）=====
-    q6 = _get_choice_text(answers, "Q6")
-    if _contains(q6, "短期", "1–3", "1-3"):
-        scores["travel"] += 1
-        scores["accident"] += 1
-        reasons["travel"].append("短期需求可能有旅行/活動")
-    elif _contains(q6, "10–20", "10-20", "中長期"):
-        scores["life_protection"] += 1
-        scores["savings_annuity"] += 1
-    elif _contains(q6, "到老", "終身"):
-        scores["long_term_care"] += 1
-        scores["life_protection"] += 1
+    Rule("Q6", ["短期", "1–3", "1-3"],
+         scores=[("travel", 1), ("accident", 1)], reasons=[("travel", "短期需求可能有旅行/活動")], exclusive="q6"),
+    Rule("Q6", ["10–20", "10-20", "中長期"],
+         scores=[("life_protection", 1), ("savings_annuity", 1)], exclusive="q6"),
+    Rule("Q6", ["到老", "終身"], scores=[("long_term_care", 1), ("life_protection", 1)], exclusive="q6"),
 
     # ===== Q7 風險承受度（影響：投資 vs 年金）=====
-    q7 = _get_choice_text(answers, "Q7")
-    if _contains(q7, "保守"):
-        scores["savings_annuity"] += 2
-        channels["bank"] += 1
-    elif _contains(q7, "有漲有跌", "不要太刺激"):
-        scores["investment"] += 1
-        channels["bank"] += 1
-    elif _contains(q7, "大波動", "成長"):
-        scores["investment"] += 2
+    Rule("Q7", ["保守"], scores=[("savings_annuity", 2)], channels=[("bank", 1)], exclusive="q7"),
+    Rule("Q7", ["有漲有跌", "不要太刺激"], scores=[("investment", 1)], channels=[("bank", 1)], exclusive="q7"),
+    Rule("Q7", ["大波動", "成長"], scores=[("investment", 2)], exclusive="q7"),
 
     # ===== Q8 通路偏好（只加分，不硬篩）=====
-    q8 = _get_choice_text(answers, "Q8")
-    if _contains(q8, "線上", "手機", "電腦") or _contains(q8, "A."):
-        channels["online"] += 3
-    elif _contains(q8, "銀行") or _contains(q8, "B."):
-        channels["bank"] += 3
-    elif _contains(q8, "業務", "面談") or _contains(q8, "C."):
-        channels["agent"] += 2
+    Rule("Q8", ["線上", "手機", "電腦", "A."], channels=[("online", 3)], exclusive="q8"),
+    Rule("Q8", ["銀行", "B."], channels=[("bank", 3)], exclusive="q8"),
+    Rule("Q8", ["業務", "面談", "C."], channels=[("agent", 2)], exclusive="q8"),
 
     # ===== Q9 特殊情境（多選）=====
-    q9 = _get_multi_list(answers, "Q9")
-    for opt in q9:
-        if _contains(opt, "海外", "旅遊", "出差"):
-            scores["travel"] += 2
-            reasons["travel"].append("有旅行/出差情境")
-        if _contains(opt, "登山", "潛水", "環島", "活動"):
-            scores["travel"] += 1
-            scores["accident"] += 1
-        if _contains(opt, "團體保險", "員工"):
-            scores["group"] += 2
-            reasons["group"].append("公司團保情境")
-
-    # ===== 平滑：避免只靠單題決生死（小幅度補底）=====
-    # 若使用者有選任何核心多選題（Q5/Q9），幫所有類別微量補底，避免極端偏科造成候選太窄
-    if len(q5) > 0 or len(q9) > 0:
-        for k in scores.keys():
-            scores[k] += 0  # 保留結構，若你未來想加 0.5 可改 float
+    Rule("Q9", ["海外", "旅遊", "出差"], scores=[("travel", 2)], reasons=[("travel", "有旅行/出差情境")]),
+    Rule("Q9", ["登山", "潛水", "環島", "活動"], scores=[("travel", 1), ("accident", 1)]),
+    Rule("Q9", ["團體保險", "員工"], scores=[("group", 2)], reasons=[("group", "公司團保情境")]),
+]
+
+# 模組載入時編譯一次
+_RULESET = CompiledRuleSet(INSURANCE_RULES, QUESTION_ORDER)
+
+
+def _answer_texts(answers: NormalizedAnswers) -> Dict[str, List[str]]:
+    texts: Dict[str, List[str]] = {}
+    for q in SINGLE_QUESTIONS:
+        t = answers.get(q).choice.text
+        if t:
+            texts[q] = [t]
+    for q in MULTI_QUESTIONS:
+        opts = answers.get(q).multi
+        if opts:
+            texts[q] = [o.text for o in opts]
+    return texts
+
 
+def _build_result(scores: Dict[str, int], reasons: Dict[str, List[str]], channels: Dict[str, int]) -> Dict[str, Any]:
     # ===== 產出 top3（分數>0 優先；全 0 給預設）=====
     sorted_items = sorted(scores.items(), key=lambda x: x[1], reverse=True)
     top = [it for it in sorted_items if it[1] > 0][:3]
@@ -173,3 +123,24 @@ def compute_insurance_scoring(answers: Dict[str, Any]) -> Dict[str, Any]:
             "version": "smooth_v1",
         }
     }
+
+
+def compute_insurance_scoring(answers: Union[Dict[str, Any], NormalizedAnswers]) -> Dict[str, Any]:
+    """answers 可以是原始 dict，或 /submit 已正規化過的 NormalizedAnswers"""
+    # 初始化
+    scores = {k: 0 for k in CATEGORY_NAMES.keys()}
+    channels = {"online": 0, "bank": 0, "agent": 0}
+    reasons: Dict[str, List[str]] = {k: [] for k in CATEGORY_NAMES.keys()}
+
+    # 規則表一次掃完 Q1–Q9（平滑版：不做硬篩選，只加權）
+    _RULESET.evaluate(_answer_texts(normalize_answers(answers)), scores, reasons, channels)
+
+    return _build_result(scores, reasons, channels)
+
+
+def compute_insurance_scoring_batch(answer_sets: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    離線分析用：一次評分大量答案組合（例如模擬分佈、回測規則調整）。
+    規則只編譯一次，相同選項文字的比對結果會重複使用。
+    """
+    return [compute_insurance_scoring(a) for a in answer_sets]
@@ -1,5 +1,7 @@
 # AI_modle/logic/value_metrics.py
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from logic.answers import NormalizedAnswers, normalize_answers
 
 DIM_LABELS = [
     "風險承受度",
@@ -16,124 +18,9 @@ Q_DIM_MAP = {
     "Q6": 5, "Q7": 0, "Q8": 1, "Q9": 2, "Q10": 3,
 }
 
-# A-E 分數
-CHOICE_SCORE = {"A": 20, "B": 40, "C": 60, "D": 80, "E": 100}
-
-# 1-5 分數（Likert）
-LIKERT_SCORE = {"1": 20, "2": 40, "3": 60, "4": 80, "5": 100}
-
-CN_LIKERT = [
-    ("非常不同意", 20),
-    ("不同意", 40),
-    ("普通", 60),
-    ("一般", 60),
-    ("中立", 60),
-    ("同意", 80),
-    ("非常同意", 100),
-]
-
-CN_LEVEL = [
-    ("低", 30),
-    ("中", 60),
-    ("高", 90),
-]
-
-def _pick_answer_value(raw: Any) -> str:
-    """把 answers[Qx] 可能是 dict/str 的情況統一成字串"""
-    if raw is None:
-        return ""
-    if isinstance(raw, dict):
-        # 常見前端：{choice:"A. ..."} 或 {value:"..."} 或 {answer:"..."}
-        raw = raw.get("choice") or raw.get("value") or raw.get("answer") or raw.get("text") or ""
-    return str(raw).strip()
-
-def _extract_score(v: Any) -> int:
-    """
-    盡可能從答案中抓到 0~100 分：
-    支援：
-      - "A. ..." / "B" / "E..."
-      - "1"~"5" / "3. ..." / "5 分"
-      - 中文：非常不同意/不同意/普通/同意/非常同意
-      - 中文：低/中/高
-    """
-    s = _pick_answer_value(v)
-    if not s:
-        return 0
-
-    u = s.upper()
-
-    # 1) 先抓 A-E（允許前面有括號、空白）
-    for ch in ["A", "B", "C", "D", "E"]:
-        if u.startswith(ch) or u.startswith(f"{ch}.") or u.startswith(f"{ch}、") or u.startswith(f"({ch}") or u.startswith(f"【{ch}"):
-            return CHOICE_SCORE[ch]
-
-    # 也可能在中間出現「選 A」這種
-    for ch in ["A", "B", "C", "D", "E"]:
-        if f"選{ch}" in u or f"選項{ch}" in u:
-            return CHOICE_SCORE[ch]
-
-    # 2) 再抓 1-5（Likert）
-    # 常見： "3" / "3. ..." / "3分" / "5 分"
-    first = s[0]
-    if first in LIKERT_SCORE:
-        return LIKERT_SCORE[first]
-    for d in ["1", "2", "3", "4", "5"]:
-        if s.strip() == d or s.strip().startswith(d + ".") or (d + "分") in s or (d + " 分") in s:
-            return LIKERT_SCORE[d]
-
-    # 3) 中文 Likert（注意順序：非常不同意要先於不同意）
-    for key, score in CN_LIKERT:
-        if key in s:
-            return score
-
-    # 4) 低中高
-    for key, score in CN_LEVEL:
-        if key == s or key in s:
-            return score
-
-    return 0
-
-def _normalize_keys(answers: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    支援 Q1 / q1 / question1 / question_1 這種 key
-    統一轉成 Q1~Q10
-    """
-    if not isinstance(answers, dict):
-        return {}
-
-    norm: Dict[str, Any] = {}
-
-    for k, v in answers.items():
-        ks = str(k).strip()
-        if not ks:
-            continue
-        u = ks.upper()
-
-        # 已經是 Qx
-        if u.startswith("Q") and u[1:].isdigit():
-            norm["Q" + u[1:]] = v
-            continue
-
-        # question / QUESTION_1 / question-1
-        if "QUESTION" in u:
-            digits = "".join([c for c in u if c.isdigit()])
-            if digits:
-                norm["Q" + digits] = v
-                continue
-
-        # 只有數字 key： "1"~"10"
-        if u.isdigit():
-            norm["Q" + u] = v
-            continue
-
-    # 若上面沒抓到，保底把原本的也放進去（避免全空）
-    if not norm:
-        norm = {str(k).upper(): v for k, v in answers.items()}
-
-    return norm
-
-def compute_value_metrics(answers: Dict[str, Any]) -> Dict[str, Any]:
-    a = _normalize_keys(answers or {})
+def compute_value_metrics(answers: Union[Dict[str, Any], NormalizedAnswers]) -> Dict[str, Any]:
+    """answers 可以是原始 dict，或 /submit 已正規化過的 NormalizedAnswers"""
+    a = normalize_answers(answers)
 
     q_labels: List[str] = []
     q_scores: List[int] = []
@@ -146,7 +33,7 @@ def compute_value_metrics(answers: Dict[str, Any]) -> Dict[str, Any]:
         qk = f"Q{i}"
         q_labels.append(qk)
 
-        score = _extract_score(a.get(qk))
+        score = a.get(qk).choice.score100
         if score > 0:
             answered += 1
         q_scores.append(score)
@@ -172,3 +59,188 @@ def compute_value_metrics(answers: Dict[str, Any]) -> Dict[str, Any]:
             "bar": {"labels": q_labels, "data": q_scores},
         }
     }
+
+
+# =========================
+# 人格類型（app._build_value_metrics 與批次 compute_value_metrics_batch 共用）
+#   三個關鍵維度各取兩題：1~5 分換成 10~90（likert_to_0_100）後平均，未作答的維度視為 50；
+#   依序比對，第一個符合的類型勝出
+# =========================
+PROFILE_TYPES = ["成長進取型", "穩健防禦型", "責任規劃型", "均衡務實型"]
+# 題號（1 起算）：風險承受度 = q3, q7；保障安全感需求 = q1, q5；長期規劃程度 = q6, q10
+PROFILE_DIM_QUESTIONS = ((3, 7), (1, 5), (6, 10))
+PROFILE_DIM_DEFAULT = 50
+
+
+def likert_to_0_100(x_1_5: Optional[int]) -> Optional[int]:
+    if x_1_5 is None:
+        return None
+    # 1->10, 5->90（留點邊界讓圖好看）
+    return int(round(10 + (x_1_5 - 1) * 20))
+
+
+def _profile_conditions(rt, sec, plan) -> list:
+    """純量或 NumPy 陣列都能用（& 而不是 and）：單筆與批次共用同一組門檻"""
+    return [
+        (rt >= 70) & (plan >= 65) & (sec <= 55),
+        (sec >= 70) & (rt <= 55),
+        (sec >= 65) & (plan >= 65),
+    ]
+
+
+def classify_profile(rt: Optional[int], sec: Optional[int], plan: Optional[int]) -> str:
+    """rt / sec / plan 是 0~100 的維度分數；None（未作答）視為 50"""
+    rt = PROFILE_DIM_DEFAULT if rt is None else rt
+    sec = PROFILE_DIM_DEFAULT if sec is None else sec
+    plan = PROFILE_DIM_DEFAULT if plan is None else plan
+    for i, ok in enumerate(_profile_conditions(rt, sec, plan)):
+        if ok:
+            return PROFILE_TYPES[i]
+    return PROFILE_TYPES[-1]
+
+
+# =========================
+# 批次模式（NumPy）：後台分析大量問卷用
+# =========================
+N_QUESTIONS = 10
+N_DIMS = len(DIM_LABELS)
+DEFAULT_PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def _dim_weight_matrix():
+    """10×6：W[q, d] = 1/該維度題數；分數矩陣 @ W 就是各維度平均"""
+    import numpy as np
+
+    w = np.zeros((N_QUESTIONS, N_DIMS), dtype=np.float64)
+    for qk, d in Q_DIM_MAP.items():
+        w[int(qk[1:]) - 1, d] = 1.0
+    cnt = w.sum(axis=0)
+    cnt[cnt == 0] = 1.0
+    return w / cnt
+
+
+def encode_value_answers(answer_sets: List[Any]):
+    """
+    N 份答案 → N×10 int8 題目分數（0=未作答，其餘 20~100；低中高為 30/60/90）。
+    選項字串的分數在 logic.answers.parse_option 依字串快取，同一個選項整批只解析一次。
+    """
+    import numpy as np
+
+    n = len(answer_sets)
+    flat = np.fromiter(
+        (
+            normalize_answers(answers).get(f"Q{i + 1}").choice.score100
+            for answers in answer_sets
+            for i in range(N_QUESTIONS)
+        ),
+        dtype=np.int8,
+        count=n * N_QUESTIONS,
+    )
+    return flat.reshape(n, N_QUESTIONS)
+
+
+def encode_value_likert(answer_sets: List[Any]):
+    """N 份答案 → N×10 int8 的 1~5 分（0 = 未作答 / 不是 1~5 或 A~E 的選項）；人格類型用"""
+    import numpy as np
+
+    n = len(answer_sets)
+    flat = np.fromiter(
+        (
+            normalize_answers(answers).get(f"Q{i + 1}").choice.likert or 0
+            for answers in answer_sets
+            for i in range(N_QUESTIONS)
+        ),
+        dtype=np.int8,
+        count=n * N_QUESTIONS,
+    )
+    return flat.reshape(n, N_QUESTIONS)
+
+
+def _profile_type_idx(likert):
+    """N×10 的 1~5 分 → 每筆的人格類型索引；維度算法與 classify_profile 相同"""
+    import numpy as np
+
+    q100 = np.where(likert > 0, 10 + (likert.astype(np.int16) - 1) * 20, 0)
+    dims = []
+    for qa, qb in PROFILE_DIM_QUESTIONS:
+        a, b = qa - 1, qb - 1
+        cnt = (likert[:, a] > 0).astype(np.int16) + (likert[:, b] > 0)
+        total = q100[:, a] + q100[:, b]
+        dims.append(np.where(cnt > 0, np.rint(total / np.maximum(cnt, 1)), PROFILE_DIM_DEFAULT))
+    rt, sec, plan = dims
+    return np.select(_profile_conditions(rt, sec, plan), [0, 1, 2], default=len(PROFILE_TYPES) - 1)
+
+
+def compute_value_metrics_batch(
+    answer_sets: List[Dict[str, Any]],
+    percentiles: Tuple[int, ...] = DEFAULT_PERCENTILES,
+) -> Dict[str, Any]:
+    """
+    compute_value_metrics 的批次版：
+      - q_scores: N×10 int8 題目分數（0~100）
+      - dims    : N×6 維度分數（一次矩陣乘法；與單筆版逐筆相同）
+      - answered / confidence / profile_types：每筆的作答數、信心值、人格類型
+      - cohort  : 群體統計（平均、百分位數、人格類型分佈），可直接 JSON 輸出
+    """
+    import numpy as np
+
+    answer_sets = list(answer_sets)
+    q_scores = encode_value_answers(answer_sets)
+    n = q_scores.shape[0]
+    dims = np.rint(q_scores @ _dim_weight_matrix()).astype(np.int16)
+
+    answered = (q_scores > 0).sum(axis=1)
+    confidence = np.round(np.minimum(0.55 + (answered / 10.0) * 0.4, 0.95), 2)
+
+    # 人格類型：與 classify_profile（app 報告裡的類型）相同的維度與門檻，用 np.select 一次算完
+    type_idx = _profile_type_idx(encode_value_likert(answer_sets))
+
+    return {
+        "n": n,
+        "q_scores": q_scores,
+        "dims": dims,
+        "answered": answered,
+        "confidence": confidence,
+        "profile_types": type_idx,
+        "cohort": cohort_aggregates(q_scores, dims, answered, type_idx, percentiles),
+    }
+
+
+def cohort_aggregates(q_scores, dims, answered, type_idx, percentiles: Tuple[int, ...] = DEFAULT_PERCENTILES) -> Dict[str, Any]:
+    import numpy as np
+
+    n = int(dims.shape[0])
+    type_counts = np.bincount(type_idx, minlength=len(PROFILE_TYPES)) if n else np.zeros(len(PROFILE_TYPES), dtype=int)
+    out: Dict[str, Any] = {
+        "n": n,
+        "profile_types": {
+            PROFILE_TYPES[i]: {"count": int(c), "ratio": round(float(c) / n, 4) if n else 0.0}
+            for i, c in enumerate(type_counts)
+        },
+    }
+    if n == 0:
+        out.update({"dims": {}, "questions": {}, "answered_mean": 0.0})
+        return out
+
+    pct = np.percentile(dims, percentiles, axis=0)
+    out["dims"] = {
+        label: {
+            "mean": round(float(dims[:, d].mean()), 2),
+            "std": round(float(dims[:, d].std()), 2),
+            "percentiles": {f"p{p}": float(pct[i, d]) for i, p in enumerate(percentiles)},
+        }
+        for d, label in enumerate(DIM_LABELS)
+    }
+    # 題目平均只算有作答的人（0 分 = 未作答）
+    answered_mask = q_scores > 0
+    q_cnt = answered_mask.sum(axis=0)
+    q_sum = q_scores.sum(axis=0, dtype=np.int64)
+    out["questions"] = {
+        f"Q{i + 1}": {
+            "answered": int(q_cnt[i]),
+            "mean": round(float(q_sum[i]) / int(q_cnt[i]), 2) if q_cnt[i] else 0.0,
+        }
+        for i in range(N_QUESTIONS)
+    }
+    out["answered_mean"] = round(float(answered.mean()), 2)
+    return out
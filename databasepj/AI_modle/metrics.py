@@ -0,0 +1,315 @@
+# metrics.py
+# 功能：輕量的請求/階段計時 + Prometheus 文字格式輸出（/metrics）
+#   - span("llm")：with 區塊或 @timed("db.recommend") 裝飾器，記錄
+#       app_stage_duration_seconds{stage}（histogram）、app_stage_errors_total{stage,exception}、
+#       app_stage_in_flight{stage}
+#   - install_flask_metrics(app)：每個請求的延遲 / 狀態碼 / 進行中數量（以路由樣板當 label，避免爆量）
+#   - 純標準庫：一次記錄 = 兩次 perf_counter + 一把不搶的鎖，production 可以一直開著
+#   注意：數值是「每個 process」各自累計；gunicorn 多 worker 時每次 scrape 只會看到其中一個 worker，
+#   要看全體請在每個 worker 前面各開一個 port，或改用 prometheus_client 的 multiprocess 模式。
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") not in ("0", "false", "False")
+
+# 從 0.5ms（計分/查表）到 60s（LLM 逾時）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(v: Any) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _label_str(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+# =========================
+# 指標型別
+# =========================
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[Any, ...], Any] = {}
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        lines = self._header()
+        for labels, v in items:
+            lines.append(f"{self.name}{_label_str(self.labelnames, labels)} {_fmt(v)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: Any) -> float:
+        return self._values.get(labels, 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: Any, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: Any) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels: Any) -> float:
+        return self._values.get(labels, 0)
+
+
+class Histogram(_Metric):
+    """每組 label 存：各 bucket 次數（非累積）、總和、次數；輸出時才轉成累積值"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: Any) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            st = self._values.get(labels)
+            if st is None:
+                st = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            st[0][i] += 1
+            st[1] += value
+            st[2] += 1
+
+    def count(self, *labels: Any) -> int:
+        st = self._values.get(labels)
+        return st[2] if st else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = self._header()
+        for labels, (counts, total, n) in items:
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                lbl = _label_str(self.labelnames, labels, 'le="' + _fmt(le) + '"')
+                lines.append(f"{self.name}_bucket{lbl} {acc}")
+            lbl = _label_str(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{lbl} {_fmt(total)}")
+            lines.append(f"{self.name}_count{lbl} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn: Callable[[], List[str]]) -> None:
+        """scrape 時才計算的指標（例如快取大小、斷路器狀態），回傳已格式化好的行"""
+        self._collectors.append(fn)
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        for fn in self._collectors:
+            try:
+                lines.extend(fn())
+            except Exception:
+                # 收集失敗不能讓整個 /metrics 掛掉
+                pass
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+PROCESS_START = REGISTRY.gauge("process_start_time_seconds", "Process start time (unix seconds)")
+PROCESS_START.set(time.time())
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """目前的 RSS；Linux 讀 /proc/self/statm，其他平台退回 ru_maxrss（峰值）"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+    except Exception:
+        return None
+
+
+def _collect_process_metrics() -> List[str]:
+    rss = resident_memory_bytes()
+    if rss is None:
+        return []
+    return ["# TYPE process_resident_memory_bytes gauge", f"process_resident_memory_bytes {rss}"]
+
+
+REGISTRY.add_collector(_collect_process_metrics)
+
+STAGE_SECONDS = REGISTRY.histogram("app_stage_duration_seconds", "Time spent in each request stage", ("stage",))
+STAGE_ERRORS = REGISTRY.counter("app_stage_errors_total", "Exceptions raised inside a stage", ("stage", "exception"))
+STAGE_IN_FLIGHT = REGISTRY.gauge("app_stage_in_flight", "Stages currently executing", ("stage",))
+
+HTTP_SECONDS = REGISTRY.histogram("http_request_duration_seconds", "HTTP request latency", ("endpoint", "method"))
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests by status", ("endpoint", "method", "status"))
+HTTP_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "HTTP requests currently being served")
+UNHANDLED_ERRORS = REGISTRY.counter("app_unhandled_errors_total", "Exceptions that reached the global error handler", ("endpoint", "exception"))
+
+
+# =========================
+# 階段計時
+# =========================
+class span:
+    """
+    with span("db.recommend"):
+        ...
+    例外照常往上丟，只額外記一筆 error；METRICS_ENABLED=0 或 enabled=False（背景推測等不該算進去的路徑）時不做任何事
+    """
+
+    __slots__ = ("stage", "t0", "enabled")
+
+    def __init__(self, stage: str, enabled: bool = True):
+        self.stage = stage
+        self.t0 = 0.0
+        self.enabled = METRICS_ENABLED and enabled
+
+    def __enter__(self) -> "span":
+        if self.enabled:
+            STAGE_IN_FLIGHT.inc(self.stage)
+            self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self.enabled:
+            STAGE_SECONDS.observe(time.perf_counter() - self.t0, self.stage)
+            STAGE_IN_FLIGHT.dec(self.stage)
+            if exc_type is not None:
+                STAGE_ERRORS.inc(self.stage, exc_type.__name__)
+        return False
+
+
+def timed(stage: str):
+    """@timed("db.recommend")：整個函式當成一個 span"""
+
+    def deco(fn):
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.__wrapped__ = fn
+        return wrapper
+
+    return deco
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """不方便包成 with 區塊的區間（例如串流的第一個 token）直接記一筆"""
+    if METRICS_ENABLED:
+        STAGE_SECONDS.observe(seconds, stage)
+
+
+def record_error(endpoint: Optional[str], exc: BaseException) -> None:
+    if METRICS_ENABLED:
+        UNHANDLED_ERRORS.inc(endpoint or "unmatched", type(exc).__name__)
+
+
+# =========================
+# HTTP 請求（Flask）
+# =========================
+def endpoint_label(req) -> str:
+    rule = getattr(req, "url_rule", None)
+    return rule.rule if rule is not None else "unmatched"
+
+
+def observe_request(endpoint: str, method: str, status: int, seconds: float) -> None:
+    """Flask / Quart 共用：記一筆完成的請求（進行中數量由呼叫端 inc/dec）"""
+    HTTP_SECONDS.observe(seconds, endpoint, method)
+    HTTP_REQUESTS.inc(endpoint, method, status)
+
+
+def install_flask_metrics(app, path: str = "/metrics") -> None:
+    """掛上 before/after/teardown hooks 與 /metrics；METRICS_ENABLED=0 時什麼都不裝"""
+    if not METRICS_ENABLED:
+        return
+
+    from flask import Response, g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_t0 = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+
+    @app.after_request
+    def _metrics_record(resp):
+        t0 = g.pop("_metrics_t0", None)
+        if t0 is not None:
+            observe_request(endpoint_label(request), request.method, resp.status_code, time.perf_counter() - t0)
+            HTTP_IN_FLIGHT.dec()
+            g._metrics_done = True
+        return resp
+
+    @app.teardown_request
+    def _metrics_teardown(exc):
+        # after_request 沒跑到（例外一路丟出去）也要把進行中數量扣回來
+        if not g.pop("_metrics_done", False) and g.pop("_metrics_t0", None) is not None:
+            HTTP_IN_FLIGHT.dec()
+
+    @app.route(path)
+    def metrics_endpoint():
+        return Response(REGISTRY.render(), mimetype=None, content_type=CONTENT_TYPE)
@@ -0,0 +1,104 @@
+# pregenerate_values_cache.py
+# 功能：離線預先產生「最常見輪廓 key」的價值觀報告文案，寫進 values_narrative_cache
+# 用法：python pregenerate_values_cache.py --samples 20000 --top 200 --seed 7
+#   以隨機作答模擬 q1~q10 的分佈，統計出現次數最多的輪廓 key，
+#   再用本機 Ollama 為每個 key 產生 VALUES_CACHE_VARIANTS 個變體。
+#   prompt 與線上 /submit 完全相同（_prepare_report 組 ai_input、call_ollama_report(_sections) 組 payload），
+#   快取裡的文案才是替代得了線上生成的那一份。
+
+import argparse
+import json
+import random
+from collections import Counter
+from typing import Dict, List
+
+from app import VALUES_CACHE, _prepare_report, _values_cache_key, call_ollama_report, call_ollama_report_sections
+from ai.report_cache import VALUES_CACHE_VARIANTS
+from ai.report_sections import sections_for
+from ai.schemas import apply_report_defaults
+from logic.value_metrics import compute_value_metrics
+
+CHOICES = ["A", "B", "C", "D", "E"]
+
+
+def _random_answers(rng: random.Random) -> Dict[str, str]:
+    return {f"q{i}": rng.choice(CHOICES) for i in range(1, 11)}
+
+
+def most_common_keys(samples: int, top: int, seed: int) -> List[tuple]:
+    """
+    回傳 [(key, 出現次數, [代表性答案...]), ...]
+    每個 key 保留幾組不同的答案當 prompt，temperature=0 下才生得出不同變體。
+    """
+    rng = random.Random(seed)
+    counter: Counter = Counter()
+    examples: Dict[str, List[Dict[str, str]]] = {}
+    for _ in range(samples):
+        ans = _random_answers(rng)
+        key = _values_cache_key(ans, compute_value_metrics(ans))
+        if not key:
+            continue
+        counter[key] += 1
+        ex = examples.setdefault(key, [])
+        if len(ex) < VALUES_CACHE_VARIANTS and ans not in ex:
+            ex.append(ans)
+    return [(k, n, examples[k]) for k, n in counter.most_common(top)]
+
+
+def generate_live(answers: Dict[str, str]) -> tuple:
+    """
+    照線上 /submit 的路徑生成一份價值觀報告：回傳 (cache_key, report)；key 已滿（不需要再生）時 report 為 None。
+    分段（fan-out）設定也跟線上一樣，有段落失敗的拼湊報告不收（線上同樣不進快取）。
+    """
+    ctx = _prepare_report("values", answers, record_metrics=False)
+    if ctx["ai_input"] is None:
+        return ctx["cache_key"], None
+    sections = sections_for("values")
+    if sections:
+        report = call_ollama_report_sections(ctx["system_prompt"], ctx["ai_input"], "values", sections)
+    else:
+        report = call_ollama_report(ctx["system_prompt"], ctx["ai_input"], "values")
+    if report.get("sections_failed"):
+        report = dict(report, status="error")
+    return ctx["cache_key"], report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="離線預先產生價值觀報告文案快取")
+    ap.add_argument("--samples", type=int, default=20000)
+    ap.add_argument("--top", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--dry-run", action="store_true", help="只列出 key 與覆蓋率，不呼叫 LLM")
+    args = ap.parse_args()
+
+    keys = most_common_keys(args.samples, args.top, args.seed)
+    covered = sum(n for _, n, _ in keys)
+    print(f"[統計] top {len(keys)} 個 key 覆蓋 {covered}/{args.samples} = {covered / max(1, args.samples):.1%} 的模擬作答")
+    if args.dry_run:
+        for k, n, _ in keys[:20]:
+            print(f"  {n:6d}  {k}")
+        return
+
+    generated = 0
+    for i, (key, n, answer_sets) in enumerate(keys, 1):
+        for answers in answer_sets:
+            if VALUES_CACHE.is_full(key):
+                break
+            try:
+                live_key, report = generate_live(answers)
+            except Exception as e:
+                print(f"[略過] {key}：{e}")
+                break
+            if report is None:
+                break
+            report = apply_report_defaults("values", report)
+            # 重複/不完整的文案 put 會回 False，直接試下一組答案
+            if report.get("status") == "success" and VALUES_CACHE.put(live_key, report):
+                generated += 1
+        print(f"[{i}/{len(keys)}] {key}  ({n} 次)  變體={VALUES_CACHE.variant_count(key)}")
+
+    print(f"[完成] 新增 {generated} 筆文案；快取狀態：{json.dumps(VALUES_CACHE.stats(), ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
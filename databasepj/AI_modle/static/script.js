@@ -24,6 +24,13 @@
   let idx = 0; // current question index
   let submitting = false;
 
+  // 進度快照用：同一次作答的識別碼（送出時一起帶上，伺服器才能沿用先生成好的報告）
+  const sessionId = (window.crypto && crypto.randomUUID)
+    ? crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+  const PROGRESS_DEBOUNCE_MS = 600;
+  let progressTimer = null;
+
   // ====== 題庫 ======
   const INSURANCE_QUESTIONS = [
     {
@@ -396,6 +403,24 @@
     if (topBack) topBack.disabled = (idx === 0);
   }
 
+  // ====== 進度快照（伺服器作答夠完整就先在背景生成報告；失敗不影響作答） ======
+  function sendProgress() {
+    progressTimer = null;
+    if (submitting) return;
+    fetch("/progress", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ session_id: sessionId, quiz_id: quizId, answers: answers, total: QUESTIONS.length }),
+      keepalive: true
+    }).catch(() => {});
+  }
+
+  function scheduleProgress() {
+    if (submitting) return;
+    if (progressTimer) clearTimeout(progressTimer);
+    progressTimer = setTimeout(sendProgress, PROGRESS_DEBOUNCE_MS);
+  }
+
   function toggleMulti(qid, label, btn) {
     ensureSlot(qid);
     const list = answers[qid].multi;
@@ -407,6 +432,7 @@
       list.push(label);
       btn.classList.add("is-selected");
     }
+    scheduleProgress();
   }
 
   function setSingle(qid, label, optRow) {
@@ -416,6 +442,7 @@
     Array.from(optRow.querySelectorAll(".opt-btn")).forEach(b => b.classList.remove("is-selected"));
     const chosen = Array.from(optRow.querySelectorAll(".opt-btn")).find(b => b.textContent === label);
     if (chosen) chosen.classList.add("is-selected");
+    scheduleProgress();
   }
 
   function goPrev() {
@@ -463,6 +490,7 @@
 
     freeTextInput.value = "";
     render();
+    scheduleProgress();
   }
 
   if (sendFreeTextBtn) sendFreeTextBtn.addEventListener("click", onSendFreeText);
@@ -479,8 +507,9 @@
   async function finish() {
     if (submitting) return;
     submitting = true;
+    if (progressTimer) clearTimeout(progressTimer);
 
-    const payload = { quiz_id: quizId, answers: answers };
+    const payload = { quiz_id: quizId, answers: answers, session_id: sessionId };
 
     try {
       const res = await fetch("/submit", {
@@ -0,0 +1,235 @@
+# static_assets.py
+# 功能：靜態資源的「內容雜湊檔名 + 預先壓縮 + immutable 快取」
+#   - build_assets.py 產生 static/dist/（style.<hash>.css、.gz、.br）與 asset-manifest.json
+#   - 模板用 asset_url('style.css') 取得雜湊後網址；沒跑過 build 時退回 /static/ 原檔
+#   - /assets/<檔名> 依 Accept-Encoding 回傳 br / gzip / 原檔，Cache-Control 一年 + immutable
+#   - /service-worker.js 由模板產生，快取版本 = manifest 版本，內容變了舊快取自動清掉
+#   - 載入 manifest 時重算每個來源檔的雜湊：改了 css/js 卻沒重跑 build（dist/ 過期），
+#     那幾個檔退回 /static/ 原檔並印警告，不會把舊程式用 immutable 快取送出去
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "asset-manifest.json")
+
+ASSET_URL_PREFIX = "/assets/"
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+IMMUTABLE_CACHE_CONTROL = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+
+# 要加雜湊的來源檔（相對 static/）；icons/ 底下全部都算
+SOURCE_FILES = ("style.css", "script.js", "manifest.webmanifest")
+SOURCE_DIRS = ("icons",)
+
+# 預先壓縮的副檔名（圖片本身已壓縮，再 gzip 只會變大）
+COMPRESSIBLE_EXTS = (".css", ".js", ".webmanifest", ".json", ".svg", ".html")
+
+# 每個頁面都會用到、Service Worker 安裝時就先抓的頁面
+PRECACHE_PAGES = ("/", "/quiz/insurance", "/quiz/values")
+
+# 副檔名優先順序：瀏覽器同時支援時先給 br
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# 檔名裡的內容雜湊長度：style.3f2a1b9c0d.css
+HASH_LEN = 10
+
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+
+
+def list_source_files() -> List[str]:
+    """回傳要處理的來源檔（相對 static/、用 / 分隔）"""
+    out = [f for f in SOURCE_FILES if os.path.isfile(os.path.join(STATIC_DIR, f))]
+    for d in SOURCE_DIRS:
+        root = os.path.join(STATIC_DIR, d)
+        if not os.path.isdir(root):
+            continue
+        for name in sorted(os.listdir(root)):
+            if os.path.isfile(os.path.join(root, name)):
+                out.append(f"{d}/{name}")
+    return out
+
+
+def hashed_name(rel: str, data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LEN]
+    stem, ext = os.path.splitext(rel)
+    return f"{stem}.{digest}{ext}"
+
+
+def _rewrite_webmanifest(data: bytes, assets: Dict[str, str]) -> bytes:
+    manifest = json.loads(data.decode("utf-8"))
+    for icon in manifest.get("icons") or []:
+        src = (icon.get("src") or "").lstrip("/")
+        if src.startswith("static/") and src[len("static/"):] in assets:
+            icon["src"] = ASSET_URL_PREFIX + assets[src[len("static/"):]]
+    return json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def read_source(rel: str, assets: Dict[str, str]) -> bytes:
+    """
+    build 時實際寫進 dist/ 的內容：webmanifest 內的 icon 路徑改寫成雜湊後網址（assets 要先有 icon），其餘原樣。
+    build_assets.py 與載入時的驗證共用，兩邊算出來的雜湊才會一致。
+    """
+    with open(os.path.join(STATIC_DIR, *rel.split("/")), "rb") as f:
+        data = f.read()
+    if rel.endswith(".webmanifest"):
+        data = _rewrite_webmanifest(data, assets)
+    return data
+
+
+class AssetManifest:
+    """
+    asset-manifest.json 格式：
+    {
+      "version": "1a2b3c4d5e",
+      "assets": {"style.css": "style.3f2a1b9c0d.css", ...},
+      "encodings": {"style.3f2a1b9c0d.css": ["br", "gzip"], ...}
+    }
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._version = ""
+        self.assets: Dict[str, str] = {}
+        self.encodings: Dict[str, List[str]] = {}
+        self._hashed: set = set()
+        # manifest 裡跟目前來源檔對不上的項目（dist/ 過期）；這些改回 /static/ 原檔
+        self.stale: List[str] = []
+
+    def _dev_version(self) -> str:
+        # 沒跑 build：用來源檔內容算版本，改了 css/js 一樣會換掉 SW 快取
+        h = hashlib.sha256()
+        for rel in list_source_files():
+            with open(os.path.join(STATIC_DIR, rel), "rb") as f:
+                h.update(rel.encode("utf-8"))
+                h.update(f.read())
+        return "dev-" + h.hexdigest()[:10]
+
+    def _verify(self, assets: Dict[str, str]) -> List[str]:
+        """重算來源檔雜湊，回傳跟 manifest 檔名對不上（或來源已刪掉）的項目"""
+        stale = []
+        for rel, hashed in assets.items():
+            try:
+                current = hashed_name(rel, read_source(rel, assets))
+            except (OSError, ValueError):
+                current = ""
+            if current != hashed:
+                stale.append(rel)
+        return stale
+
+    def load(self) -> "AssetManifest":
+        with self._lock:
+            data: Dict[str, Any] = {}
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            assets = dict(data.get("assets") or {})
+            self.encodings = {k: list(v) for k, v in (data.get("encodings") or {}).items()}
+            # 舊的雜湊檔仍可讀（內容跟檔名一致，舊頁面還在引用），只是不再發給新頁面
+            self._hashed = set(assets.values())
+            self.stale = self._verify(assets)
+            for rel in self.stale:
+                print(f"[assets] {rel} 跟 {assets.pop(rel)} 內容不符（dist/ 過期，請重跑 build_assets.py），改用 /static/{rel}")
+            self.assets = assets
+            # 有退回原檔的項目時，版本改用來源檔內容算：Service Worker 才會換掉舊快取
+            self._version = (not self.stale and data.get("version")) or self._dev_version()
+            self._loaded = True
+        return self
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    @property
+    def version(self) -> str:
+        self._ensure_loaded()
+        return self._version
+
+    def url(self, name: str) -> str:
+        self._ensure_loaded()
+        name = name.lstrip("/")
+        hashed = self.assets.get(name)
+        if hashed:
+            return ASSET_URL_PREFIX + hashed
+        return "/static/" + name
+
+    def urls(self) -> List[str]:
+        self._ensure_loaded()
+        return [self.url(name) for name in self.assets] if self.assets else ["/static/" + f for f in list_source_files()]
+
+    def resolve(self, hashed_name: str, accept_encoding: str = "") -> Optional[Tuple[str, str, Optional[str]]]:
+        """
+        /assets/<hashed_name> → (實際檔案路徑, mimetype, Content-Encoding 或 None)
+        只認 manifest 內的檔名，避免被拿來讀 dist/ 以外的東西。
+        """
+        self._ensure_loaded()
+        if hashed_name not in self._hashed:
+            return None
+        path = os.path.join(DIST_DIR, *hashed_name.split("/"))
+        mimetype = mimetypes.guess_type(hashed_name)[0] or "application/octet-stream"
+        accepted = {t.split(";")[0].strip().lower() for t in (accept_encoding or "").split(",")}
+        available = self.encodings.get(hashed_name) or []
+        for enc, ext in ENCODINGS:
+            if enc in accepted and enc in available and os.path.isfile(path + ext):
+                return path + ext, mimetype, enc
+        if not os.path.isfile(path):
+            return None
+        return path, mimetype, None
+
+    def stats(self) -> Dict[str, Any]:
+        self._ensure_loaded()
+        return {"version": self.version, "built": bool(self.assets), "assets": len(self.assets), "stale": list(self.stale)}
+
+
+ASSETS = AssetManifest()
+
+
+def asset_url(name: str) -> str:
+    """模板用：{{ asset_url('style.css') }}"""
+    return ASSETS.url(name)
+
+
+def service_worker_context() -> Dict[str, Any]:
+    return {
+        "cache_version": ASSETS.version,
+        "precache": list(PRECACHE_PAGES) + ASSETS.urls(),
+        "asset_prefix": ASSET_URL_PREFIX,
+    }
+
+
+def register_static_assets(app) -> None:
+    """掛到 Flask app：jinja 全域函式 + /assets/ + /service-worker.js"""
+    from flask import abort, make_response, render_template, request, send_file
+
+    app.jinja_env.globals["asset_url"] = asset_url
+
+    @app.route(ASSET_URL_PREFIX + "<path:filename>")
+    def hashed_asset(filename: str):
+        hit = ASSETS.resolve(filename, request.headers.get("Accept-Encoding", ""))
+        if hit is None:
+            abort(404)
+        path, mimetype, encoding = hit
+        resp = send_file(path, mimetype=mimetype, conditional=True, etag=True, max_age=IMMUTABLE_MAX_AGE)
+        resp.headers.pop("Content-Disposition", None)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        resp.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        resp.headers["Vary"] = "Accept-Encoding"
+        return resp
+
+    @app.route("/service-worker.js")
+    def service_worker():
+        # SW 本身不能長快取：瀏覽器要每次都能比對出新版本
+        body = render_template("service-worker.js", **service_worker_context())
+        resp = make_response(body)
+        resp.headers["Content-Type"] = "application/javascript; charset=utf-8"
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
@@ -0,0 +1,59 @@
+// 由 /service-worker.js 路由產生；快取名稱跟著 asset-manifest 版本走，資源一改就換新快取
+const CACHE_NAME = "pwa-cache-{{ cache_version }}";
+const ASSET_PREFIX = {{ asset_prefix|tojson }};
+const CORE_ASSETS = {{ precache|tojson }};
+
+self.addEventListener("install", (event) => {
+  event.waitUntil(
+    caches.open(CACHE_NAME)
+      .then((cache) => cache.addAll(CORE_ASSETS))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then((keys) =>
+        Promise.all(keys.map((k) => (k !== CACHE_NAME ? caches.delete(k) : null)))
+      )
+      .then(() => self.clients.claim())
+  );
+});
+
+self.addEventListener("fetch", (event) => {
+  const req = event.request;
+  if (req.method !== "GET") return;
+  const url = new URL(req.url);
+  if (url.origin !== self.location.origin) return;
+
+  // 動態 API / 結果頁：永遠走網路，不進 cache
+  if (
+    url.pathname.startsWith("/submit") ||
+    url.pathname.startsWith("/result") ||
+    url.pathname.startsWith("/product") ||
+    url.pathname.startsWith("/api/")
+  ) {
+    return;
+  }
+
+  // 雜湊檔名的資源內容永遠不變：cache 優先，命中就完全不發請求
+  if (url.pathname.startsWith(ASSET_PREFIX)) {
+    event.respondWith(
+      caches.match(req).then((hit) =>
+        hit ||
+        fetch(req).then((resp) => {
+          if (resp.ok) {
+            const copy = resp.clone();
+            caches.open(CACHE_NAME).then((cache) => cache.put(req, copy));
+          }
+          return resp;
+        })
+      )
+    );
+    return;
+  }
+
+  // 其他（頁面）：網路優先，失敗才用 cache
+  event.respondWith(fetch(req).catch(() => caches.match(req)));
+});
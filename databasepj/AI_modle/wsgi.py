@@ -0,0 +1,33 @@
+# wsgi.py
+# 正式環境進入點（取代 app.run(debug=True)）
+#   部署前先跑 python build_assets.py（靜態資源雜湊檔名 + 預先壓縮）
+#   Linux：gunicorn -c gunicorn.conf.py wsgi:application
+#   Windows：python wsgi.py（使用 waitress，多執行緒單一 process）
+
+import os
+
+from app import app, init_model_warmup, start_shared_state_warmup
+
+# gunicorn 開 preload_app 時，這裡在 master 執行一次（fork 前），worker 共用載入結果
+#   gunicorn.conf.py 設 SHARED_STATE_WARMUP=sync：在 master 載完再 fork（背景執行緒不會跨 fork 存活）
+#   waitress / 其他單一 process：預設背景載入，伺服器先起來，/ready 等載入完才回 200
+SHARED_STATE = start_shared_state_warmup()
+
+application = app
+
+
+def main():
+    from waitress import serve
+
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", "5000"))
+    # LLM 等待是 I/O bound：執行緒數可以遠大於 CPU 核心數
+    threads = int(os.getenv("WAITRESS_THREADS", "32"))
+
+    init_model_warmup()
+    print(f"[wsgi] waitress on http://{host}:{port}  threads={threads}  preload={SHARED_STATE}")
+    serve(application, host=host, port=port, threads=threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,10 @@
 import streamlit as st
-import pandas as pd
 import sqlite3
-from openai import OpenAI
 import os
 import re
-import plotly.graph_objects as go
+
+# pandas / plotly / openai 載入都要數百 ms 到數秒：延後到第一次真的用到時才 import，
+# 頁面框架可以先畫出來（Streamlit 每次互動都重跑整支 script，模組載入後會留在 sys.modules）
 
 # --- 1. 初始化與 API Key 安全讀取 ---
 st.set_page_config(page_title="南山 AI 智慧顧問", layout="wide", initial_sidebar_state="expanded")
@@ -16,7 +16,11 @@ except:
     st.error("❌ 尚未設定 API Key。請在 Streamlit Cloud 的 Secrets 中填入 OPENAI_API_KEY。")
     st.stop()
 
-client = OpenAI(api_key=API_KEY.strip())
+@st.cache_resource
+def get_client():
+    from openai import OpenAI
+
+    return OpenAI(api_key=API_KEY.strip())
 
 # 初始化 session_state
 if "page" not in st.session_state: st.session_state.page = "home"
@@ -29,6 +33,8 @@ if "recs" not in st.session_state: st.session_state.recs = []
 # --- 2. SQL 資料庫初始化 (自動讀取並清洗) ---
 @st.cache_resource
 def init_db():
+    import pandas as pd
+
     # 加上 "專題保險/" 前綴
     all_files = [
         "專題保險/投資型保險.xlsx", "專題保險/長期照顧.xlsx", "專題保險/旅行險.xlsx", 
@@ -82,6 +88,8 @@ def show_quiz_page():
         submitted = st.form_submit_button("送出測驗並分析")
         
         if submitted:
+            import plotly.graph_objects as go
+
             ans_pool = f"{q1}{q2}{q3}{q4}{q5}"
             scores = {
                 "保障": ans_pool.count("保障") * 20 + 10,
@@ -155,7 +163,7 @@ def show_home_page():
             with st.chat_message("user"): st.write(prompt)
 
             with st.chat_message("assistant"):
-                resp = client.chat.completions.create(model="gpt-4o", messages=st.session_state.messages)
+                resp = get_client().chat.completions.create(model="gpt-4o", messages=st.session_state.messages)
                 ans = resp.choices[0].message.content
                 st.write(ans)
                 st.session_state.messages.append({"role": "assistant", "content": ans})
@@ -173,6 +181,8 @@ def show_home_page():
             if age:
                 query += f" AND 承保年齡 LIKE '%{age}%'"
             
+            import pandas as pd
+
             st.session_state.recs = pd.read_sql_query(query + " LIMIT 8", conn).to_dict('records')
             st.rerun()
 